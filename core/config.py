@@ -1,6 +1,6 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     """
@@ -44,6 +44,126 @@ class Settings(BaseSettings):
         description="Celery Result Backend，默认使用redis_url"
     )
     
+    # 消息去重配置
+    dedup_enabled: bool = Field(
+        default=True,
+        description="分发到Celery前是否进行消息去重"
+    )
+    dedup_ttl_seconds: int = Field(
+        default=600,
+        description="去重指纹在Redis中的保留时间（秒）"
+    )
+    dedup_bucket_seconds: int = Field(
+        default=300,
+        description="指纹中时间戳的粗粒度分桶大小（秒）"
+    )
+    dedup_bloom_capacity: int = Field(
+        default=100000,
+        description="进程内布隆过滤器每一代的容量"
+    )
+    dedup_bloom_error_rate: float = Field(
+        default=0.001,
+        description="进程内布隆过滤器的目标误判率"
+    )
+    reply_dedup_window_seconds: int = Field(
+        default=600,
+        description="自动回复去重窗口（秒）：同一会话的相同内容在窗口内只回复一次（过长会让联系人之后再发的“在吗”得不到回复）"
+    )
+    reply_dedup_max_entries: int = Field(
+        default=10000,
+        description="自动回复去重记录每类条目的数量上限"
+    )
+    reply_dedup_path: Optional[str] = Field(
+        default="data/reply_dedup.json",
+        description="自动回复去重记录持久化路径（留空则只保存在内存中）"
+    )
+    
+    # 轮询调度配置
+    poll_min_interval: float = Field(
+        default=1.0,
+        description="有新消息后的最短轮询间隔（秒）"
+    )
+    poll_max_interval: float = Field(
+        default=30.0,
+        description="空闲时退避到的最长轮询间隔（秒）"
+    )
+    poll_backoff_factor: float = Field(
+        default=1.5,
+        description="空闲时每次扫描后间隔的放大倍数"
+    )
+    poll_profiles: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description='按时段覆盖轮询间隔，JSON列表，例: [{"time_range": "23:00-07:00", "min_interval": 5, "max_interval": 300}]'
+    )
+    
+    # 消息检测来源
+    message_source: str = Field(
+        default="poll",
+        description="未读消息检测方式: poll（定时扫描UI）, notification（有微信通知时才扫描，每次扫描后微信退到后台）"
+    )
+    notification_poll_interval: float = Field(
+        default=1.0,
+        description="读取设备通知快照的间隔（秒）"
+    )
+    notification_fallback_interval: float = Field(
+        default=300.0,
+        description="通知模式下无通知时的兜底扫描间隔（秒），防止免打扰会话漏检"
+    )
+    
+    # 进程内引擎配置（无Broker的单进程模式）
+    engine_queue_size: int = Field(
+        default=100,
+        description="引擎入站/出站内存队列的容量"
+    )
+    engine_workers: int = Field(
+        default=2,
+        description="引擎中并发执行技能的worker数量"
+    )
+    engine_journal_path: Optional[str] = Field(
+        default=None,
+        description="入站消息持久化日志路径，为空则不持久化"
+    )
+    
+    # 设备集群配置（每台设备一个监听进程）
+    fleet_devices: List[str] = Field(
+        default_factory=list,
+        description='设备序列号列表，JSON格式，例: ["serial1", "serial2"]'
+    )
+    fleet_devices_file: Optional[str] = Field(
+        default="config/devices.txt",
+        description="设备列表文件（每行一个序列号），未设置fleet_devices时使用"
+    )
+    fleet_restart_backoff: float = Field(
+        default=5.0,
+        description="worker崩溃后首次重启等待时间（秒），之后指数增长"
+    )
+    fleet_restart_backoff_max: float = Field(
+        default=300.0,
+        description="worker重启等待时间上限（秒）"
+    )
+    fleet_status_path: Optional[str] = Field(
+        default="logs/fleet_status.json",
+        description="集群状态JSON输出路径"
+    )
+    
+    # 截图归档配置
+    screenshot_archive_dir: str = Field(
+        default="screenshots/archive",
+        description="截图归档根目录（按内容哈希分目录存放）"
+    )
+    screenshot_capture_level: str = Field(
+        default="messages",
+        description="截图采集级别: off / errors / messages / debug"
+    )
+    screenshot_max_mb: int = Field(
+        default=500,
+        description="截图归档占用空间上限（MB），超出时删除最旧的截图"
+    )
+    screenshot_max_age_days: float = Field(
+        default=7.0,
+        description="截图保留天数"
+    )
+    
     # AI API Keys
     openai_api_key: Optional[str] = Field(
         default=None,
@@ -0,0 +1,386 @@
+"""
+消息去重 - 在分发到Celery之前过滤重复消息
+
+监听器和OCR路径在多个轮询周期内可能重复上报同一条未读消息。
+这里用稳定指纹（平台、设备、会话、发送者、归一化内容、粗粒度时间桶）判重：
+进程内的布隆过滤器挡住明显的重复，未命中时再用Redis的TTL键做跨进程判重。
+
+ReplyDedupStore 供自动回复使用：按（会话、归一化内容）的稳定摘要记录
+已回复的消息和自己发出的消息，条目按时间窗口过期、总数有上限，可选持久化到JSON文件。
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from loguru import logger
+from core.config import settings
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_content(content: Optional[str]) -> str:
+    """
+    归一化消息内容（全角/半角统一、去除多余空白、小写）
+
+    Args:
+        content: 原始消息内容
+
+    Returns:
+        归一化后的内容
+    """
+    if not content:
+        return ""
+    text = unicodedata.normalize("NFKC", str(content))
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return text.lower()
+
+
+def time_bucket(timestamp: Optional[float], bucket_seconds: int) -> int:
+    """将时间戳映射到粗粒度时间桶"""
+    if timestamp is None:
+        timestamp = time.time()
+    return int(float(timestamp) // max(1, bucket_seconds))
+
+
+def message_fingerprint(message: Dict[str, Any], bucket: int) -> str:
+    """
+    计算消息指纹
+
+    Args:
+        message: 消息字典，包含 platform, device_serial, chat, sender, author, content 等字段
+            （微信的 sender 是会话名，群聊中实际发言人在 author）
+        bucket: 时间桶编号
+
+    Returns:
+        十六进制指纹字符串
+    """
+    parts = (
+        str(message.get("platform", "")),
+        str(message.get("device_serial") or ""),
+        str(message.get("chat") or message.get("sender", "")),
+        str(message.get("author") or message.get("sender", "")),
+        normalize_content(message.get("content")),
+        str(bucket),
+    )
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class BloomFilter:
+    """简单的布隆过滤器（基于bytearray和双重哈希）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        error_rate = min(max(error_rate, 1e-9), 0.5)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RotatingBloomFilter:
+    """
+    双代轮换布隆过滤器
+
+    普通布隆过滤器无法删除元素，这里每隔 rotate_seconds 丢弃旧的一代，
+    使条目在进程内的存活时间介于 rotate_seconds 与 2*rotate_seconds 之间。
+    """
+
+    def __init__(self, capacity: int, error_rate: float, rotate_seconds: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotate_seconds = rotate_seconds
+        self._clock = clock
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous: Optional[BloomFilter] = None
+        self._rotated_at = clock()
+
+    def _maybe_rotate(self):
+        now = self._clock()
+        if now - self._rotated_at >= self.rotate_seconds or self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = now
+
+    def add(self, item: str):
+        self._maybe_rotate()
+        self._current.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        self._maybe_rotate()
+        return item in self._current or (self._previous is not None and item in self._previous)
+
+
+class MessageDeduplicator:
+    """
+    消息去重器
+
+    判重顺序：本地布隆过滤器 -> Redis（SET NX EX）。
+    相邻两个时间桶都参与判重，避免同一条消息恰好跨越桶边界时被重复分发。
+    Redis不可用时降级为只用本地过滤器（宁可重复也不丢消息）。
+    """
+
+    KEY_PREFIX = "dedup:msg:"
+
+    def __init__(
+        self,
+        redis_client=None,
+        ttl_seconds: int = 600,
+        bucket_seconds: int = 300,
+        bloom_capacity: int = 100000,
+        bloom_error_rate: float = 0.001,
+    ):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.bucket_seconds = bucket_seconds
+        self.bloom = RotatingBloomFilter(
+            capacity=bloom_capacity,
+            error_rate=bloom_error_rate,
+            rotate_seconds=max(1, ttl_seconds / 2),
+        )
+        self.stats = {"checked": 0, "local_hits": 0, "redis_hits": 0, "redis_errors": 0}
+
+    def fingerprints(self, message: Dict[str, Any]) -> Tuple[str, str]:
+        """返回 (当前桶指纹, 上一个桶指纹)"""
+        bucket = time_bucket(message.get("timestamp"), self.bucket_seconds)
+        return message_fingerprint(message, bucket), message_fingerprint(message, bucket - 1)
+
+    def is_duplicate(self, message: Dict[str, Any]) -> bool:
+        """
+        判断消息是否重复；不重复时同时记录该消息
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            True表示重复（应丢弃），False表示首次出现（应分发）
+        """
+        self.stats["checked"] += 1
+        current, previous = self.fingerprints(message)
+
+        if current in self.bloom or previous in self.bloom:
+            self.stats["local_hits"] += 1
+            return True
+
+        duplicate = False
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.exists(self.KEY_PREFIX + previous)
+                pipe.set(self.KEY_PREFIX + current, 1, nx=True, ex=self.ttl_seconds)
+                previous_exists, created = pipe.execute()
+                duplicate = bool(previous_exists) or not created
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Redis去重检查失败，仅使用本地过滤: {e}")
+
+        self.bloom.add(current)
+        if duplicate:
+            self.stats["redis_hits"] += 1
+        return duplicate
+
+
+def reply_digest(chat: Optional[str], content: Optional[str]) -> str:
+    """（会话、归一化内容）的稳定摘要，不受进程哈希随机化影响"""
+    parts = (str(chat or ""), normalize_content(content))
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ReplyDedupStore:
+    """
+    自动回复的去重记录
+
+    两类条目：
+    - replied: 已回复的收到消息，同一会话的同一内容在窗口期内不再回复
+    - outgoing: 自己发出的消息，截图识别到的最新消息是自己的回复时据此精确跳过
+
+    每类条目按写入时间排序（OrderedDict），过期条目从头部淘汰，
+    超过 max_entries 时淘汰最旧的，长时间运行内存保持不变。
+    """
+
+    KINDS = ("replied", "outgoing")
+
+    def __init__(
+        self,
+        window_seconds: float = 600,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+        save_interval: float = 30.0,
+        clock=time.time,
+    ):
+        """
+        Args:
+            window_seconds: 条目有效期（秒）；只用来挡住同一条消息被重复截取，
+                不宜过长，否则联系人之后再发相同的内容（如"在吗"）不会被回复
+            max_entries: 每类条目的数量上限
+            path: 持久化文件路径（None则只保存在内存中）
+            save_interval: maybe_save() 两次写文件的最小间隔（秒）
+            clock: 时钟（使用墙上时间，重启后过期时间仍然有效）
+        """
+        self.window_seconds = window_seconds
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: Dict[str, "OrderedDict[str, float]"] = {kind: OrderedDict() for kind in self.KINDS}
+        self.save_interval = save_interval
+        self._dirty = False
+        self._saved_at = clock()
+        self.stats = {"replied_hits": 0, "outgoing_hits": 0, "evicted": 0}
+        if path:
+            self.load()
+
+    # ---------- 条目 ----------
+
+    def _prune(self, entries: "OrderedDict[str, float]", now: float):
+        """淘汰过期和超出上限的条目（调用方持有锁）"""
+        cutoff = now - self.window_seconds
+        while entries and (len(entries) > self.max_entries or next(iter(entries.values())) < cutoff):
+            entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def _add(self, kind: str, chat: Optional[str], content: Optional[str]):
+        digest = reply_digest(chat, content)
+        with self._lock:
+            now = self._clock()
+            entries = self._entries[kind]
+            entries.pop(digest, None)
+            entries[digest] = now
+            self._prune(entries, now)
+            self._dirty = True
+
+    def _contains(self, kind: str, chat: Optional[str], content: Optional[str]) -> bool:
+        digest = reply_digest(chat, content)
+        with self._lock:
+            entries = self._entries[kind]
+            self._prune(entries, self._clock())
+            if digest in entries:
+                self.stats[f"{kind}_hits"] += 1
+                return True
+            return False
+
+    def mark_replied(self, chat: Optional[str], content: Optional[str]):
+        """记录已回复（或已决定回复）的消息"""
+        self._add("replied", chat, content)
+
+    def unmark_replied(self, chat: Optional[str], content: Optional[str]):
+        """撤销记录（回复发送失败时，让下一次检测可以重试）"""
+        with self._lock:
+            if self._entries["replied"].pop(reply_digest(chat, content), None) is not None:
+                self._dirty = True
+
+    def was_replied(self, chat: Optional[str], content: Optional[str]) -> bool:
+        """窗口期内是否已回复过该会话的这条消息"""
+        return self._contains("replied", chat, content)
+
+    def record_outgoing(self, chat: Optional[str], content: Optional[str]):
+        """记录自己发出的消息"""
+        self._add("outgoing", chat, content)
+
+    def is_own(self, chat: Optional[str], content: Optional[str]) -> bool:
+        """内容是否是自己在该会话发出的消息"""
+        return self._contains("outgoing", chat, content)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    # ---------- 持久化 ----------
+
+    def load(self):
+        """从持久化文件加载未过期的条目（文件不存在或损坏时从空开始）"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"回复去重记录读取失败，从空记录开始: {e}")
+            return
+        with self._lock:
+            now = self._clock()
+            for kind in self.KINDS:
+                items = sorted(data.get(kind, {}).items(), key=lambda item: item[1])
+                entries = self._entries[kind]
+                entries.clear()
+                entries.update(items)
+                self._prune(entries, now)
+
+    def save(self):
+        """写入持久化文件（先写临时文件再替换，中途退出不会损坏原文件）"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {kind: dict(entries) for kind, entries in self._entries.items()}
+                self._dirty = False
+                self._saved_at = self._clock()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def maybe_save(self):
+        """距上次写文件超过 save_interval 时保存（每次发送后调用，不必每次都写盘）"""
+        if self.path and self._dirty and self._clock() - self._saved_at >= self.save_interval:
+            self.save()
+
+
+_deduplicator: Optional[MessageDeduplicator] = None
+
+
+def get_message_deduplicator() -> MessageDeduplicator:
+    """获取全局消息去重器实例"""
+    global _deduplicator
+    if _deduplicator is None:
+        import redis
+        _deduplicator = MessageDeduplicator(
+            redis_client=redis.Redis.from_url(settings.redis_url),
+            ttl_seconds=settings.dedup_ttl_seconds,
+            bucket_seconds=settings.dedup_bucket_seconds,
+            bloom_capacity=settings.dedup_bloom_capacity,
+            bloom_error_rate=settings.dedup_bloom_error_rate,
+        )
+    return _deduplicator
+
+
+_reply_store: Optional[ReplyDedupStore] = None
+
+
+def get_reply_dedup_store() -> ReplyDedupStore:
+    """获取按配置创建的全局回复去重记录"""
+    global _reply_store
+    if _reply_store is None:
+        _reply_store = ReplyDedupStore(
+            window_seconds=settings.reply_dedup_window_seconds,
+            max_entries=settings.reply_dedup_max_entries,
+            path=settings.reply_dedup_path,
+        )
+    return _reply_store
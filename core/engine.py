@@ -0,0 +1,442 @@
+"""
+进程内异步引擎 - 无需Redis/Celery的单进程运行模式
+
+监听、处理、发送三个阶段运行在同一个asyncio事件循环中，通过有界内存队列衔接：
+
+    listener -> inbound queue -> workers (技能处理) -> outbound queue -> sender
+
+- 所有设备操作（扫描、发送）都在单线程的设备执行器中串行执行，避免手势冲突
+- 技能执行是同步代码，在默认线程池中运行，技能接口与Celery路径完全一致
+- 发送阶段把积压的回复交给 SendScheduler，按联系人合并、按导航代价排序后发送
+- 入站消息可写入可插拔的持久化日志（MessageJournal）：队列满时消息只留在
+  日志中（溢出到磁盘），队列有空位时再回填；重启后自动重放未确认的消息
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set, Tuple
+from loguru import logger
+from core.dedup import MessageDeduplicator
+from core.polling import AdaptivePollScheduler, create_poll_scheduler
+from core.processor import MessageProcessor
+from interfaces.message_platform import IMessagePlatform
+from implementations.wechat.send_queue import OutboundMessage, SendScheduler
+
+
+class MessageJournal(ABC):
+    """入站消息日志的抽象基类"""
+
+    # 是否持久化；非持久化日志在队列满时引擎会阻塞监听（背压）而不是溢出
+    durable: bool = False
+
+    @abstractmethod
+    def append(self, entry_id: str, message: Dict[str, Any]) -> None:
+        """记录一条待处理消息"""
+        pass
+
+    @abstractmethod
+    def ack(self, entry_id: str) -> None:
+        """确认消息已处理完成"""
+        pass
+
+    @abstractmethod
+    def pending(self, limit: int, exclude: Set[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """按写入顺序返回最多limit条未确认且不在exclude中的消息"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """未确认消息数量"""
+        pass
+
+    def close(self) -> None:
+        """释放资源"""
+        pass
+
+
+class NullJournal(MessageJournal):
+    """不做任何记录的日志（默认）"""
+
+    durable = False
+
+    def __init__(self):
+        self._count = 0
+
+    def append(self, entry_id: str, message: Dict[str, Any]) -> None:
+        self._count += 1
+
+    def ack(self, entry_id: str) -> None:
+        self._count = max(0, self._count - 1)
+
+    def pending(self, limit: int, exclude: Set[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        return []
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class FileJournal(MessageJournal):
+    """
+    追加写入的JSON Lines日志
+
+    内存中只保存未确认条目的文件偏移量，消息本体留在磁盘上；
+    已确认记录累积到一定数量后自动压缩文件。
+    """
+
+    durable = True
+
+    def __init__(self, path: str, fsync: bool = False, compact_threshold: int = 1000):
+        self.path = path
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._acked_since_compact = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a+b")
+        self._load()
+
+    def _load(self):
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"忽略损坏的日志记录: offset={offset}")
+                offset += len(line)
+                continue
+            if record.get("op") == "append":
+                self._index[record["id"]] = offset
+            elif record.get("op") == "ack":
+                self._index.pop(record["id"], None)
+                self._acked_since_compact += 1
+            offset += len(line)
+        if self._index:
+            logger.info(f"消息日志中有 {len(self._index)} 条未确认消息待重放")
+
+    def _write(self, record: Dict[str, Any]) -> int:
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        return offset
+
+    def append(self, entry_id: str, message: Dict[str, Any]) -> None:
+        self._index[entry_id] = self._write({"op": "append", "id": entry_id, "msg": message})
+
+    def ack(self, entry_id: str) -> None:
+        if self._index.pop(entry_id, None) is None:
+            return
+        self._write({"op": "ack", "id": entry_id})
+        self._acked_since_compact += 1
+        if self._acked_since_compact >= self.compact_threshold:
+            self._compact()
+
+    def _read(self, offset: int) -> Dict[str, Any]:
+        self._file.seek(offset)
+        return json.loads(self._file.readline())["msg"]
+
+    def pending(self, limit: int, exclude: Set[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        entries = []
+        for entry_id, offset in self._index.items():
+            if len(entries) >= limit:
+                break
+            if entry_id not in exclude:
+                entries.append((entry_id, self._read(offset)))
+        return entries
+
+    def _compact(self):
+        """只保留未确认的记录，重写日志文件"""
+        tmp_path = self.path + ".tmp"
+        new_index: "OrderedDict[str, int]" = OrderedDict()
+        with open(tmp_path, "wb") as tmp:
+            for entry_id, offset in self._index.items():
+                new_index[entry_id] = tmp.tell()
+                record = {"op": "append", "id": entry_id, "msg": self._read(offset)}
+                tmp.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a+b")
+        self._index = new_index
+        self._acked_since_compact = 0
+        logger.debug(f"消息日志已压缩，剩余 {len(new_index)} 条")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _OutboundPlatform:
+    """
+    技能看到的平台代理：send_message 只把消息放入发送队列，
+    由发送阶段在设备线程中真正发送；其它属性透传给真实平台。
+    """
+
+    def __init__(self, engine: "AsyncEngine", entry_id: str):
+        self._engine = engine
+        self._entry_id = entry_id
+
+    def send_message(self, receiver: str, content: str) -> bool:
+        self._engine._enqueue_send_threadsafe(self._entry_id, receiver, content)
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._engine.platform, name)
+
+
+class AsyncEngine:
+    """进程内异步消息引擎"""
+
+    def __init__(
+        self,
+        platform: IMessagePlatform,
+        processor: MessageProcessor,
+        journal: Optional[MessageJournal] = None,
+        queue_size: int = 100,
+        workers: int = 2,
+        scheduler: Optional[AdaptivePollScheduler] = None,
+        deduplicator: Optional[MessageDeduplicator] = None,
+    ):
+        self.platform = platform
+        self.processor = processor
+        self.journal = journal if journal is not None else NullJournal()
+        self.queue_size = queue_size
+        self.workers = workers
+        self.scheduler = scheduler or AdaptivePollScheduler()
+        self.deduplicator = deduplicator
+
+        self._device_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="device")
+        self.sender = SendScheduler(platform)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inbound: Optional[asyncio.Queue] = None
+        self._outbound: Optional[asyncio.Queue] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        self._in_flight: Set[str] = set()
+        self._processed: Set[str] = set()
+        self._open_sends: Dict[str, int] = {}
+        self.stats = {"received": 0, "duplicates": 0, "spilled": 0, "processed": 0, "sent": 0, "send_failures": 0}
+
+    # ---------- 入站 ----------
+
+    async def submit(self, message: Dict[str, Any]) -> None:
+        """提交一条入站消息"""
+        if self.deduplicator and self.deduplicator.is_duplicate(message):
+            self.stats["duplicates"] += 1
+            return
+
+        entry_id = uuid.uuid4().hex
+        self.journal.append(entry_id, message)
+        self.stats["received"] += 1
+
+        if not self.journal.durable:
+            # 没有持久化日志时不能丢消息，只能等待队列空位（背压）
+            self._in_flight.add(entry_id)
+            await self._inbound.put((entry_id, message))
+            return
+
+        try:
+            self._inbound.put_nowait((entry_id, message))
+            self._in_flight.add(entry_id)
+        except asyncio.QueueFull:
+            self.stats["spilled"] += 1
+            logger.debug(f"入站队列已满，消息溢出到日志: {entry_id}")
+
+    def _refill(self):
+        """把日志中尚未入队的消息（溢出或上次未处理完的）回填到队列"""
+        if not self.journal.durable or len(self.journal) <= len(self._in_flight):
+            return
+        room = self.queue_size - self._inbound.qsize()
+        if room <= 0:
+            return
+        for entry_id, message in self.journal.pending(room, self._in_flight):
+            self._inbound.put_nowait((entry_id, message))
+            self._in_flight.add(entry_id)
+
+    async def _listen(self):
+        logger.info("引擎监听阶段启动")
+        while not self._stopping.is_set():
+            scan_started = time.monotonic()
+            messages = []
+            try:
+                messages = await self._loop.run_in_executor(
+                    self._device_executor, self.platform.get_unread_messages
+                )
+                for message in messages:
+                    await self.submit(message)
+                self._refill()
+            except Exception as e:
+                logger.error(f"轮询消息失败: {e}", exc_info=True)
+            self.scheduler.record_scan(time.monotonic() - scan_started, len(messages))
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.scheduler.next_delay())
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- 处理 ----------
+
+    async def _work(self, worker_id: int):
+        while True:
+            entry_id, message = await self._inbound.get()
+            try:
+                proxy = _OutboundPlatform(self, entry_id)
+                result = await self._loop.run_in_executor(None, self.processor.process, message, proxy)
+                self.stats["processed"] += 1
+                logger.debug(f"worker-{worker_id} 处理完成: {result.get('status')}")
+            except Exception as e:
+                logger.error(f"worker-{worker_id} 处理消息失败: {e}", exc_info=True)
+            finally:
+                self._processed.add(entry_id)
+                self._maybe_ack(entry_id)
+                self._refill()
+                self._inbound.task_done()
+
+    # ---------- 发送 ----------
+
+    def _enqueue_send_threadsafe(self, entry_id: str, receiver: str, content: str):
+        """在技能线程中调用：把发送请求放入发送队列（队列满时阻塞技能线程）"""
+        def _register():
+            self._open_sends[entry_id] = self._open_sends.get(entry_id, 0) + 1
+
+        self._loop.call_soon_threadsafe(_register)
+        asyncio.run_coroutine_threadsafe(
+            self._outbound.put((entry_id, receiver, content)), self._loop
+        ).result()
+
+    async def _send(self):
+        logger.info("引擎发送阶段启动")
+        while True:
+            # 取出当前积压的全部发送请求，交给发送调度器合并发送
+            items = [await self._outbound.get()]
+            while not self._outbound.empty():
+                items.append(self._outbound.get_nowait())
+            for entry_id, receiver, content in items:
+                self.sender.submit(receiver, content, callback=self._sent_callback(entry_id))
+            try:
+                await self._loop.run_in_executor(self._device_executor, self.sender.run_pending)
+            except Exception as e:
+                logger.error(f"发送阶段异常: {e}", exc_info=True)
+            finally:
+                for _ in items:
+                    self._outbound.task_done()
+
+    def _sent_callback(self, entry_id: str):
+        """发送完成回调（在设备线程中调用），切回事件循环更新状态"""
+        def _done(message: OutboundMessage):
+            self._loop.call_soon_threadsafe(self._finish_send, entry_id, message)
+        return _done
+
+    def _finish_send(self, entry_id: str, message: OutboundMessage):
+        self.stats["sent" if message.ok else "send_failures"] += 1
+        if not message.ok:
+            logger.error(f"发送消息失败: {message.receiver}")
+        self._open_sends[entry_id] = self._open_sends.get(entry_id, 1) - 1
+        self._maybe_ack(entry_id)
+
+    def _maybe_ack(self, entry_id: str):
+        """消息处理完成且其产生的发送全部结束后才确认"""
+        if entry_id in self._processed and self._open_sends.get(entry_id, 0) <= 0:
+            self._processed.discard(entry_id)
+            self._open_sends.pop(entry_id, None)
+            self._in_flight.discard(entry_id)
+            self.journal.ack(entry_id)
+
+    # ---------- 生命周期 ----------
+
+    async def run(self, listen: bool = True):
+        """运行引擎直到 stop() 被调用"""
+        self._loop = asyncio.get_running_loop()
+        self._inbound = asyncio.Queue(maxsize=self.queue_size)
+        self._outbound = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = asyncio.Event()
+
+        self._refill()
+
+        tasks = [asyncio.create_task(self._work(i)) for i in range(self.workers)]
+        tasks.append(asyncio.create_task(self._send()))
+        listener = asyncio.create_task(self._listen()) if listen else None
+
+        logger.success(f"进程内引擎已启动: workers={self.workers}, queue_size={self.queue_size}")
+        try:
+            await self._stopping.wait()
+            if listener:
+                await listener
+            # 排空队列后再退出
+            await self._inbound.join()
+            await self._outbound.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._device_executor.shutdown(wait=False)
+            self.journal.close()
+            logger.info(f"进程内引擎已停止: {self.stats}, 发送: {self.sender.stats()}")
+
+    def stop(self):
+        """请求停止引擎（线程安全）"""
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+
+def run_engine():
+    """
+    以单进程模式运行：监听、处理、发送都在本进程内完成，不依赖Redis和Celery
+    """
+    from core.config import settings
+    from core.listeners import initialize_platform
+    from core.processor import get_message_processor
+
+    logger.info("进程内引擎启动中...")
+
+    try:
+        platform = initialize_platform()
+        logger.success("微信平台初始化成功")
+    except Exception as e:
+        logger.error(f"初始化微信平台失败: {e}", exc_info=True)
+        return
+
+    processor = get_message_processor()
+    if not processor.skills:
+        from skills.echo_skill import EchoSkill
+        processor.register_skill(EchoSkill())
+
+    journal = FileJournal(settings.engine_journal_path) if settings.engine_journal_path else NullJournal()
+    deduplicator = None
+    if settings.dedup_enabled:
+        deduplicator = MessageDeduplicator(
+            redis_client=None,
+            ttl_seconds=settings.dedup_ttl_seconds,
+            bucket_seconds=settings.dedup_bucket_seconds,
+            bloom_capacity=settings.dedup_bloom_capacity,
+            bloom_error_rate=settings.dedup_bloom_error_rate,
+        )
+
+    engine = AsyncEngine(
+        platform=platform,
+        processor=processor,
+        journal=journal,
+        queue_size=settings.engine_queue_size,
+        workers=settings.engine_workers,
+        scheduler=create_poll_scheduler(),
+        deduplicator=deduplicator,
+    )
+
+    try:
+        asyncio.run(engine.run())
+    except KeyboardInterrupt:
+        logger.info("接收到键盘中断信号，正在关闭引擎...")
+    finally:
+        platform.disconnect()
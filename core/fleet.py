@@ -0,0 +1,272 @@
+"""
+设备集群管理 - 每台手机一个独立的监听进程
+
+- 从配置读取设备序列号列表，为每台设备启动一个监听worker进程
+- worker崩溃或退出后按指数退避自动重启；稳定运行一段时间后退避清零
+- 各worker在每次扫描后上报统计，汇总为统一的集群状态视图（日志 + JSON文件）
+
+设备之间互不共享状态，增加手机即线性增加吞吐。
+"""
+import json
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from core.config import settings
+
+
+def load_device_serials() -> List[str]:
+    """
+    读取设备序列号列表
+
+    优先使用 FLEET_DEVICES（JSON列表），否则读取 FLEET_DEVICES_FILE（每行一个序列号，#开头为注释）
+    """
+    serials = list(settings.fleet_devices)
+    if not serials and settings.fleet_devices_file and os.path.exists(settings.fleet_devices_file):
+        with open(settings.fleet_devices_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    serials.append(line)
+    # 去重并保持顺序
+    return list(dict.fromkeys(serials))
+
+
+def _device_worker(serial: str, status_queue):
+    """worker进程入口：运行单台设备的监听循环"""
+    from core.logging_config import setup_logging
+    from core.listeners import run_wechat_listener
+
+    setup_logging()
+    logger.info(f"设备worker启动: {serial} (pid={os.getpid()})")
+
+    def report(stats: Dict[str, Any]):
+        try:
+            status_queue.put_nowait({"serial": serial, "pid": os.getpid(), **stats})
+        except queue.Full:
+            pass
+
+    run_wechat_listener(device_serial=serial, on_status=report)
+
+
+class DeviceWorker:
+    """单台设备worker的监管状态"""
+
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.process = None
+        self.state = "pending"
+        self.started_at: Optional[float] = None
+        self.next_start_at = 0.0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.last_report: Dict[str, Any] = {}
+        self.last_report_at: Optional[float] = None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class FleetSupervisor:
+    """设备集群监管器"""
+
+    def __init__(
+        self,
+        serials: List[str],
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        stable_after: float = 120.0,
+        stale_after: float = 600.0,
+        status_interval: float = 30.0,
+        status_path: Optional[str] = None,
+    ):
+        self.workers: Dict[str, DeviceWorker] = {serial: DeviceWorker(serial) for serial in serials}
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.stale_after = stale_after
+        self.status_interval = status_interval
+        self.status_path = status_path
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self.status_queue = self._ctx.Queue(maxsize=10000)
+        self._running = False
+        self._last_status_log = 0.0
+
+    def _spawn(self, worker: DeviceWorker):
+        """启动worker进程（测试中可替换）"""
+        process = self._ctx.Process(
+            target=_device_worker,
+            args=(worker.serial, self.status_queue),
+            name=f"listener-{worker.serial}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def backoff_delay(self, failures: int) -> float:
+        """第failures次连续失败后的重启等待时间"""
+        if failures <= 0:
+            return 0.0
+        return min(self.base_backoff * (2 ** (failures - 1)), self.max_backoff)
+
+    def _start(self, worker: DeviceWorker, now: float):
+        worker.process = self._spawn(worker)
+        worker.started_at = now
+        worker.state = "running"
+        logger.info(f"设备 {worker.serial} 监听进程已启动 (第{worker.restarts}次重启)" if worker.restarts else
+                    f"设备 {worker.serial} 监听进程已启动")
+
+    def check_workers(self, now: Optional[float] = None):
+        """检查所有worker，处理退出和到期的重启"""
+        now = time.time() if now is None else now
+        for worker in self.workers.values():
+            if worker.is_alive():
+                continue
+
+            if worker.state == "running":
+                # 进程已退出：监听循环应当永久运行，任何退出都视为故障
+                worker.last_exit_code = worker.process.exitcode if worker.process else None
+                uptime = now - worker.started_at if worker.started_at is not None else 0.0
+                if uptime >= self.stable_after:
+                    worker.consecutive_failures = 0
+                worker.consecutive_failures += 1
+                delay = self.backoff_delay(worker.consecutive_failures)
+                worker.next_start_at = now + delay
+                worker.state = "backoff"
+                logger.warning(
+                    f"设备 {worker.serial} 监听进程退出 (exit={worker.last_exit_code}, "
+                    f"运行{uptime:.0f}秒)，{delay:.0f}秒后重启"
+                )
+                continue
+
+            if worker.state in ("pending", "backoff") and now >= worker.next_start_at:
+                if worker.state == "backoff":
+                    worker.restarts += 1
+                try:
+                    self._start(worker, now)
+                except Exception as e:
+                    worker.consecutive_failures += 1
+                    worker.next_start_at = now + self.backoff_delay(worker.consecutive_failures)
+                    worker.state = "backoff"
+                    logger.error(f"设备 {worker.serial} 监听进程启动失败: {e}")
+
+    def drain_status(self):
+        """读取worker上报的统计"""
+        while True:
+            try:
+                report = self.status_queue.get_nowait()
+            except queue.Empty:
+                break
+            worker = self.workers.get(report.get("serial"))
+            if worker:
+                worker.last_report = report
+                worker.last_report_at = time.time()
+
+    def status(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """汇总的集群状态视图"""
+        now = time.time() if now is None else now
+        devices = {}
+        totals = {"devices": len(self.workers), "healthy": 0, "scans": 0, "messages": 0,
+                  "dispatched": 0, "duplicates": 0, "errors": 0, "restarts": 0}
+
+        for serial, worker in self.workers.items():
+            report = worker.last_report
+            stale = worker.last_report_at is None or now - worker.last_report_at > self.stale_after
+            healthy = worker.is_alive() and not stale
+            uptime = now - worker.started_at if worker.started_at is not None and worker.is_alive() else 0.0
+            devices[serial] = {
+                "state": worker.state,
+                "healthy": healthy,
+                "pid": report.get("pid"),
+                "uptime": round(uptime, 1),
+                "restarts": worker.restarts,
+                "last_exit_code": worker.last_exit_code,
+                "last_report_age": round(now - worker.last_report_at, 1) if worker.last_report_at is not None else None,
+                "scans": report.get("scans", 0),
+                "messages": report.get("messages", 0),
+                "dispatched": report.get("dispatched", 0),
+                "duplicates": report.get("duplicates", 0),
+                "errors": report.get("errors", 0),
+                "messages_per_min": round(report.get("messages", 0) / uptime * 60, 2) if uptime else 0.0,
+                "poll_interval": report.get("interval"),
+                "scan_p95": report.get("scan_p95"),
+            }
+            totals["healthy"] += int(healthy)
+            totals["restarts"] += worker.restarts
+            for key in ("scans", "messages", "dispatched", "duplicates", "errors"):
+                totals[key] += devices[serial][key]
+
+        return {"updated_at": now, "totals": totals, "devices": devices}
+
+    def _publish_status(self):
+        status = self.status()
+        totals = status["totals"]
+        logger.info(
+            f"集群状态: {totals['healthy']}/{totals['devices']} 健康, "
+            f"消息 {totals['messages']}, 分发 {totals['dispatched']}, 错误 {totals['errors']}, 重启 {totals['restarts']}"
+        )
+        for serial, device in status["devices"].items():
+            logger.debug(f"  {serial}: {device}")
+
+        if self.status_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.status_path)), exist_ok=True)
+                tmp_path = self.status_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(status, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.status_path)
+            except Exception as e:
+                logger.warning(f"写入集群状态文件失败: {e}")
+
+    def run(self, tick: float = 1.0):
+        """运行监管循环直到 stop() 或键盘中断"""
+        self._running = True
+        logger.info(f"设备集群监管启动: {len(self.workers)} 台设备")
+        try:
+            while self._running:
+                self.drain_status()
+                self.check_workers()
+                if time.time() - self._last_status_log >= self.status_interval:
+                    self._publish_status()
+                    self._last_status_log = time.time()
+                time.sleep(tick)
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._running = False
+
+    def shutdown(self, timeout: float = 10.0):
+        """终止所有worker进程"""
+        for worker in self.workers.values():
+            if worker.is_alive():
+                worker.process.terminate()
+        deadline = time.time() + timeout
+        for worker in self.workers.values():
+            if worker.process is not None:
+                worker.process.join(max(0.0, deadline - time.time()))
+            worker.state = "stopped"
+        logger.info("设备集群已停止")
+
+
+def run_fleet():
+    """按配置的设备列表运行设备集群"""
+    serials = load_device_serials()
+    if not serials:
+        logger.error("未配置设备列表，请设置 FLEET_DEVICES 或 FLEET_DEVICES_FILE")
+        return
+
+    supervisor = FleetSupervisor(
+        serials,
+        base_backoff=settings.fleet_restart_backoff,
+        max_backoff=settings.fleet_restart_backoff_max,
+        status_path=settings.fleet_status_path,
+    )
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        logger.info("接收到键盘中断信号，正在关闭设备集群...")
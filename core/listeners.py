@@ -1,36 +1,60 @@
 import time
+from typing import Any, Callable, Dict, Optional
 from loguru import logger
+from core.config import settings
+from core.dedup import get_message_deduplicator
+from core.polling import create_poll_scheduler
 from core.tasks import process_wechat_message
 from implementations.wechat.wechat_platform import WeChatPlatform
+from implementations.wechat.notification_source import create_notification_watcher
+from implementations.wechat.instrumentation import get_rpc_stats
+from implementations.wechat.waits import get_wait_stats
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=4, max=60)
 )
-def initialize_platform():
+def initialize_platform(device_serial: Optional[str] = None):
     """初始化微信平台，带重试机制"""
-    logger.info("正在初始化微信平台...")
-    platform = WeChatPlatform()
+    logger.info(f"正在初始化微信平台... device={device_serial or 'default'}")
+    platform = WeChatPlatform(device_serial=device_serial)
     if not platform.connect():
         raise ConnectionError("无法连接到微信平台")
     return platform
 
-def run_wechat_listener():
+def run_wechat_listener(
+    device_serial: Optional[str] = None,
+    on_status: Optional[Callable[[Dict[str, Any]], None]] = None,
+):
     """
     初始化微信平台并运行轮询循环，监听新消息
     将消息分发到Celery队列进行异步处理
+    
+    Args:
+        device_serial: 设备序列号（None则使用第一个设备）
+        on_status: 每次扫描后回调，传入累计统计（供设备集群汇总状态）
     """
     logger.info("微信消息监听服务启动中...")
     
     try:
-        platform = initialize_platform()
+        platform = initialize_platform(device_serial)
         logger.success("微信平台初始化成功")
     except Exception as e:
         logger.error(f"初始化微信平台失败: {e}", exc_info=True)
         logger.error("监听服务退出")
         return
 
+    deduplicator = get_message_deduplicator() if settings.dedup_enabled else None
+    scheduler = create_poll_scheduler()
+    watcher = None
+    if settings.message_source == "notification":
+        watcher = create_notification_watcher(device_serial, poll_interval=settings.notification_poll_interval)
+        # 启动时已有的通知只作为基准
+        watcher.check()
+        logger.info("使用通知驱动模式：收到微信通知时才扫描UI")
+    counters = {"scans": 0, "messages": 0, "dispatched": 0, "duplicates": 0, "errors": 0}
+
     logger.info("开始轮询消息...")
     consecutive_errors = 0
     max_consecutive_errors = 5
@@ -38,14 +62,26 @@ def run_wechat_listener():
     while True:
         try:
             # 获取未读消息（当前是模拟实现）
+            scan_started = time.monotonic()
             unread_messages = platform.get_unread_messages()
+            scheduler.record_scan(time.monotonic() - scan_started, len(unread_messages))
+            counters["scans"] += 1
+            counters["messages"] += len(unread_messages)
 
             if unread_messages:
                 logger.info(f"发现 {len(unread_messages)} 条新消息，分发到Celery队列...")
                 for msg in unread_messages:
+                    # 记录来源设备，worker回复时使用同一台设备
+                    if device_serial:
+                        msg.setdefault("device_serial", device_serial)
+                    if deduplicator and deduplicator.is_duplicate(msg):
+                        logger.debug(f"跳过重复消息: sender={msg.get('sender')}")
+                        counters["duplicates"] += 1
+                        continue
                     try:
                         # 分发消息到Celery worker异步处理
                         task = process_wechat_message.delay(msg)
+                        counters["dispatched"] += 1
                         logger.debug(f"消息已分发: task_id={task.id}, sender={msg.get('sender')}")
                     except Exception as dispatch_error:
                         logger.error(f"消息分发失败: {dispatch_error}", exc_info=True)
@@ -53,16 +89,35 @@ def run_wechat_listener():
                 # 重置错误计数
                 consecutive_errors = 0
             
-            # 等待一段时间再次轮询，避免高CPU占用
-            time.sleep(10)
+            if scheduler.scans % 100 == 0:
+                logger.info(f"轮询统计: {scheduler.stats()}")
+                logger.info(f"界面等待统计: {get_wait_stats().summary()}")
+                logger.info(f"设备RPC耗时Top: {get_rpc_stats().top()}")
+            
+            if on_status:
+                on_status({**counters, "last_scan_at": time.time(), **scheduler.stats()})
+            
+            if watcher:
+                # 微信在前台时不发通知：扫描后退到后台，新消息才会出现在通知栏
+                platform.send_to_background()
+                # 等待微信通知，没有通知时不触碰UI；超时后兜底扫描一次
+                events = watcher.wait_for_activity(timeout=settings.notification_fallback_interval)
+                if events:
+                    logger.debug(f"收到 {len(events)} 条微信通知: {[e.title for e in events]}")
+            else:
+                # 根据近期活动自适应等待：有消息时快速跟进，空闲时逐步退避
+                time.sleep(scheduler.next_delay())
 
         except KeyboardInterrupt:
             logger.info("接收到键盘中断信号，正在关闭监听服务...")
+            if watcher:
+                watcher.close()
             platform.disconnect()
             break
             
         except Exception as e:
             consecutive_errors += 1
+            counters["errors"] += 1
             logger.error(
                 f"轮询过程中发生错误 ({consecutive_errors}/{max_consecutive_errors}): {e}",
                 exc_info=True
@@ -71,6 +126,8 @@ def run_wechat_listener():
             # 检查是否超过最大连续错误次数
             if consecutive_errors >= max_consecutive_errors:
                 logger.critical("连续错误次数过多，监听服务退出")
+                if watcher:
+                    watcher.close()
                 platform.disconnect()
                 break
             
@@ -82,7 +139,7 @@ def run_wechat_listener():
             # 尝试重新连接
             try:
                 logger.info("尝试重新连接微信平台...")
-                platform = initialize_platform()
+                platform = initialize_platform(device_serial)
                 logger.success("重新连接成功")
                 consecutive_errors = 0
             except Exception as reconnect_error:
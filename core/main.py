@@ -13,6 +13,8 @@ from core.logging_config import setup_logging
 logger = setup_logging()
 
 from core.listeners import run_wechat_listener
+from core.engine import run_engine
+from core.fleet import run_fleet
 # from core.api import run_api_server # To be implemented
 
 def main():
@@ -26,8 +28,8 @@ def main():
     parser = argparse.ArgumentParser(description="OpenWechatAI-Core Services")
     parser.add_argument(
         "service", 
-        choices=["listener", "api", "worker"], 
-        help="The service to start: listener (消息监听), api (API服务), worker (Celery工作进程)"
+        choices=["listener", "api", "worker", "engine", "fleet"], 
+        help="The service to start: listener (消息监听), api (API服务), worker (Celery工作进程), engine (单进程模式，无需Redis/Celery), fleet (多设备监听集群)"
     )
     parser.add_argument(
         "--debug",
@@ -47,6 +49,14 @@ def main():
             logger.info("启动微信消息监听服务...")
             run_wechat_listener()
             
+        elif args.service == "fleet":
+            logger.info("启动多设备监听集群...")
+            run_fleet()
+            
+        elif args.service == "engine":
+            logger.info("启动进程内引擎（监听+处理+发送）...")
+            run_engine()
+            
         elif args.service == "api":
             logger.info("启动API服务...")
             # run_api_server() # To be implemented
@@ -0,0 +1,131 @@
+"""
+自适应轮询调度 - 决定两次未读消息扫描之间的等待时间
+
+- 有新消息后立即回到最短间隔，快速跟进对话
+- 空闲时按指数退避逐步拉长间隔，减少设备负载
+- 可按时段配置不同的最短/最长间隔（如夜间更长）
+- 记录每次扫描耗时，便于调优
+"""
+from collections import deque
+from datetime import datetime, time as dt_time
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+from core.config import settings
+
+
+def _in_time_range(time_range: str, current: dt_time) -> bool:
+    """检查时间是否在 "HH:MM-HH:MM" 范围内（支持跨越午夜）"""
+    start_str, end_str = time_range.split("-")
+    start = datetime.strptime(start_str.strip(), "%H:%M").time()
+    end = datetime.strptime(end_str.strip(), "%H:%M").time()
+    if start <= end:
+        return start <= current <= end
+    return current >= start or current <= end
+
+
+class PollProfile:
+    """时段轮询配置"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.name = config.get("name", config.get("time_range", "profile"))
+        self.time_range = config["time_range"]
+        self.min_interval = float(config["min_interval"])
+        self.max_interval = float(config["max_interval"])
+
+    def matches(self, current: dt_time) -> bool:
+        try:
+            return _in_time_range(self.time_range, current)
+        except Exception as e:
+            logger.error(f"轮询时段解析失败 {self.time_range}: {e}")
+            return False
+
+
+class AdaptivePollScheduler:
+    """
+    自适应轮询调度器
+
+    间隔指两次扫描开始之间的时间，等待时长会扣除本次扫描已花费的时间。
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        backoff_factor: float = 1.5,
+        profiles: Optional[List[Dict[str, Any]]] = None,
+        now: Callable[[], datetime] = datetime.now,
+        window: int = 200,
+    ):
+        self.default_min = min_interval
+        self.default_max = max_interval
+        self.backoff_factor = max(1.0, backoff_factor)
+        self.profiles = [PollProfile(p) for p in (profiles or [])]
+        self._now = now
+
+        self.interval = min_interval
+        self._last_scan_duration = 0.0
+        self._scan_durations = deque(maxlen=window)
+        self.scans = 0
+        self.active_scans = 0
+
+    def _bounds(self):
+        """返回当前时段生效的 (最短间隔, 最长间隔)"""
+        current = self._now().time()
+        for profile in self.profiles:
+            if profile.matches(current):
+                return profile.min_interval, profile.max_interval
+        return self.default_min, self.default_max
+
+    def record_scan(self, duration: float, found: int):
+        """
+        记录一次扫描结果并更新间隔
+
+        Args:
+            duration: 扫描耗时（秒）
+            found: 本次扫描发现的消息数量
+        """
+        self.scans += 1
+        self._last_scan_duration = duration
+        self._scan_durations.append(duration)
+
+        min_interval, max_interval = self._bounds()
+        if found > 0:
+            self.active_scans += 1
+            self.interval = min_interval
+        else:
+            self.interval = self.interval * self.backoff_factor
+        self.interval = min(max(self.interval, min_interval), max_interval)
+
+    def reset(self):
+        """外部事件（如收到通知）提示有活动时回到最短间隔"""
+        self.interval = self._bounds()[0]
+
+    def next_delay(self) -> float:
+        """距离下一次扫描还需等待的时间（秒）"""
+        return max(0.0, self.interval - self._last_scan_duration)
+
+    def stats(self) -> Dict[str, Any]:
+        """扫描耗时统计"""
+        durations = sorted(self._scan_durations)
+        if not durations:
+            return {"scans": self.scans, "active_scans": self.active_scans, "interval": self.interval}
+        return {
+            "scans": self.scans,
+            "active_scans": self.active_scans,
+            "interval": round(self.interval, 3),
+            "scan_avg": round(sum(durations) / len(durations), 3),
+            "scan_p50": round(durations[len(durations) // 2], 3),
+            "scan_p95": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+            "scan_max": round(durations[-1], 3),
+        }
+
+
+def create_poll_scheduler() -> AdaptivePollScheduler:
+    """根据配置创建轮询调度器"""
+    return AdaptivePollScheduler(
+        min_interval=settings.poll_min_interval,
+        max_interval=settings.poll_max_interval,
+        backoff_factor=settings.poll_backoff_factor,
+        profiles=settings.poll_profiles,
+    )
+
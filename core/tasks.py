@@ -65,7 +65,7 @@ def process_wechat_message(self, message: Dict[str, Any]):
                     
                     # 3. 获取平台实例（延迟导入）
                     from implementations.wechat.wechat_platform import WeChatPlatform
-                    platform = WeChatPlatform()
+                    platform = WeChatPlatform(device_serial=message.get("device_serial"))
                     
                     # 4. 执行技能
                     skill.execute(message, platform)
@@ -9,6 +9,10 @@ import time
 from datetime import datetime
 from PIL import Image
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from implementations.wechat.vision import FrameDiffer, to_array
 
 
 class WeChatMessageMonitor:
@@ -33,7 +37,8 @@ class WeChatMessageMonitor:
             'height': int(self.height * 0.7)
         }
         
-        self.last_screenshot = None
+        # 缩小到108×168灰度比较；RGB三通道差之和30约等于灰度差10
+        self.differ = FrameDiffer(pixel_delta=10, min_fraction=0.05, size=(108, 168))
         self.check_interval = 2  # 检查间隔（秒）
     
     def start_wechat(self):
@@ -70,42 +75,13 @@ class WeChatMessageMonitor:
         Returns:
             bool: 是否检测到新消息
         """
-        current = self.get_chat_area_screenshot()
-        
-        if self.last_screenshot is None:
-            self.last_screenshot = current
-            return False
-        
-        # 简单的像素差异检测
-        # 缩小图片加速比较
-        curr_small = current.resize((108, 168))
-        last_small = self.last_screenshot.resize((108, 168))
-        
-        diff_count = 0
-        threshold = 30  # 差异阈值
-        
-        for x in range(108):
-            for y in range(168):
-                p1 = curr_small.getpixel((x, y))
-                p2 = last_small.getpixel((x, y))
-                
-                if isinstance(p1, tuple):
-                    diff = sum(abs(a - b) for a, b in zip(p1, p2))
-                    if diff > threshold:
-                        diff_count += 1
-                else:
-                    if abs(p1 - p2) > threshold:
-                        diff_count += 1
+        result = self.differ.update(to_array(self.get_chat_area_screenshot()))
         
         # 如果超过5%的像素有变化，认为有新消息
-        total_pixels = 108 * 168
-        change_ratio = diff_count / total_pixels
-        
-        has_new = change_ratio > 0.05
+        has_new = result.changed
         
         if has_new:
-            print(f"✓ 检测到变化 ({change_ratio*100:.1f}%)")
-            self.last_screenshot = current
+            print(f"✓ 检测到变化 ({result.fraction*100:.1f}%), 区域: {result.bbox}")
         
         return has_new
     
@@ -0,0 +1,173 @@
+"""
+持久化ADB Shell通道 - 复用一个长期运行的 `adb shell` 进程执行命令
+
+每次 subprocess 调用 adb 都要 fork 进程并与 adb server 重新握手；
+这里每台设备保持一个交互式 shell，用结束标记分隔每条命令的输出，
+标记中带上 $? 得到退出码。
+
+- execute(): 执行一条命令，返回 ShellResult（输出、退出码、耗时）
+- run_batch(): 一次写入多条命令（流水线），只付一次往返等待
+- submit(): 放入命令队列由后台线程执行，调用方不必等待（如按键、亮屏）
+- get_adb_shell(): 按序列号共享的通道注册表
+"""
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+from loguru import logger
+
+
+@dataclass
+class ShellResult:
+    """一条shell命令的执行结果"""
+    command: str
+    output: str
+    exit_code: int
+    duration: float
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+class AdbShell:
+    """单台设备的持久化 adb shell"""
+
+    def __init__(self, device_serial: Optional[str] = None, adb_path: str = "adb"):
+        self.device_serial = device_serial
+        self.adb_path = adb_path
+        self._process: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        # 单线程命令队列（线程在第一次提交时才创建）；在这里创建，避免并发提交时各自创建一个
+        self._queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adb-shell")
+        self.stats = {"commands": 0, "failures": 0, "restarts": 0, "total_seconds": 0.0}
+
+    def _command(self) -> List[str]:
+        cmd = [self.adb_path]
+        if self.device_serial:
+            cmd += ["-s", self.device_serial]
+        return cmd + ["shell"]
+
+    def _ensure_started(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        logger.debug(f"启动持久化adb shell: {self.device_serial or 'default'}")
+        self.stats["restarts"] += 1
+        self._lines = queue.Queue()
+        self._process = subprocess.Popen(
+            self._command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+        threading.Thread(target=self._pump, args=(self._process, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _pump(process: subprocess.Popen, lines: "queue.Queue[Optional[str]]"):
+        """后台读取shell输出，按行放入队列"""
+        for raw in iter(process.stdout.readline, b""):
+            lines.put(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        lines.put(None)
+
+    def _read_until(self, marker: str, command: str, timeout: float):
+        """读取输出直到结束标记，返回 (输出, 退出码)"""
+        output = []
+        while True:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                self.close()
+                raise TimeoutError(f"adb shell命令超时: {command}")
+            if line is None:
+                self._process = None
+                raise ConnectionError("adb shell进程已退出")
+            position = line.find(marker)
+            if position >= 0:
+                # 命令输出末尾没有换行时，标记会与最后一行连在一起
+                if position > 0:
+                    output.append(line[:position])
+                code = line[position + len(marker):].strip()
+                return "\n".join(output), int(code) if code.lstrip("-").isdigit() else -1
+            output.append(line)
+
+    def run_batch(self, commands: Sequence[str], timeout: float = 10.0) -> List[ShellResult]:
+        """
+        流水线执行多条命令：一次写入全部命令，再依次读取各自的输出
+
+        Args:
+            commands: shell命令列表
+            timeout: 等待每一行输出的超时时间（秒）
+
+        Returns:
+            与commands一一对应的结果
+        """
+        with self._lock:
+            self._ensure_started()
+            markers = [f"__OWA_END_{uuid.uuid4().hex}__" for _ in commands]
+            script = "".join(f"{command}; echo {marker}$?\n" for command, marker in zip(commands, markers))
+            started = time.monotonic()
+            self._process.stdin.write(script.encode("utf-8"))
+            self._process.stdin.flush()
+
+            results = []
+            for command, marker in zip(commands, markers):
+                output, exit_code = self._read_until(marker, command, timeout)
+                now = time.monotonic()
+                results.append(ShellResult(command, output, exit_code, now - started))
+                started = now
+                self.stats["commands"] += 1
+                self.stats["total_seconds"] += results[-1].duration
+                if exit_code != 0:
+                    self.stats["failures"] += 1
+            return results
+
+    def execute(self, command: str, timeout: float = 10.0) -> ShellResult:
+        """执行一条命令并返回结果（含退出码）"""
+        return self.run_batch([command], timeout)[0]
+
+    def run(self, command: str, timeout: float = 10.0) -> str:
+        """
+        执行命令并返回输出
+
+        Args:
+            command: shell命令
+            timeout: 等待输出的超时时间（秒）
+
+        Returns:
+            命令输出文本
+        """
+        return self.execute(command, timeout).output
+
+    def submit(self, command: str, timeout: float = 10.0) -> "Future[ShellResult]":
+        """放入命令队列，由后台线程按提交顺序执行"""
+        return self._queue.submit(self.execute, command, timeout)
+
+    def close(self):
+        """停止命令队列并关闭shell进程（之后提交的命令使用新的队列和进程）"""
+        queue_, self._queue = self._queue, ThreadPoolExecutor(max_workers=1, thread_name_prefix="adb-shell")
+        queue_.shutdown(wait=False)
+        if self._process is not None:
+            try:
+                self._process.kill()
+            except Exception:
+                pass
+            self._process = None
+
+
+_shells: Dict[Optional[str], AdbShell] = {}
+_shells_lock = threading.Lock()
+
+
+def get_adb_shell(device_serial: Optional[str] = None) -> AdbShell:
+    """获取设备共享的持久化shell（同一序列号在进程内只有一个）"""
+    with _shells_lock:
+        shell = _shells.get(device_serial)
+        if shell is None:
+            shell = _shells[device_serial] = AdbShell(device_serial)
+        return shell
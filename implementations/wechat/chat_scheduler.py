@@ -0,0 +1,295 @@
+"""
+多会话轮转调度 - 收集所有未读会话（含首屏以下），轮流处理
+
+原来每次检测只处理一个会话（列表最上面的未读行），首屏以下的会话从不处理；
+同时有很多客户在等待时，排在后面的只能等之后的轮询。
+
+- collect_unread(): 逐屏读取聊天列表并向下滚动，按会话名去重；
+  某一屏没有出现新的会话（到达列表底部）或达到页数上限时停止
+- ChatListPager: 聊天列表的滚动位置（第几屏），按收集时所在的屏重新定位会话、滚回顶部；
+  每次滑动后等列表停下（连续两次读取的会话名相同）再读取，避免读到惯性滚动中的画面
+- RoundRobinScheduler: 未读会话按发现顺序排队，每轮每个会话最多处理一次；
+  单个会话有处理时限（per_chat_budget），一轮有总时限（round_budget），
+  超出总时限时剩余会话留在队首，下一轮优先处理，等待时间因此有上界
+"""
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+from implementations.wechat.hierarchy import ChatRow
+from implementations.wechat.waits import wait_until
+
+
+def remaining(deadline: Optional[float], limit: float, minimum: float = 0.5) -> float:
+    """
+    截止时间前还能等待多久
+
+    Args:
+        deadline: 截止时间（time.monotonic），None表示不限
+        limit: 等待时间上限（秒）
+        minimum: 至少等待的时间（秒），已过截止时间时界面仍有机会完成切换
+    """
+    if deadline is None:
+        return limit
+    return max(minimum, min(limit, deadline - time.monotonic()))
+
+
+def collect_unread(
+    read_page: Callable[[], Sequence[ChatRow]],
+    scroll: Callable[[], Any],
+    max_pages: int = 3,
+) -> Tuple[List[Tuple[ChatRow, int]], int]:
+    """
+    逐屏收集未读会话
+
+    Args:
+        read_page: 读取当前一屏的聊天行
+        scroll: 向下滚动一屏
+        max_pages: 最多读取的屏数
+
+    Returns:
+        ([(未读行, 所在屏序号)], 滚动次数)；按列表顺序，同名会话只保留第一次出现
+    """
+    seen = set()
+    unread: List[Tuple[ChatRow, int]] = []
+    scrolls = 0
+    for page in range(max(1, max_pages)):
+        if page:
+            scroll()
+            scrolls += 1
+        rows = read_page()
+        new_rows = [row for row in rows if row.name not in seen]
+        if page and not new_rows:
+            # 滚动后没有新会话：已到列表底部
+            break
+        for row in new_rows:
+            seen.add(row.name)
+            if row.unread:
+                unread.append((row, page))
+    return unread, scrolls
+
+
+class ChatListPager:
+    """聊天列表的分屏滚动与定位（WeChatPlatform 和 WeChatReceiver 共用）"""
+
+    # 滚动一屏的起止位置（占屏幕高度的比例）
+    SCROLL_FROM = 0.75
+    SCROLL_TO = 0.30
+    # 等待滑动停止的时限和读取间隔（秒）
+    SETTLE_TIMEOUT = 1.5
+    SETTLE_INTERVAL = 0.2
+
+    def __init__(
+        self,
+        device,
+        read_page: Callable[[], Sequence[ChatRow]],
+        width: int,
+        height: int,
+        settle_read: Optional[Callable[[], Sequence[ChatRow]]] = None,
+    ):
+        """
+        Args:
+            device: uiautomator2 设备对象
+            read_page: 读取当前一屏的聊天行
+            width, height: 屏幕尺寸
+            settle_read: 判断滑动是否停止时读取当前一屏（必须重新dump，不能用层级缓存；
+                不需要截图标记未读），None则使用read_page
+        """
+        self.device = device
+        self.read_page = read_page
+        self.settle_read = settle_read or read_page
+        self.width = width
+        self.height = height
+        self.page: Optional[int] = 0  # 当前在第几屏（None表示未知）
+
+    def scroll(self, direction: int = 1, deadline: Optional[float] = None):
+        """
+        滚动一屏
+
+        Args:
+            direction: 1 向下，-1 向上
+            deadline: 截止时间（time.monotonic），限制等待列表停止的时间
+        """
+        x = self.width // 2
+        top, bottom = int(self.height * self.SCROLL_TO), int(self.height * self.SCROLL_FROM)
+        if direction > 0:
+            self.device.swipe(x, bottom, x, top, duration=0.2)
+        else:
+            self.device.swipe(x, top, x, bottom, duration=0.2)
+        self._wait_settled(remaining(deadline, self.SETTLE_TIMEOUT, self.SETTLE_INTERVAL))
+        if self.page is not None:
+            self.page = max(0, self.page + direction)
+
+    def _wait_settled(self, timeout: float) -> bool:
+        """滑动返回时列表可能还在惯性滚动：等连续两次读取的会话名相同"""
+        previous: List[Optional[List[str]]] = [None]
+
+        def settled() -> bool:
+            names = [row.name for row in self.settle_read()]
+            same = names == previous[0]
+            previous[0] = names
+            return same
+
+        return bool(wait_until(settled, timeout=timeout, interval=self.SETTLE_INTERVAL, name="chat_list_settle"))
+
+    def to_top(self, max_scrolls: int = 5):
+        """滚回列表顶部（位置未知时一直向上滚动到列表不再变化）"""
+        if self.page is not None:
+            while self.page > 0:
+                self.scroll(-1)
+            return
+        previous = None
+        for _ in range(max_scrolls):
+            names = [row.name for row in self.read_page()]
+            if names == previous:
+                break
+            previous = names
+            self.scroll(-1)
+        self.page = 0
+
+    def collect(self, max_pages: int, first_page: Optional[Sequence[ChatRow]] = None) -> List[Tuple[ChatRow, int]]:
+        """
+        从顶部开始逐屏收集未读会话
+
+        Args:
+            max_pages: 最多读取的屏数
+            first_page: 已读取的首屏（当前已在顶部时复用，省一次读取）
+        """
+        if self.page != 0:
+            self.to_top(max_pages + 2)
+            first_page = None
+        pages = iter([first_page] if first_page is not None else [])
+        unread, _ = collect_unread(lambda: next(pages, None) or self.read_page(), self.scroll, max_pages)
+        return unread
+
+    def locate(self, name: str, page: int, deadline: Optional[float] = None) -> Optional[ChatRow]:
+        """
+        找到该会话的未读行；当前屏没有时向收集时所在的屏滚动
+
+        Args:
+            deadline: 截止时间（time.monotonic），过了截止时间不再滚动
+        """
+        for _ in range(abs(page - (self.page or 0)) + 1):
+            row = next((r for r in self.read_page() if r.name == name and r.unread and r.bounds), None)
+            if row is not None or (self.page or 0) == page:
+                return row
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.debug(f"定位会话超时: {name}")
+                return None
+            self.scroll(1 if page > (self.page or 0) else -1, deadline)
+        return None
+
+
+@dataclass
+class ChatTask:
+    """一个等待处理的会话"""
+    name: str
+    unread_count: int
+    page: int
+    first_seen: float
+    turns: int = 0
+
+
+class RoundRobinScheduler:
+    """未读会话的轮转调度"""
+
+    def __init__(
+        self,
+        per_chat_budget: float = 5.0,
+        round_budget: Optional[float] = 30.0,
+        window: int = 500,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            per_chat_budget: 单个会话一次处理的时限（秒），作为截止时间传给处理函数
+            round_budget: 一轮的总时限（秒），None表示一轮处理完全部会话
+            window: 等待时间统计保留的最近样本数
+        """
+        self.per_chat_budget = per_chat_budget
+        self.round_budget = round_budget
+        self._clock = clock
+        self._queue: "OrderedDict[str, ChatTask]" = OrderedDict()
+        self._waits: Deque[float] = deque(maxlen=window)
+        self.counters = {"offered": 0, "turns": 0, "requeued": 0, "overruns": 0, "errors": 0, "deferred": 0}
+
+    def offer(self, rows: Sequence[Tuple[ChatRow, int]]) -> int:
+        """
+        加入未读会话；已在队列中的只更新未读数和位置（保留排队顺序）
+
+        Returns:
+            新加入的会话数
+        """
+        now = self._clock()
+        added = 0
+        for row, page in rows:
+            task = self._queue.get(row.name)
+            if task is not None:
+                task.unread_count = max(task.unread_count, row.unread_count)
+                task.page = page
+                continue
+            self._queue[row.name] = ChatTask(row.name, row.unread_count, page, now)
+            added += 1
+        self.counters["offered"] += added
+        return added
+
+    def pending(self) -> List[str]:
+        """排队中的会话名（按处理顺序）"""
+        return list(self._queue)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def run_round(self, service: Callable[[ChatTask, float], bool]) -> List[str]:
+        """
+        处理一轮：队列中的每个会话最多处理一次
+
+        Args:
+            service: service(task, deadline) -> 是否处理完；未处理完的会话排到队尾等下一轮。
+                deadline 为本次处理的截止时间（与clock同一时间基准）
+
+        Returns:
+            本轮处理过的会话名
+        """
+        started = self._clock()
+        serviced = []
+        for _ in range(len(self._queue)):
+            now = self._clock()
+            if self.round_budget is not None and serviced and now - started >= self.round_budget:
+                # 剩余会话留在队首，下一轮先处理
+                self.counters["deferred"] += len(self._queue)
+                logger.debug(f"本轮时限已到，{len(self._queue)} 个会话留待下一轮")
+                break
+
+            name, task = self._queue.popitem(last=False)
+            if task.turns == 0:
+                self._waits.append(now - task.first_seen)
+            task.turns += 1
+            self.counters["turns"] += 1
+            try:
+                done = service(task, now + self.per_chat_budget)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"处理会话失败: {name}: {e}")
+                done = True
+            serviced.append(name)
+
+            if self._clock() - now > self.per_chat_budget:
+                self.counters["overruns"] += 1
+            if not done:
+                self.counters["requeued"] += 1
+                self._queue[name] = task
+        return serviced
+
+    def stats(self) -> Dict[str, Any]:
+        """队列长度与首次处理前的等待时间统计"""
+        result: Dict[str, Any] = {**self.counters, "pending": len(self._queue)}
+        waits = sorted(self._waits)
+        if waits:
+            result.update({
+                "wait_avg": round(sum(waits) / len(waits), 3),
+                "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3),
+                "wait_max": round(waits[-1], 3),
+            })
+        return result
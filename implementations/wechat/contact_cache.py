@@ -0,0 +1,85 @@
+"""
+联系人位置缓存 - 记录联系人在聊天列表中最后出现的位置
+
+大部分回复发给刚刚在聊天列表里看到的会话（通常就在列表顶部）。
+命中缓存时直接点击该行进入聊天，省去 搜索 -> 输入 -> 等待结果 -> 点击 的整套流程。
+
+列表的"签名"由可见行的名称顺序和首行位置组成；列表重排或滚动后签名变化，
+旧位置全部失效。缓存只在观察后的一小段时间内有效，
+点击后仍需由调用方确认进入的是正确的聊天，不对则 invalidate() 并退回搜索。
+"""
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+from implementations.wechat.hierarchy import Bounds, ChatRow
+
+
+def list_signature(rows: Sequence[ChatRow]) -> Tuple:
+    """聊天列表签名：可见行名称顺序 + 首行顶部位置"""
+    first_top = rows[0].bounds.top if rows and rows[0].bounds else None
+    return (first_top,) + tuple(row.name for row in rows)
+
+
+@dataclass
+class ContactLocation:
+    """联系人行的位置"""
+    name: str
+    bounds: Bounds
+    index: int
+    seen_at: float
+
+
+class ContactLocationCache:
+    """单台设备的联系人位置缓存"""
+
+    def __init__(self, ttl: float = 10.0, clock=time.monotonic):
+        """
+        Args:
+            ttl: 观察到列表后多长时间内信任缓存的位置（秒）
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._signature: Optional[Tuple] = None
+        self._locations: Dict[str, ContactLocation] = {}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def observe(self, rows: Sequence[ChatRow]):
+        """记录一次聊天列表快照；列表重排时旧位置全部失效"""
+        signature = list_signature(rows)
+        now = self._clock()
+        if signature != self._signature:
+            if self._locations:
+                self.stats["invalidations"] += 1
+            self._locations.clear()
+            self._signature = signature
+        for row in rows:
+            if row.bounds is not None:
+                self._locations[row.name] = ContactLocation(row.name, row.bounds, row.index, now)
+
+    def contains(self, name: str) -> bool:
+        """是否有未过期的位置（不计入命中统计）"""
+        location = self._locations.get(name)
+        return location is not None and self._clock() - location.seen_at <= self.ttl
+
+    def lookup(self, name: str) -> Optional[Bounds]:
+        """返回联系人行的位置；不在列表中或已过期返回None"""
+        location = self._locations.get(name)
+        if location is None or self._clock() - location.seen_at > self.ttl:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return location.bounds
+
+    def invalidate(self, name: Optional[str] = None):
+        """
+        使缓存失效
+
+        Args:
+            name: 只使该联系人失效；None则全部失效（如发送消息后该会话移到列表顶部）
+        """
+        self.stats["invalidations"] += 1
+        if name is None:
+            self._locations.clear()
+            self._signature = None
+        else:
+            self._locations.pop(name, None)
@@ -0,0 +1,246 @@
+"""
+设备会话 - 每台设备（序列号）一个共享会话
+
+WeChatSender、WeChatReceiver、WeChatContactManager、WeChatPlatform 原来各自
+u2.connect() 并查询 window_size()，同一台手机上有多个HTTP客户端且互不知道对方的操作。
+会话统一持有：
+- uiautomator2 连接（首次使用时才连接）
+- 缓存的屏幕尺寸
+- 当前界面状态（所在页面、当前聊天窗口）
+- 可重入锁：一个组件的完整操作（如 点击->输入->发送）期间其它组件不会插入手势
+- 持久化adb shell通道（设置、按键等shell命令不再逐条fork adb进程）
+- 短时有效的UI层级缓存
+
+设备对象包装为 InstrumentedDevice，所有RPC的耗时都计入 get_rpc_stats()。
+
+层级缓存：一次 dump_hierarchy() 的结果在 hierarchy_ttl 秒内有效，
+期间的 selector.exists / count / get_text 直接在缓存的树上匹配，不再逐个发RPC；
+任何手势（点击、按键、滑动、输入、启动应用、shell）都会立即使缓存失效；
+通过持久化adb shell发送的 input/keyevent 等命令要走 shell_input()，同样计时并使缓存失效。
+需要观察界面变化的轮询用 hierarchy(fresh=True) 绕过缓存。
+"""
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from loguru import logger
+import uiautomator2 as u2
+from implementations.wechat.adb_shell import AdbShell, ShellResult, get_adb_shell
+from implementations.wechat.hierarchy import SUPPORTED_SELECTOR_KEYS, find_all, parse_hierarchy
+from implementations.wechat.instrumentation import InstrumentedDevice, current_operation, get_rpc_stats
+
+
+# 层级缓存有效期（秒）：足够覆盖一次操作内连续的几次查询，又不至于看不到界面自行变化
+HIERARCHY_TTL = 0.5
+
+
+class DeviceSession:
+    """单台设备的共享会话"""
+
+    def __init__(
+        self,
+        serial: Optional[str] = None,
+        connect: Callable = None,
+        instrument: bool = True,
+        hierarchy_ttl: float = HIERARCHY_TTL,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            serial: 设备序列号（None则使用第一个设备）
+            connect: 连接函数，默认 uiautomator2.connect
+            instrument: 是否对设备RPC计时
+            hierarchy_ttl: 层级缓存有效期（秒），0表示不缓存
+        """
+        self.serial = serial
+        self._connect = connect or u2.connect
+        self.instrument = instrument
+        self._device = None
+        self._window_size: Optional[Tuple[int, int]] = None
+        self._fast_input = False
+        self._connect_lock = threading.Lock()
+        self.lock = threading.RLock()
+
+        # 层级缓存（_generation 每次手势加一，防止手势前开始的dump写入缓存）
+        self.hierarchy_ttl = hierarchy_ttl
+        self._clock = clock
+        self._hierarchy_lock = threading.Lock()
+        self._hierarchy_xml: Optional[str] = None
+        self._hierarchy_root = None
+        self._hierarchy_at = 0.0
+        self._generation = 0
+        self.hierarchy_stats = {"dumps": 0, "hits": 0, "invalidations": 0}
+
+        # 当前界面状态（由执行操作的组件更新）
+        self.screen: Optional[str] = None
+        self.current_chat: Optional[str] = None
+
+    @property
+    def device(self):
+        """uiautomator2 设备对象（首次访问时连接）"""
+        if self._device is None:
+            with self._connect_lock:
+                if self._device is None:
+                    device = self._connect(self.serial) if self.serial else self._connect()
+                    stats = get_rpc_stats() if self.instrument else None
+                    self._device = InstrumentedDevice(device, stats, observer=self)
+                    logger.info(f"设备会话已连接: {self.serial or 'default'}")
+        return self._device
+
+    @property
+    def shell(self) -> AdbShell:
+        """该设备共享的持久化adb shell"""
+        return get_adb_shell(self.serial)
+
+    def shell_input(self, commands: Union[str, Sequence[str]], timeout: float = 10.0) -> List[ShellResult]:
+        """
+        通过持久化shell执行会改变界面的命令（input text/keyevent/swipe 等）
+
+        与设备对象上的手势一样：执行前后使层级缓存失效，耗时计入RPC统计（shell.input）。
+
+        Args:
+            commands: 一条或多条shell命令（多条时流水线执行）
+            timeout: 等待每一行输出的超时时间（秒）
+        """
+        if isinstance(commands, str):
+            commands = [commands]
+        self.invalidate_hierarchy()
+        started = time.perf_counter()
+        try:
+            return self.shell.run_batch(list(commands), timeout)
+        finally:
+            if self.instrument:
+                get_rpc_stats().record_rpc(current_operation(), "shell.input", time.perf_counter() - started)
+            self.invalidate_hierarchy()
+
+    def window_size(self) -> Tuple[int, int]:
+        """屏幕尺寸（缓存；旋转屏幕后调用 invalidate_geometry()）"""
+        if self._window_size is None:
+            self._window_size = tuple(self.device.window_size())
+        return self._window_size
+
+    @property
+    def width(self) -> int:
+        return self.window_size()[0]
+
+    @property
+    def height(self) -> int:
+        return self.window_size()[1]
+
+    def invalidate_geometry(self):
+        self._window_size = None
+
+    def enable_fast_input(self):
+        """关闭uiautomator2的操作前后延迟（只设置一次）"""
+        if not self._fast_input:
+            self.device.settings['operation_delay'] = (0, 0)
+            self.device.settings['operation_delay_methods'] = []
+            self._fast_input = True
+
+    # ---------- 层级缓存 ----------
+
+    def begin_dump(self) -> int:
+        """dump开始前调用，返回当前手势代数"""
+        return self._generation
+
+    def on_dump(self, xml: str, generation: int):
+        """记录一次dump结果（dump期间发生过手势则丢弃）"""
+        with self._hierarchy_lock:
+            if generation != self._generation or self.hierarchy_ttl <= 0:
+                return
+            self._hierarchy_xml = xml
+            self._hierarchy_root = None
+            self._hierarchy_at = self._clock()
+            self.hierarchy_stats["dumps"] += 1
+
+    def on_gesture(self):
+        """界面可能已变化：使层级缓存失效"""
+        with self._hierarchy_lock:
+            self._generation += 1
+            if self._hierarchy_xml is not None:
+                self.hierarchy_stats["invalidations"] += 1
+            self._hierarchy_xml = None
+            self._hierarchy_root = None
+
+    invalidate_hierarchy = on_gesture
+
+    def _cached_root(self):
+        """缓存有效时返回解析后的根节点，否则None（调用方持有 _hierarchy_lock）"""
+        if self._hierarchy_xml is None or self._clock() - self._hierarchy_at > self.hierarchy_ttl:
+            return None
+        if self._hierarchy_root is None:
+            self._hierarchy_root = parse_hierarchy(self._hierarchy_xml)
+        return self._hierarchy_root
+
+    def cached_find(self, selector: Dict[str, Any]) -> Optional[List[Any]]:
+        """缓存有效且selector可在本地匹配时返回匹配节点列表，否则None（调用方应退回RPC）"""
+        if not selector or not set(selector) <= SUPPORTED_SELECTOR_KEYS:
+            return None
+        with self._hierarchy_lock:
+            root = self._cached_root()
+            if root is None:
+                return None
+            self.hierarchy_stats["hits"] += 1
+            return find_all(root, **selector)
+
+    def hierarchy(self, fresh: bool = False):
+        """
+        当前界面的层级树（解析后的根节点）
+
+        Args:
+            fresh: 忽略缓存重新dump（轮询界面变化时使用）
+        """
+        if not fresh:
+            with self._hierarchy_lock:
+                root = self._cached_root()
+                if root is not None:
+                    self.hierarchy_stats["hits"] += 1
+                    return root
+        xml = self.device.dump_hierarchy()
+        with self._hierarchy_lock:
+            # 刚写入缓存（期间没有手势）时顺便缓存解析结果
+            root = self._cached_root() if self._hierarchy_xml is xml else None
+        return root if root is not None else parse_hierarchy(xml)
+
+    def set_ui_state(self, screen: Optional[str] = None, chat: Optional[str] = None):
+        """记录当前所在页面和聊天窗口"""
+        self.screen = screen
+        self.current_chat = chat
+
+    def reconnect(self):
+        """重新连接设备，清空缓存的状态"""
+        with self.lock:
+            self._device = None
+            self._window_size = None
+            self._fast_input = False
+            self.invalidate_hierarchy()
+            self.set_ui_state()
+            return self.device
+
+
+_sessions: Dict[Optional[str], DeviceSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(serial: Optional[str] = None) -> DeviceSession:
+    """获取设备的共享会话（同一序列号在进程内只有一个）"""
+    with _sessions_lock:
+        session = _sessions.get(serial)
+        if session is None:
+            session = _sessions[serial] = DeviceSession(serial)
+        return session
+
+
+def clear_sessions():
+    """清空会话注册表（用于测试或设备重新插拔）"""
+    with _sessions_lock:
+        _sessions.clear()
+
+
+def with_session_lock(method):
+    """方法装饰器：执行期间持有 self.session.lock（同一设备上的操作互斥）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.session.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
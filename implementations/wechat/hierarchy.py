@@ -0,0 +1,317 @@
+"""
+UI层级解析 - 一次 dump_hierarchy() 后在本地解析，替代逐个元素的uiautomator2 RPC
+
+每个 selector 的 .exists / .get_text() / child() 都是一次到设备的HTTP往返；
+一次 dump 拿到整棵树后本地解析只需要几毫秒。
+"""
+import hashlib
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    # uiautomator2 依赖 lxml，通常已安装；否则退回标准库（C加速的ElementTree）
+    from lxml import etree
+except ImportError:  # pragma: no cover
+    import xml.etree.ElementTree as etree
+
+
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+_DIGITS_RE = re.compile(r"\d+")
+_VOICE_RE = re.compile(r"^\d+\s*(\"|”|″|秒)$")
+
+
+@dataclass(frozen=True)
+class Bounds:
+    """元素在屏幕上的矩形区域"""
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return (self.left + self.right) // 2, (self.top + self.bottom) // 2
+
+    @property
+    def width(self) -> int:
+        return self.right - self.left
+
+    @property
+    def height(self) -> int:
+        return self.bottom - self.top
+
+
+@dataclass
+class ChatRow:
+    """聊天列表中的一行"""
+    index: int
+    name: str
+    latest_message: str
+    unread: bool
+    unread_count: int
+    bounds: Optional[Bounds]
+
+
+@dataclass
+class ChatBubble:
+    """聊天窗口中的一条消息气泡"""
+    sender: str
+    content: str
+    type: str
+    is_self: bool
+    bounds: Optional[Bounds]
+
+    @property
+    def fingerprint(self) -> str:
+        """消息内容指纹（不含位置，滚动后仍稳定）"""
+        raw = "\x1f".join((self.sender, self.type, self.content, "1" if self.is_self else "0"))
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def parse_bounds(value: Optional[str]) -> Optional[Bounds]:
+    """解析 "[l,t][r,b]" 格式的bounds"""
+    if not value:
+        return None
+    match = _BOUNDS_RE.match(value)
+    if not match:
+        return None
+    return Bounds(*(int(v) for v in match.groups()))
+
+
+def parse_hierarchy(xml: str):
+    """解析 dump_hierarchy() 返回的XML，返回根节点"""
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    return etree.fromstring(xml)
+
+
+def iter_nodes(root) -> Iterator[Any]:
+    """遍历所有 node 元素"""
+    return root.iter("node")
+
+
+# node_matches 支持的 selector 字段
+SUPPORTED_SELECTOR_KEYS = frozenset(
+    {"resourceId", "text", "textContains", "className", "description", "descriptionContains"}
+)
+
+
+def node_matches(node, selector: Dict[str, Any]) -> bool:
+    """
+    判断节点是否匹配 uiautomator2 风格的 selector
+
+    支持: resourceId, text, textContains, className, description, descriptionContains
+    """
+    for key, expected in selector.items():
+        if key == "resourceId":
+            if node.get("resource-id") != expected:
+                return False
+        elif key == "text":
+            if node.get("text") != expected:
+                return False
+        elif key == "textContains":
+            if expected not in (node.get("text") or ""):
+                return False
+        elif key == "className":
+            if node.get("class") != expected:
+                return False
+        elif key == "description":
+            if node.get("content-desc") != expected:
+                return False
+        elif key == "descriptionContains":
+            if expected not in (node.get("content-desc") or ""):
+                return False
+        else:
+            raise ValueError(f"不支持的selector字段: {key}")
+    return True
+
+
+def find_all(root, **selector) -> List[Any]:
+    """查找所有匹配的节点（文档顺序）"""
+    return [node for node in iter_nodes(root) if node_matches(node, selector)]
+
+
+def find_first(root, **selector):
+    """查找第一个匹配的节点，没有则返回None"""
+    for node in iter_nodes(root):
+        if node_matches(node, selector):
+            return node
+    return None
+
+
+def find_parent(root, **selector):
+    """返回第一个匹配selector的节点的父节点（lxml与标准库ElementTree通用）"""
+    for node in iter_nodes(root):
+        for child in node:
+            if node_matches(child, selector):
+                return node
+    return None
+
+
+def node_text(node) -> str:
+    return (node.get("text") or "") if node is not None else ""
+
+
+def node_bounds(node) -> Optional[Bounds]:
+    return parse_bounds(node.get("bounds")) if node is not None else None
+
+
+def parse_chat_list(root, selectors: Dict[str, Dict[str, str]]) -> List[ChatRow]:
+    """
+    从层级树中解析聊天列表
+
+    Args:
+        root: parse_hierarchy() 返回的根节点
+        selectors: 包含 chat_list, message_item, contact_name, latest_message, red_dot 的selector表
+
+    Returns:
+        按屏幕顺序排列的聊天行
+    """
+    container = find_first(root, **selectors["chat_list"])
+    if container is None:
+        return []
+
+    rows = []
+    for item in find_all(container, **selectors["message_item"]):
+        name_node = find_first(item, **selectors["contact_name"])
+        if name_node is None:
+            continue
+        red_dot = find_first(item, **selectors["red_dot"])
+        count_match = _DIGITS_RE.search(node_text(red_dot))
+        rows.append(ChatRow(
+            index=len(rows),
+            name=node_text(name_node),
+            latest_message=node_text(find_first(item, **selectors["latest_message"])),
+            unread=red_dot is not None,
+            unread_count=int(count_match.group()) if count_match else (1 if red_dot is not None else 0),
+            bounds=node_bounds(item),
+        ))
+    return rows
+
+
+def _avatar_sender(avatar) -> str:
+    """头像的content-desc通常是 "<昵称>头像" """
+    desc = avatar.get("content-desc") or ""
+    return desc[:-2] if desc.endswith("头像") else desc
+
+
+def parse_chat_messages(
+    root,
+    selectors: Dict[str, Dict[str, str]],
+    screen_width: Optional[int] = None,
+) -> List[ChatBubble]:
+    """
+    从聊天窗口的层级树中解析消息气泡
+
+    头像在屏幕右半边的是自己发送的消息。
+
+    Args:
+        root: parse_hierarchy() 返回的根节点
+        selectors: 包含 msg_list, msg_row, msg_avatar, msg_text, msg_image, chat_title 的selector表
+        screen_width: 屏幕宽度，None则取根节点下最宽元素的宽度
+
+    Returns:
+        按屏幕顺序（从上到下）排列的消息
+    """
+    container = find_first(root, **selectors["msg_list"])
+    if container is None:
+        return []
+
+    if screen_width is None:
+        container_bounds = node_bounds(container)
+        screen_width = container_bounds.right if container_bounds else 1080
+
+    chat_title = node_text(find_first(root, **selectors["chat_title"]))
+
+    bubbles = []
+    for row in find_all(container, **selectors["msg_row"]):
+        avatar = find_first(row, **selectors["msg_avatar"])
+        if avatar is None:
+            # 时间分隔、系统提示等没有头像的行
+            continue
+        avatar_bounds = node_bounds(avatar)
+        is_self = bool(avatar_bounds and avatar_bounds.center[0] > screen_width / 2)
+        sender = "self" if is_self else (_avatar_sender(avatar) or chat_title)
+
+        text_node = find_first(row, **selectors["msg_text"])
+        if text_node is not None:
+            content = node_text(text_node)
+            msg_type = "voice" if _VOICE_RE.match(content.strip()) else "text"
+            bounds = node_bounds(text_node)
+        elif find_first(row, **selectors["msg_image"]) is not None:
+            content, msg_type = "[图片]", "image"
+            bounds = node_bounds(find_first(row, **selectors["msg_image"]))
+        else:
+            content, msg_type = row.get("content-desc") or "", "other"
+            bounds = node_bounds(row)
+
+        bubbles.append(ChatBubble(sender=sender, content=content, type=msg_type, is_self=is_self, bounds=bounds))
+    return bubbles
+
+
+class ChatCursor:
+    """
+    单个会话的"已读位置"
+
+    记录最近看到的若干条消息指纹（按屏幕顺序）。再次进入会话时，
+    在当前可见消息中从下往上寻找与记录尾部连续吻合的位置，
+    其后的消息即为新消息；用连续序列而不是单条指纹匹配，
+    可以区分内容相同的重复消息（如连续两条"好的"）。
+    """
+
+    def __init__(self, depth: int = 8):
+        self.depth = depth
+        self._tail: Deque[str] = deque(maxlen=depth)
+
+    @property
+    def initialized(self) -> bool:
+        return bool(self._tail)
+
+    def _anchors(self, fingerprints: Sequence[str]) -> List[int]:
+        """所有与已读尾部连续吻合的位置，从下往上"""
+        tail = list(self._tail)
+        anchors = []
+        for i in range(len(fingerprints) - 1, -1, -1):
+            if fingerprints[i] != tail[-1]:
+                continue
+            overlap = min(i + 1, len(tail))
+            if list(fingerprints[i + 1 - overlap:i + 1]) == tail[-overlap:]:
+                anchors.append(i)
+        return anchors
+
+    def advance(
+        self,
+        bubbles: Sequence[ChatBubble],
+        unknown_limit: int = 5,
+        expected_new: Optional[int] = None,
+    ) -> List[ChatBubble]:
+        """
+        返回cursor之后的新消息，并把cursor移动到最后一条
+
+        Args:
+            bubbles: 当前可见的消息（从上到下）
+            unknown_limit: 首次访问或找不到已读位置时，最多认为最后几条是新的
+            expected_new: 预期的新消息数（如未读红点数）；内容重复导致多个位置都吻合时，
+                优先选择与之一致的位置，否则取最靠下的位置
+
+        Returns:
+            新消息列表
+        """
+        if not bubbles:
+            return []
+
+        fingerprints = [b.fingerprint for b in bubbles]
+        anchors = self._anchors(fingerprints) if self.initialized else []
+        if not anchors:
+            new = list(bubbles[-unknown_limit:]) if unknown_limit > 0 else []
+        else:
+            anchor = anchors[0]
+            if expected_new is not None:
+                anchor = next((i for i in anchors if len(bubbles) - 1 - i == expected_new), anchor)
+            new = list(bubbles[anchor + 1:])
+
+        self._tail.clear()
+        self._tail.extend(fingerprints[-self.depth:])
+        return new
@@ -0,0 +1,335 @@
+"""
+设备RPC埋点 - 统计每一次uiautomator2调用的次数和耗时，并归属到高层操作
+
+用法：
+- DeviceSession 默认把设备对象包装为 InstrumentedDevice，对调用方透明
+- 用 operation("scan") 上下文（或 @instrumented("scan") 装饰器）标记高层操作，
+  其间发生的RPC都归属到该操作；嵌套时归属到最内层操作
+- get_rpc_stats().snapshot() 导出按操作划分的直方图
+
+直方图使用固定的毫秒分桶，累加开销是常数，可以在生产环境常开。
+
+包装还可以挂一个观察者（DeviceSession）：手势类调用会通知它使层级缓存失效，
+dump_hierarchy 的结果交给它缓存，缓存有效时元素查询（exists/count/get_text）直接由缓存回答。
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 直方图分桶上界（毫秒），最后一个桶为 +inf
+BUCKETS_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 未在任何 operation() 中发生的调用
+UNATTRIBUTED = "other"
+
+
+class Histogram:
+    """固定分桶的耗时直方图"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估算分位数（秒）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return BUCKETS_MS[index] / 1000 if index < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total": round(self.total, 3),
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 4),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class RpcStats:
+    """按 操作 -> RPC 汇总的耗时统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Histogram] = {}
+        self._rpcs: Dict[str, Dict[str, Histogram]] = {}
+
+    def record_rpc(self, operation: str, rpc: str, seconds: float):
+        with self._lock:
+            rpcs = self._rpcs.setdefault(operation, {})
+            rpcs.setdefault(rpc, Histogram()).observe(seconds)
+
+    def record_operation(self, operation: str, seconds: float):
+        with self._lock:
+            self._operations.setdefault(operation, Histogram()).observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{操作: {"duration": 直方图, "rpcs": {RPC: 直方图}}}"""
+        with self._lock:
+            names = set(self._operations) | set(self._rpcs)
+            return {
+                name: {
+                    "duration": self._operations[name].to_dict() if name in self._operations else None,
+                    "rpcs": {rpc: h.to_dict() for rpc, h in self._rpcs.get(name, {}).items()},
+                }
+                for name in sorted(names)
+            }
+
+    def top(self, limit: int = 10) -> List[Tuple[str, str, int, float]]:
+        """耗时最多的 (操作, RPC, 次数, 总秒数)"""
+        with self._lock:
+            rows = [
+                (operation, rpc, h.count, round(h.total, 3))
+                for operation, rpcs in self._rpcs.items()
+                for rpc, h in rpcs.items()
+            ]
+        return sorted(rows, key=lambda row: row[3], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._rpcs.clear()
+
+
+# 全局RPC统计实例
+rpc_stats = RpcStats()
+
+_context = threading.local()
+
+
+def get_rpc_stats() -> RpcStats:
+    """获取全局RPC统计"""
+    return rpc_stats
+
+
+def current_operation() -> str:
+    stack = getattr(_context, "stack", None)
+    return stack[-1] if stack else UNATTRIBUTED
+
+
+@contextmanager
+def operation(name: str, stats: Optional[RpcStats] = None):
+    """标记一段高层操作，其间的RPC归属到该操作"""
+    stack = getattr(_context, "stack", None)
+    if stack is None:
+        stack = _context.stack = []
+    stack.append(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        (stats or rpc_stats).record_operation(name, time.perf_counter() - started)
+
+
+def instrumented(name: str):
+    """方法/函数装饰器版本的 operation()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with operation(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _timed_call(stats: Optional[RpcStats], rpc: str, func, *args, **kwargs):
+    if stats is None:
+        return func(*args, **kwargs)
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        stats.record_rpc(current_operation(), rpc, time.perf_counter() - started)
+
+
+def _record_cache_hit(stats: Optional[RpcStats], rpc: str):
+    if stats is not None:
+        stats.record_rpc(current_operation(), f"{rpc}(cached)", 0.0)
+
+
+class _TimedExists:
+    """UiObject.exists 的替身：bool() 和 exists(timeout=...) 都计时，缓存命中时不发RPC"""
+
+    def __init__(self, stats: Optional[RpcStats], target, cached: Optional[bool] = None):
+        self._stats = stats
+        self._target = target
+        self._cached = cached
+
+    def __bool__(self) -> bool:
+        if self._cached is not None:
+            _record_cache_hit(self._stats, "selector.exists")
+            return self._cached
+        return _timed_call(self._stats, "selector.exists", lambda: bool(self._target.exists))
+
+    def __call__(self, *args, **kwargs) -> bool:
+        # 带timeout的调用要等待元素出现，只有缓存确认存在时才能直接回答
+        if self._cached:
+            _record_cache_hit(self._stats, "selector.exists")
+            return True
+        return _timed_call(self._stats, "selector.exists", lambda: self._target.exists(*args, **kwargs))
+
+
+class _TimedProxy:
+    """对指定方法计时、其余属性透传的通用代理"""
+
+    _timed: Tuple[str, ...] = ()
+    _gestures: Tuple[str, ...] = ()
+    _prefix = ""
+
+    def __init__(self, target, stats: Optional[RpcStats], observer=None):
+        self._target = target
+        self._stats = stats
+        self._observer = observer
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in self._timed and callable(attr):
+            if name in self._gestures and self._observer is not None:
+                return functools.partial(self._gesture, f"{self._prefix}{name}", attr)
+            return functools.partial(_timed_call, self._stats, f"{self._prefix}{name}", attr)
+        return attr
+
+    def _gesture(self, rpc: str, func, *args, **kwargs):
+        """手势会改变界面：调用前后都使层级缓存失效"""
+        self._observer.on_gesture()
+        try:
+            return _timed_call(self._stats, rpc, func, *args, **kwargs)
+        finally:
+            self._observer.on_gesture()
+
+
+class InstrumentedSelector(_TimedProxy):
+    """device(**selector) 返回的元素代理"""
+
+    _timed = ("click", "long_click", "set_text", "get_text", "clear_text", "wait", "wait_gone")
+    _gestures = ("click", "long_click", "set_text", "clear_text")
+    _prefix = "selector."
+
+    def __init__(self, target, stats: Optional[RpcStats], observer=None, selector: Optional[Dict[str, Any]] = None):
+        super().__init__(target, stats, observer)
+        self._selector = selector or {}
+
+    def _cached_nodes(self) -> Optional[List[Any]]:
+        """缓存有效且selector可在本地匹配时返回匹配的节点，否则None"""
+        if self._observer is None:
+            return None
+        return self._observer.cached_find(self._selector)
+
+    @property
+    def exists(self):
+        nodes = self._cached_nodes()
+        return _TimedExists(self._stats, self._target, None if nodes is None else bool(nodes))
+
+    @property
+    def count(self) -> int:
+        nodes = self._cached_nodes()
+        if nodes is not None:
+            _record_cache_hit(self._stats, "selector.count")
+            return len(nodes)
+        return _timed_call(self._stats, "selector.count", lambda: self._target.count)
+
+    def get_text(self, *args, **kwargs):
+        nodes = self._cached_nodes()
+        if nodes:
+            _record_cache_hit(self._stats, "selector.get_text")
+            return nodes[0].get("text")
+        return _timed_call(self._stats, "selector.get_text", self._target.get_text, *args, **kwargs)
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        return _timed_call(self._stats, "selector.info", lambda: self._target.info)
+
+    def child(self, *args, **kwargs) -> "InstrumentedSelector":
+        return self._related("child", *args, **kwargs)
+
+    def sibling(self, *args, **kwargs) -> "InstrumentedSelector":
+        return self._related("sibling", *args, **kwargs)
+
+    def _related(self, name: str, *args, **kwargs) -> "InstrumentedSelector":
+        """child/sibling 返回的元素同样包装（其上的点击计时并使层级缓存失效；不走缓存匹配）"""
+        target = _timed_call(self._stats, f"selector.{name}", getattr(self._target, name), *args, **kwargs)
+        return InstrumentedSelector(target, self._stats, self._observer)
+
+
+class InstrumentedXPath(_TimedProxy):
+    """device.xpath(...) 返回的选择器代理"""
+
+    _timed = ("all", "click", "get_text", "wait", "get", "click_exists")
+    _gestures = ("click", "click_exists")
+    _prefix = "xpath."
+
+    @property
+    def exists(self) -> bool:
+        return _timed_call(self._stats, "xpath.exists", lambda: self._target.exists)
+
+
+class InstrumentedDevice(_TimedProxy):
+    """
+    uiautomator2 设备对象的透明包装
+
+    对设备级RPC计时；device(**selector) / device.xpath() 返回同样计时的代理；
+    settings 等其余属性原样透传。
+
+    observer（可选）需要实现:
+        on_gesture(): 发生了可能改变界面的操作
+        begin_dump() -> token / on_dump(xml, token): dump前后调用，token用于丢弃期间发生过手势的结果
+        cached_find(selector) -> Optional[List[node]]: 缓存有效时本地匹配结果，否则None
+    """
+
+    _timed = (
+        "click", "double_click", "long_click", "swipe", "drag", "press", "send_keys", "clear_text",
+        "dump_hierarchy", "screenshot", "app_current", "app_start", "app_stop", "app_info",
+        "window_size", "shell", "set_fastinput_ime", "current_ime",
+    )
+    _gestures = (
+        "click", "double_click", "long_click", "swipe", "drag", "press", "send_keys", "clear_text",
+        "app_start", "app_stop", "shell",
+    )
+
+    def __call__(self, **selector) -> InstrumentedSelector:
+        return InstrumentedSelector(self._target(**selector), self._stats, self._observer, selector)
+
+    def xpath(self, *args, **kwargs) -> InstrumentedXPath:
+        return InstrumentedXPath(self._target.xpath(*args, **kwargs), self._stats, self._observer)
+
+    def dump_hierarchy(self, *args, **kwargs) -> str:
+        # 只缓存默认参数的dump（compressed等参数会改变树的内容）
+        observe = self._observer is not None and not args and not kwargs
+        token = self._observer.begin_dump() if observe else None
+        xml = _timed_call(self._stats, "dump_hierarchy", self._target.dump_hierarchy, *args, **kwargs)
+        if observe:
+            self._observer.on_dump(xml, token)
+        return xml
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        return _timed_call(self._stats, "info", lambda: self._target.info)
+
+    @property
+    def raw(self):
+        """未包装的设备对象"""
+        return self._target
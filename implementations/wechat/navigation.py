@@ -0,0 +1,238 @@
+"""
+界面导航 - 识别当前所在页面，按最短路径走到目标页面
+
+原来每次发送/扫描前都盲按三次返回键（每次0.3秒），再视情况点"微信"tab。
+这里先用一次 app_current() + dump_hierarchy() 判断当前页面，
+已经在目标页面就直接返回；否则按页面转换图规划最短动作序列，
+每执行一步重新识别一次（闭环），遇到意外页面也能继续收敛。
+"""
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+from implementations.wechat.hierarchy import find_first, node_bounds, node_text, parse_hierarchy
+from implementations.wechat.instrumentation import instrumented
+from implementations.wechat.waits import wait_until
+
+
+WECHAT_PACKAGE = "com.tencent.mm"
+
+
+class Screen:
+    """页面类型"""
+    NOT_RUNNING = "not_running"  # 微信不在前台
+    CHAT_LIST = "chat_list"  # 首页聊天列表
+    OTHER_TAB = "other_tab"  # 首页的通讯录/发现/我
+    CHAT = "chat"  # 聊天窗口
+    SEARCH = "search"  # 搜索页
+    UNKNOWN = "unknown"  # 微信内的其他页面
+
+
+# 页面转换图: {当前页面: {动作: 动作后到达的页面}}
+TRANSITIONS: Dict[str, Dict[str, str]] = {
+    Screen.NOT_RUNNING: {"launch": Screen.CHAT_LIST},
+    Screen.OTHER_TAB: {"tab": Screen.CHAT_LIST},
+    Screen.CHAT: {"back": Screen.CHAT_LIST},
+    Screen.SEARCH: {"back": Screen.CHAT_LIST},
+    Screen.UNKNOWN: {"back": Screen.CHAT_LIST},
+    Screen.CHAT_LIST: {"search": Screen.SEARCH},
+}
+
+# 用于辅助识别的Activity名称片段
+_CHAT_ACTIVITIES = ("ChattingUI",)
+_SEARCH_ACTIVITIES = ("FTSMainUI", "SearchUI")
+
+
+@dataclass
+class ScreenState:
+    """一次页面识别的结果"""
+    screen: str
+    activity: str = ""
+    chat_title: str = ""
+    root: Any = field(default=None, repr=False)  # 本次识别用到的层级树，调用方可复用
+
+
+def detect_screen(
+    current_app: Dict[str, Any],
+    root,
+    selectors: Dict[str, Dict[str, str]],
+    package: str = WECHAT_PACKAGE,
+) -> ScreenState:
+    """
+    根据前台应用信息和层级树识别当前页面
+
+    Args:
+        current_app: device.app_current() 的返回值
+        root: parse_hierarchy() 返回的根节点
+        selectors: WeChatPlatform.SELECTORS
+        package: 微信包名
+
+    Returns:
+        ScreenState
+    """
+    activity = (current_app or {}).get("activity") or ""
+    if (current_app or {}).get("package") != package:
+        return ScreenState(Screen.NOT_RUNNING, activity, root=root)
+
+    if (
+        any(name in activity for name in _CHAT_ACTIVITIES)
+        or find_first(root, **selectors["message_input"]) is not None
+    ):
+        title = node_text(find_first(root, **selectors["chat_title"]))
+        return ScreenState(Screen.CHAT, activity, chat_title=title, root=root)
+
+    if (
+        any(name in activity for name in _SEARCH_ACTIVITIES)
+        or find_first(root, **selectors["search_input"]) is not None
+    ):
+        return ScreenState(Screen.SEARCH, activity, root=root)
+
+    if find_first(root, **selectors["chat_list"]) is not None:
+        return ScreenState(Screen.CHAT_LIST, activity, root=root)
+
+    if find_first(root, **selectors["wechat_tab"]) is not None:
+        return ScreenState(Screen.OTHER_TAB, activity, root=root)
+
+    return ScreenState(Screen.UNKNOWN, activity, root=root)
+
+
+def plan_path(start: str, target: str) -> Optional[List[str]]:
+    """
+    在页面转换图上求最短动作序列（BFS）
+
+    Returns:
+        动作列表；已在目标页面返回空列表，不可达返回None
+    """
+    if start == target:
+        return []
+    visited = {start}
+    queue = deque([(start, [])])
+    while queue:
+        screen, path = queue.popleft()
+        for action, next_screen in TRANSITIONS.get(screen, {}).items():
+            if next_screen in visited:
+                continue
+            if next_screen == target:
+                return path + [action]
+            visited.add(next_screen)
+            queue.append((next_screen, path + [action]))
+    return None
+
+
+class Navigator:
+    """单台设备上的微信页面导航"""
+
+    def __init__(
+        self,
+        device,
+        selectors: Dict[str, Dict[str, str]],
+        package: str = WECHAT_PACKAGE,
+        max_steps: int = 8,
+        step_timeout: float = 2.0,
+        launch_timeout: float = 10.0,
+        poll_interval: float = 0.2,
+        sleep=time.sleep,
+        clock=time.monotonic,
+        hierarchy: Optional[Callable[[bool], Any]] = None,
+    ):
+        """
+        Args:
+            hierarchy: 获取层级树的函数 hierarchy(fresh) -> 根节点（如 DeviceSession.hierarchy，
+                可复用刚刚dump过的树）；默认每次直接dump
+        """
+        self.device = device
+        self._hierarchy = hierarchy or (lambda fresh: parse_hierarchy(self.device.dump_hierarchy()))
+        self.selectors = selectors
+        self.package = package
+        self.max_steps = max_steps
+        self.step_timeout = step_timeout
+        self.launch_timeout = launch_timeout
+        self.poll_interval = poll_interval
+        self._sleep = sleep
+        self._clock = clock
+        self.stats = {"navigations": 0, "skipped": 0, "actions": 0, "failures": 0}
+
+    def detect(self, fresh: bool = False) -> ScreenState:
+        """
+        识别当前页面（一次 app_current + 一次 dump_hierarchy）
+
+        Args:
+            fresh: 不使用缓存的层级树（等待页面变化时必须为True）
+        """
+        root = self._hierarchy(fresh)
+        return detect_screen(self.device.app_current(), root, self.selectors, self.package)
+
+    def is_in_chat(self, name: str, state: Optional[ScreenState] = None) -> bool:
+        """是否已经在指定联系人的聊天窗口"""
+        state = state or self.detect()
+        return state.screen == Screen.CHAT and state.chat_title == name
+
+    @instrumented("navigate")
+    def go_to(self, target: str, state: Optional[ScreenState] = None) -> ScreenState:
+        """
+        导航到目标页面
+
+        Args:
+            target: 目标页面（Screen.*）
+            state: 已知的当前页面，None则重新识别
+
+        Returns:
+            到达目标后的页面状态
+
+        Raises:
+            RuntimeError: 超过最大步数仍未到达
+        """
+        state = state or self.detect()
+        self.stats["navigations"] += 1
+        if state.screen == target:
+            self.stats["skipped"] += 1
+            return state
+
+        for _ in range(self.max_steps):
+            path = plan_path(state.screen, target)
+            if path is None:
+                break
+            if not path:
+                return state
+            logger.debug(f"导航: {state.screen} -> {target}, 动作: {path}")
+            state = self._perform(path[0], state)
+
+        self.stats["failures"] += 1
+        raise RuntimeError(f"无法导航到页面 {target}，当前: {state.screen} ({state.activity})")
+
+    def _click_node(self, state: ScreenState, selector: Dict[str, str]) -> bool:
+        """按已dump的坐标点击，省去一次元素查找RPC"""
+        bounds = node_bounds(find_first(state.root, **selector)) if state.root is not None else None
+        if bounds is None:
+            return False
+        self.device.click(*bounds.center)
+        return True
+
+    def _perform(self, action: str, state: ScreenState) -> ScreenState:
+        """执行一个动作并等待页面变化"""
+        self.stats["actions"] += 1
+        timeout = self.step_timeout
+        if action == "launch":
+            self.device.app_start(self.package)
+            timeout = self.launch_timeout
+        elif action == "tab":
+            if not self._click_node(state, self.selectors["wechat_tab"]):
+                self.device.press("back")
+        elif action == "search":
+            if not self._click_node(state, self.selectors["search_btn"]):
+                self.device(**self.selectors["search_btn"]).click()
+        else:
+            self.device.press("back")
+        return self._wait_change(state, timeout, f"nav_{action}")
+
+    def _wait_change(self, previous: ScreenState, timeout: float, name: str) -> ScreenState:
+        """轮询直到页面（类型或Activity）变化或超时，返回最后一次识别结果"""
+        latest = [previous]
+
+        def changed() -> bool:
+            latest[0] = self.detect(fresh=True)
+            return latest[0].screen != previous.screen or latest[0].activity != previous.activity
+
+        wait_until(changed, timeout, self.poll_interval, name=name, sleep=self._sleep, clock=self._clock)
+        return latest[0]
@@ -0,0 +1,189 @@
+"""
+基于Android通知的消息检测 - 有微信通知到达时才触发UI扫描
+
+通过持久化adb shell周期性读取 `dumpsys notification --noredact`，
+与上一次快照比较得到新增/更新的微信通知（增量）。
+读取通知只是一次文本命令，比截图或遍历UI便宜得多。
+
+数据来源抽象为 NotificationFeed，测试中可用 FakeNotificationFeed 驱动，无需真机。
+"""
+import re
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from loguru import logger
+from implementations.wechat.adb_shell import AdbShell, get_adb_shell
+
+
+WECHAT_PACKAGE = "com.tencent.mm"
+
+_RECORD_RE = re.compile(r"^\s*NotificationRecord\(")
+_PKG_RE = re.compile(r"\bpkg=(\S+)")
+_KEY_RE = re.compile(r"\bkey=(\S+?)(?::|\s|$)")
+_TITLE_RE = re.compile(r"android\.title=\S+ \((.*)\)\s*$")
+_TEXT_RE = re.compile(r"android\.text=\S+ \((.*)\)\s*$")
+_WHEN_RE = re.compile(r"\b(?:mUpdateTimeMs|when)=(\d+)")
+
+
+@dataclass(frozen=True)
+class NotificationEvent:
+    """一条新增或更新的通知"""
+    key: str
+    package: str
+    title: str
+    text: str
+    when: int
+
+
+def parse_notifications(dump: str, package: str = WECHAT_PACKAGE) -> Dict[str, NotificationEvent]:
+    """
+    解析 dumpsys notification 输出
+
+    Args:
+        dump: 命令输出
+        package: 只保留该包名的通知
+
+    Returns:
+        {通知key: NotificationEvent}
+    """
+    records: List[List[str]] = []
+    for line in dump.splitlines():
+        if _RECORD_RE.match(line):
+            records.append([line])
+        elif records:
+            records[-1].append(line)
+
+    notifications = {}
+    for lines in records:
+        header = lines[0]
+        pkg = _PKG_RE.search(header)
+        if not pkg or pkg.group(1) != package:
+            continue
+        key_match = _KEY_RE.search(header)
+        key = key_match.group(1) if key_match else header.strip()
+
+        title = text = ""
+        when = 0
+        for line in lines:
+            if not title and (m := _TITLE_RE.search(line)):
+                title = m.group(1)
+            elif not text and (m := _TEXT_RE.search(line)):
+                text = m.group(1)
+            if m := _WHEN_RE.search(line):
+                when = max(when, int(m.group(1)))
+        notifications[key] = NotificationEvent(key=key, package=pkg.group(1), title=title, text=text, when=when)
+    return notifications
+
+
+class NotificationFeed(ABC):
+    """通知快照来源"""
+
+    @abstractmethod
+    def read_dump(self) -> str:
+        """返回当前的 dumpsys notification 输出"""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class AdbNotificationFeed(NotificationFeed):
+    """通过持久化adb shell读取通知（默认使用设备共享的shell通道）"""
+
+    COMMAND = "dumpsys notification --noredact"
+
+    def __init__(self, device_serial: Optional[str] = None, shell: Optional[AdbShell] = None):
+        self.shell = shell or get_adb_shell(device_serial)
+
+    def read_dump(self) -> str:
+        return self.shell.run(self.COMMAND)
+
+    def close(self) -> None:
+        # 共享的shell通道还有其它使用者，传入的shell归调用方管理，都不在这里关闭
+        pass
+
+
+class FakeNotificationFeed(NotificationFeed):
+    """按顺序返回预设快照的假来源（用于测试和无设备调试）"""
+
+    def __init__(self, dumps: Iterable[str]):
+        self._dumps = list(dumps)
+        self._last = ""
+
+    def read_dump(self) -> str:
+        if self._dumps:
+            self._last = self._dumps.pop(0)
+        return self._last
+
+
+class NotificationWatcher:
+    """
+    微信通知监视器
+
+    每次读取快照后与上一次比较，返回新出现或内容/时间变化的通知。
+    第一次读取只记录已有的通知作为基准，不报告；通知被清除（用户已读）不算活动。
+    """
+
+    def __init__(
+        self,
+        feed: NotificationFeed,
+        package: str = WECHAT_PACKAGE,
+        poll_interval: float = 1.0,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        self.feed = feed
+        self.package = package
+        self.poll_interval = poll_interval
+        self._sleep = sleep
+        self._clock = clock
+        self._snapshot: Optional[Dict[str, NotificationEvent]] = None
+        self.stats = {"reads": 0, "events": 0, "errors": 0}
+
+    def check(self) -> List[NotificationEvent]:
+        """读取一次快照并返回增量"""
+        self.stats["reads"] += 1
+        try:
+            current = parse_notifications(self.feed.read_dump(), self.package)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"读取通知失败: {e}")
+            return []
+
+        if self._snapshot is None:
+            # 启动前就在通知栏里的通知不算新活动
+            self._snapshot = current
+            return []
+        events = [event for key, event in current.items() if self._snapshot.get(key) != event]
+        self._snapshot = current
+        self.stats["events"] += len(events)
+        return events
+
+    def wait_for_activity(self, timeout: float) -> List[NotificationEvent]:
+        """
+        等待新的微信通知
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            新增/更新的通知列表；超时返回空列表
+        """
+        deadline = self._clock() + timeout
+        while True:
+            events = self.check()
+            if events:
+                return events
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                return []
+            self._sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        self.feed.close()
+
+
+def create_notification_watcher(device_serial: Optional[str] = None, poll_interval: float = 1.0) -> NotificationWatcher:
+    """为指定设备创建通知监视器"""
+    return NotificationWatcher(AdbNotificationFeed(device_serial), poll_interval=poll_interval)
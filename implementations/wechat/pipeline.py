@@ -0,0 +1,108 @@
+"""
+按key分流的流水线阶段 - 同一key的任务串行且保持顺序，不同key的任务并行
+
+自动回复原来 检测 -> 点击 -> 截图 -> OCR -> 规则 -> 发送 严格串行：
+OCR期间设备空闲，发送期间OCR空闲。拆成阶段后：
+
+    设备截图（主线程） --有界队列--> OCR+决策（KeyedStage） --> 设备发送（SendScheduler）
+
+KeyedStage 按 key（会话名）把任务固定分给同一个worker，
+所以同一会话的消息按截图顺序完成识别并按顺序提交发送；SendScheduler 又保证同一接收者按提交顺序发送，
+端到端的会话内顺序因此得到保证。队列有界：下游积压时 put() 阻塞，上游自然减速（背压）。
+"""
+import queue
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+_STOP = object()
+
+
+class KeyedStage:
+    """按key分配worker的处理阶段"""
+
+    def __init__(
+        self,
+        handler: Callable[[Any, Any], None],
+        workers: int = 2,
+        queue_size: int = 8,
+        name: str = "stage",
+    ):
+        """
+        Args:
+            handler: 处理函数 handler(key, item)
+            workers: worker线程数
+            queue_size: 每个worker的队列容量（满时 put() 阻塞）
+            name: 阶段名称（线程名、日志）
+        """
+        self.handler = handler
+        self.name = name
+        self._queues: List["queue.Queue"] = [queue.Queue(maxsize=queue_size) for _ in range(max(1, workers))]
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "processed": 0, "errors": 0, "max_depth": 0}
+
+    def _index(self, key: Any) -> int:
+        # 稳定哈希：同一key在进程生命周期内总是落到同一个worker
+        return zlib.crc32(str(key).encode("utf-8")) % len(self._queues)
+
+    def start(self):
+        """启动worker线程"""
+        if self._threads:
+            return
+        for index, tasks in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(tasks,), name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, key: Any, item: Any, timeout: Optional[float] = None):
+        """
+        提交任务（该key的worker队列满时阻塞）
+
+        Raises:
+            queue.Full: 超时仍未能放入
+        """
+        tasks = self._queues[self._index(key)]
+        tasks.put((key, item), timeout=timeout)
+        with self._lock:
+            self.stats["submitted"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], tasks.qsize())
+
+    def depth(self) -> int:
+        return sum(tasks.qsize() for tasks in self._queues)
+
+    def _run(self, tasks: "queue.Queue"):
+        while True:
+            entry = tasks.get()
+            try:
+                if entry is _STOP:
+                    return
+                key, item = entry
+                try:
+                    self.handler(key, item)
+                    outcome = "processed"
+                except Exception as e:
+                    outcome = "errors"
+                    logger.error(f"{self.name} 处理失败 ({key}): {e}", exc_info=True)
+                with self._lock:
+                    self.stats[outcome] += 1
+            finally:
+                tasks.task_done()
+
+    def join(self):
+        """等待已提交的任务全部处理完"""
+        for tasks in self._queues:
+            tasks.join()
+
+    def stop(self, timeout: Optional[float] = None):
+        """处理完已提交的任务后停止worker"""
+        for tasks in self._queues:
+            tasks.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "depth": self.depth()}
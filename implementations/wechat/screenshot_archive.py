@@ -0,0 +1,388 @@
+"""
+截图归档 - 后台线程异步写盘，按内容哈希去重、分目录存放，并限制总大小和保留时间
+
+原来自动回复每条消息同步保存 msg_N.jpg，每次回复再存3张发送过程截图，永不清理：
+JPEG编码和写盘都在消息处理的关键路径上，磁盘占用无限增长。
+
+- 调用方按级别提交截图（CaptureLevel），低于归档级别的直接丢弃，连截图RPC都可以省掉
+- 文件名是像素内容的哈希：相同的画面只存一份；路径 <root>/ab/cd/<hash>.jpg 避免单目录文件过多
+- 编码和写盘在后台线程；队列满时丢弃并计数，不阻塞调用方
+- index.jsonl 记录每次提交（时间、类型、路径），便于按消息查找
+- 按保留天数和总大小定期清理（先删过期的，再从最旧的开始删到上限以内）；
+  重复画面再次提交时刷新文件的修改时间，清理时同时压缩索引（去掉过期和已删除文件的记录）；
+  清理只在后台写入线程执行，同步写入（OCR输入）不会被目录遍历拖慢
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from PIL import Image
+
+
+class CaptureLevel(IntEnum):
+    """截图采集级别：归档只保存级别不高于配置的截图"""
+    OFF = 0
+    ERRORS = 1      # 失败现场
+    MESSAGES = 2    # 收到的消息
+    DEBUG = 3       # 发送过程等调试截图
+
+    @classmethod
+    def parse(cls, value) -> "CaptureLevel":
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, int):
+            return cls(value)
+        return cls[str(value).upper()]
+
+
+def _to_pixels(image) -> np.ndarray:
+    return image if isinstance(image, np.ndarray) else np.asarray(image.convert("RGB"))
+
+
+def content_hash(pixels: np.ndarray) -> str:
+    """像素内容的哈希（含尺寸，避免不同尺寸的相同字节冲突）"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(pixels.shape).encode("ascii"))
+    digest.update(np.ascontiguousarray(pixels).data)
+    return digest.hexdigest()
+
+
+class ScreenshotArchive:
+    """截图归档服务"""
+
+    # 每提交多少张（含重复画面）检查一次保留策略
+    RETENTION_EVERY = 50
+    # 索引最多保留的记录数（压缩时保留最新的）
+    MAX_INDEX_RECORDS = 100000
+    # 写入队列中的清理请求
+    _RETENTION = ("retention",)
+
+    def __init__(
+        self,
+        root: str = "screenshots/archive",
+        level: Any = CaptureLevel.MESSAGES,
+        max_bytes: int = 500 * 1024 * 1024,
+        max_age: float = 7 * 24 * 3600,
+        queue_size: int = 64,
+        quality: int = 85,
+        clock=time.time,
+    ):
+        """
+        Args:
+            root: 归档根目录
+            level: 归档级别（CaptureLevel 或 "off"/"errors"/"messages"/"debug"）
+            max_bytes: 总大小上限（字节）
+            max_age: 保留时间（秒）
+            queue_size: 待写队列容量
+            quality: JPEG质量
+        """
+        self.root = root
+        self.level = CaptureLevel.parse(level)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.quality = quality
+        self._clock = clock
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue(maxsize=queue_size)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._retention_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._since_retention = 0
+        self.stats = {"submitted": 0, "written": 0, "deduped": 0, "dropped": 0, "skipped": 0, "deleted": 0, "errors": 0}
+
+    # ---------- 提交 ----------
+
+    def enabled(self, level: CaptureLevel) -> bool:
+        """该级别的截图是否会被保存（调用方可据此省掉截图本身）"""
+        return self.level != CaptureLevel.OFF and level <= self.level
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def _prepare(
+        self, image, kind: str, level: CaptureLevel, force: bool = False
+    ) -> Optional[Tuple[str, Optional[np.ndarray], Dict]]:
+        """级别过滤和去重，返回 (路径, 需要写入的像素或None, 索引记录)"""
+        if not force and not self.enabled(level):
+            self.stats["skipped"] += 1
+            return None
+        pixels = _to_pixels(image)
+        digest = content_hash(pixels)
+        path = self.path_for(digest)
+        self.stats["submitted"] += 1
+        with self._seen_lock:
+            duplicate = digest in self._seen
+            self._seen[digest] = None
+            self._seen.move_to_end(digest)
+            while len(self._seen) > 10000:
+                self._seen.popitem(last=False)
+        if duplicate:
+            self.stats["deduped"] += 1
+        record = {"time": round(self._clock(), 3), "kind": kind, "path": path}
+        return path, None if duplicate else pixels, record
+
+    def submit(self, image, kind: str, level: CaptureLevel = CaptureLevel.MESSAGES) -> Optional[str]:
+        """
+        异步归档一张截图（编码、写盘、写索引都在后台线程）
+
+        Args:
+            image: PIL图像或 H×W×3 RGB 数组
+            kind: 类型标签（写入索引，如 "message"、"send/typed"）
+            level: 截图级别
+
+        Returns:
+            归档路径（文件可能尚未写完）；未保存（级别不够或队列已满）返回None
+        """
+        prepared = self._prepare(image, kind, level)
+        if prepared is None:
+            return None
+        path, pixels, record = prepared
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((path, pixels, record))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if pixels is not None:
+                self._forget(path)
+            return None
+        return path
+
+    def write_now(
+        self, image, kind: str, level: CaptureLevel = CaptureLevel.MESSAGES, force: bool = False
+    ) -> Optional[str]:
+        """
+        同步归档（调用方马上要读文件时使用，如OCR输入）
+
+        Args:
+            force: 忽略采集级别（调用方必须拿到文件时使用）
+
+        Returns:
+            归档路径；未保存（级别不够或写入失败）返回None
+        """
+        pixels = _to_pixels(image)
+        prepared = self._prepare(pixels, kind, level, force)
+        if prepared is None:
+            return None
+        path, _, record = prepared
+        # 重复的画面可能还在写入队列中，或已被清理：文件不存在就立即写
+        if not self._write(path, pixels):
+            return None
+        self._append_index(record)
+        if self._count_submission():
+            # 清理要遍历目录，交给后台线程，不阻塞调用方
+            self._ensure_writer()
+            try:
+                self._queue.put_nowait(self._RETENTION)
+            except queue.Full:
+                pass
+        return path
+
+    def _forget(self, path: str):
+        """从去重集合中移除（文件没有写成，之后相同的画面需要重新写入）"""
+        with self._seen_lock:
+            self._seen.pop(os.path.basename(path)[:-4], None)
+
+    def _count_submission(self) -> bool:
+        """计入一次提交（含重复画面），返回是否到了清理的时候"""
+        with self._seen_lock:
+            self._since_retention += 1
+            return self._since_retention >= self.RETENTION_EVERY
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, "index.jsonl")
+
+    def _append_index(self, record: Dict[str, Any]):
+        try:
+            with self._index_lock:
+                os.makedirs(self.root, exist_ok=True)
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"写入截图索引失败: {e}")
+
+    # ---------- 后台写入 ----------
+
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="screenshot-archive", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if item is self._RETENTION:
+                    self.enforce_retention()
+                    continue
+                path, pixels, record = item
+                if self._write(path, pixels):
+                    self._append_index(record)
+                # 重复画面不写文件但索引照样增长，按提交次数触发清理
+                if self._count_submission():
+                    self.enforce_retention()
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, pixels: Optional[np.ndarray]) -> bool:
+        """
+        写入截图；文件已存在（重复画面）时只刷新修改时间，避免按保留时间被提前删除
+
+        Returns:
+            文件是否存在（写入失败时从去重集合中移除，之后相同的画面会重新写入）
+        """
+        if os.path.exists(path):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return True
+        if pixels is None:
+            # 第一次写入失败或已被清理
+            return False
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{path}.tmp"
+            Image.fromarray(np.ascontiguousarray(pixels)).save(temp, format="JPEG", quality=self.quality)
+            os.replace(temp, path)
+            self.stats["written"] += 1
+            return True
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"截图归档写入失败: {path}: {e}")
+            self._forget(path)
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的截图写完"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """写完剩余截图后停止后台线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    # ---------- 保留策略 ----------
+
+    def _files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".jpg"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def enforce_retention(self) -> int:
+        """
+        删除过期截图，并从最旧的开始删除直到总大小不超过上限，然后压缩索引
+
+        自动清理在后台写入线程执行；也可以手动调用，加锁保证同一时间只有一个在执行。
+
+        Returns:
+            删除的文件数
+        """
+        with self._retention_lock:
+            with self._seen_lock:
+                self._since_retention = 0
+            deleted = self._delete_old_files()
+            self._compact_index()
+            return deleted
+
+    def _delete_old_files(self) -> int:
+        files = sorted(self._files())
+        now = self._clock()
+        total = sum(size for _, size, _ in files)
+        deleted = 0
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            deleted += 1
+            self._forget(path)
+        if deleted:
+            self.stats["deleted"] += deleted
+            logger.info(f"截图归档清理: 删除 {deleted} 张, 剩余 {total / 1024 / 1024:.1f}MB")
+        return deleted
+
+    def _compact_index(self):
+        """去掉过期和文件已不存在的记录，最多保留 MAX_INDEX_RECORDS 条最新记录"""
+        cutoff = self._clock() - self.max_age
+        with self._index_lock:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                logger.warning(f"读取截图索引失败: {e}")
+                return
+            kept = []
+            exists: Dict[str, bool] = {}
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                path = record.get("path")
+                if record.get("time", 0) < cutoff or not path:
+                    continue
+                if path not in exists:
+                    exists[path] = os.path.exists(path)
+                if exists[path]:
+                    kept.append(line)
+            kept = kept[-self.MAX_INDEX_RECORDS:]
+            if len(kept) == len(lines):
+                return
+            temp = f"{self.index_path}.tmp"
+            try:
+                with open(temp, "w", encoding="utf-8") as f:
+                    f.writelines(kept)
+                os.replace(temp, self.index_path)
+            except OSError as e:
+                logger.warning(f"压缩截图索引失败: {e}")
+
+
+_archive: Optional[ScreenshotArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_screenshot_archive() -> ScreenshotArchive:
+    """获取按配置创建的全局截图归档"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            from core.config import settings
+            _archive = ScreenshotArchive(
+                root=settings.screenshot_archive_dir,
+                level=settings.screenshot_capture_level,
+                max_bytes=settings.screenshot_max_mb * 1024 * 1024,
+                max_age=settings.screenshot_max_age_days * 24 * 3600,
+            )
+        return _archive
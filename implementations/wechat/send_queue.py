@@ -0,0 +1,203 @@
+"""
+单台设备的发送调度 - 串行访问设备，按联系人合并待发消息并按导航代价排序
+
+原来每条回复都单独发送：给同一联系人的两条回复要导航两次，
+A、B、A 三条要导航三次。这里把待发消息按接收者分组，
+一次进入聊天窗口发完该联系人的全部消息；下一个访问的联系人按导航代价选择
+（已在该聊天窗口 < 聊天列表中可见 < 需要搜索），代价相同则先到先发。
+同一联系人的消息始终保持提交顺序。
+
+平台如果提供 send_batch()/navigation_cost()（WeChatPlatform）则使用，
+否则退化为逐条 send_message()。
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+from loguru import logger
+
+
+@dataclass
+class OutboundMessage:
+    """一条待发送消息"""
+    receiver: str
+    content: str
+    enqueued_at: float
+    callback: Optional[Callable[["OutboundMessage"], None]] = None
+    ok: Optional[bool] = None
+    sent_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[bool]:
+        """等待发送完成，返回是否成功（超时返回None）"""
+        self.done.wait(timeout)
+        return self.ok
+
+
+class SendScheduler:
+    """单台设备的发送调度器"""
+
+    def __init__(
+        self,
+        platform,
+        device_lock: Optional[threading.Lock] = None,
+        max_batch: int = 20,
+        window: int = 500,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            platform: 消息平台
+            device_lock: 与其它设备操作（如扫描未读）共用的锁，保证手势不交错；
+                默认使用平台设备会话的锁
+            max_batch: 一次访问最多连续发送的条数（避免单个联系人长期占用设备）
+            window: 延迟统计保留的最近样本数
+        """
+        self.platform = platform
+        session = getattr(platform, "session", None)
+        self.device_lock = device_lock or (session.lock if session is not None else threading.Lock())
+        self.max_batch = max_batch
+        self._clock = clock
+
+        self._pending: Dict[str, Deque[OutboundMessage]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.counters = {"submitted": 0, "sent": 0, "failed": 0, "visits": 0}
+
+    # ---------- 提交 ----------
+
+    def submit(
+        self,
+        receiver: str,
+        content: str,
+        callback: Optional[Callable[[OutboundMessage], None]] = None,
+    ) -> OutboundMessage:
+        """提交一条待发消息（线程安全，立即返回）"""
+        message = OutboundMessage(receiver, content, self._clock(), callback)
+        with self._cond:
+            self._pending.setdefault(receiver, deque()).append(message)
+            self.counters["submitted"] += 1
+            self._cond.notify()
+        return message
+
+    def depth(self) -> int:
+        """待发送的消息数"""
+        with self._cond:
+            return sum(len(queue) for queue in self._pending.values())
+
+    # ---------- 调度 ----------
+
+    def _cost(self, receiver: str) -> int:
+        cost = getattr(self.platform, "navigation_cost", None)
+        try:
+            return cost(receiver) if cost else 2
+        except Exception:
+            return 2
+
+    def _next_batch(self) -> Optional[List[OutboundMessage]]:
+        """选出下一个访问的联系人并取出其待发消息"""
+        with self._cond:
+            if not self._pending:
+                return None
+            receiver = min(
+                self._pending,
+                key=lambda name: (self._cost(name), self._pending[name][0].enqueued_at),
+            )
+            queue = self._pending[receiver]
+            batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+            if not queue:
+                del self._pending[receiver]
+            return batch
+
+    def _deliver(self, batch: List[OutboundMessage]):
+        """一次访问发送同一联系人的一批消息"""
+        receiver = batch[0].receiver
+        contents = [m.content for m in batch]
+        self.counters["visits"] += 1
+        try:
+            with self.device_lock:
+                if hasattr(self.platform, "send_batch"):
+                    results = self.platform.send_batch(receiver, contents)
+                else:
+                    results = [self.platform.send_message(receiver, c) for c in contents]
+        except Exception as e:
+            logger.error(f"发送失败: {receiver}: {e}", exc_info=True)
+            results = [False] * len(batch)
+
+        now = self._clock()
+        for message, ok in zip(batch, results):
+            message.ok = bool(ok)
+            message.sent_at = now
+            self.counters["sent" if ok else "failed"] += 1
+            self._latencies.append(now - message.enqueued_at)
+            message.done.set()
+            if message.callback:
+                try:
+                    message.callback(message)
+                except Exception as e:
+                    logger.error(f"发送回调失败: {e}", exc_info=True)
+
+    def run_pending(self) -> int:
+        """
+        在调用线程中发送当前所有待发消息
+
+        Returns:
+            本次访问的联系人数
+        """
+        visits = 0
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return visits
+            self._deliver(batch)
+            visits += 1
+
+    # ---------- 后台线程 ----------
+
+    def start(self):
+        """启动后台发送线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="send-scheduler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        logger.info("发送调度线程启动")
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._pending:
+                    break
+            self.run_pending()
+        logger.info(f"发送调度线程停止: {self.stats()}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台线程（先发完已提交的消息）"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度与发送延迟（提交到发送完成）统计"""
+        result: Dict[str, Any] = {**self.counters, "depth": self.depth()}
+        sent = self.counters["sent"] + self.counters["failed"]
+        if self.counters["visits"]:
+            result["messages_per_visit"] = round(sent / self.counters["visits"], 2)
+        latencies = sorted(self._latencies)
+        if latencies:
+            result.update({
+                "latency_avg": round(sum(latencies) / len(latencies), 3),
+                "latency_p50": round(latencies[len(latencies) // 2], 3),
+                "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                "latency_max": round(latencies[-1], 3),
+            })
+        return result
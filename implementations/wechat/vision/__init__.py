@@ -0,0 +1,15 @@
+"""
+截图处理 - 内存中的帧获取与基于NumPy的图像分析
+"""
+from implementations.wechat.vision.bubbles import Bubble, BubbleTracker, segment_bubbles
+from implementations.wechat.vision.change_detect import ChangeResult, FrameDiffer, downscale_gray
+from implementations.wechat.vision.frame_ring import SharedFrameRing
+from implementations.wechat.vision.frames import Frame, FrameGrabber, to_array
+from implementations.wechat.vision.red_dot import RedDot, RedDotDetector, red_mask
+from implementations.wechat.vision.tiles import RowTiles, TileHasher, tile_hashes
+
+__all__ = [
+    "Bubble", "BubbleTracker", "ChangeResult", "Frame", "FrameDiffer", "FrameGrabber",
+    "RedDot", "RedDotDetector", "RowTiles", "SharedFrameRing", "TileHasher",
+    "downscale_gray", "red_mask", "segment_bubbles", "tile_hashes", "to_array",
+]
@@ -0,0 +1,172 @@
+"""
+聊天气泡分割 - 从截图中找出每个消息气泡的位置和方向，只裁剪新出现的气泡
+
+固定裁剪 75%~88% 高度：长消息被截断，短消息又带进上一条消息的残影，OCR又慢又不准。
+这里在缩小的帧上做背景分析：
+
+1. 聊天背景是大面积的单一颜色，取中位数作为背景色，与之差异明显的像素为前景
+2. 按行投影，被足够高的背景空隙分开的前景段就是一条消息（连同其头像）
+3. 去掉两侧头像列后的前景范围即气泡；靠左为对方、靠右为自己、居中为时间/系统提示
+
+BubbleTracker 为每个气泡计算64位均值哈希，与上一帧的气泡比较，
+滚动后的旧气泡（哈希相同、尺寸相近）不会被当成新消息。
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from implementations.wechat.vision.tiles import tile_hashes
+
+LEFT = "left"       # 对方的消息
+RIGHT = "right"     # 自己的消息
+CENTER = "center"   # 时间、系统提示
+
+
+@dataclass
+class Bubble:
+    """一个消息气泡（输入区域的像素坐标）"""
+    left: int
+    top: int
+    right: int
+    bottom: int
+    side: str
+    hash: Optional[np.ndarray] = None
+
+    @property
+    def height(self) -> int:
+        return self.bottom - self.top
+
+    @property
+    def width(self) -> int:
+        return self.right - self.left
+
+    def crop(self, pixels: np.ndarray, padding: int = 0) -> np.ndarray:
+        """从原帧裁剪气泡（返回视图）"""
+        return pixels[
+            max(self.top - padding, 0):self.bottom + padding,
+            max(self.left - padding, 0):self.right + padding,
+        ]
+
+
+def _runs(flags: np.ndarray, min_gap: int) -> List[Tuple[int, int]]:
+    """flags 中为真的连续段 [start, end)，间隔小于 min_gap 的段合并"""
+    indices = np.flatnonzero(flags)
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > min_gap)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def segment_bubbles(
+    pixels: np.ndarray,
+    tolerance: int = 12,
+    avatar_margin: float = 0.16,
+    min_gap: int = 16,
+    min_height: int = 24,
+    step: int = 2,
+) -> List[Bubble]:
+    """
+    分割聊天区域中的气泡
+
+    Args:
+        pixels: 聊天区域 H×W×3 RGB（不含标题栏和输入框）
+        tolerance: 与背景色的差超过该值算前景
+        avatar_margin: 两侧头像列占宽度的比例
+        min_gap: 两条消息之间背景空隙的最小高度（原图像素）
+        min_height: 小于该高度的段视为噪点（原图像素）
+        step: 取样步长
+
+    Returns:
+        从上到下排列的气泡（坐标相对 pixels）
+    """
+    small = pixels[::step, ::step, :3].astype(np.int16)
+    height, width = small.shape[:2]
+    if height == 0 or width == 0:
+        return []
+    background = np.median(small.reshape(-1, 3), axis=0)
+    foreground = (np.abs(small - background) > tolerance).any(axis=2)
+
+    margin = int(width * avatar_margin)
+    inner = foreground[:, margin:width - margin]
+    bubbles = []
+    for top, bottom in _runs(inner.any(axis=1), max(1, min_gap // step)):
+        if (bottom - top) * step < min_height:
+            continue
+        columns = np.flatnonzero(inner[top:bottom].any(axis=0))
+        left, right = int(columns[0]) + margin, int(columns[-1]) + 1 + margin
+
+        band = foreground[top:bottom]
+        has_left_avatar = band[:, :margin].any()
+        has_right_avatar = band[:, width - margin:].any()
+        if has_left_avatar and not has_right_avatar:
+            side = LEFT
+        elif has_right_avatar and not has_left_avatar:
+            side = RIGHT
+        else:
+            # 没有头像（连续消息或系统提示）时按水平位置判断
+            center = (left + right) / 2
+            side = CENTER if abs(center - width / 2) < width * 0.08 else (LEFT if center < width / 2 else RIGHT)
+
+        bubbles.append(Bubble(left * step, top * step, right * step, bottom * step, side))
+    return bubbles
+
+
+def bubble_hash(pixels: np.ndarray, bubble: Bubble, hash_size: int = 8) -> np.ndarray:
+    """气泡的均值哈希（与所在的纵向位置无关）"""
+    crop = bubble.crop(pixels)
+    gray = (crop[..., :3].astype(np.uint16) @ np.array([77, 150, 29], dtype=np.uint16)) >> 8
+    return tile_hashes(gray.astype(np.int64), [(0, gray.shape[0])], hash_size)[0]
+
+
+class BubbleTracker:
+    """逐帧跟踪气泡，找出新出现的"""
+
+    def __init__(self, max_distance: int = 4, size_tolerance: int = 6, **segment_options):
+        """
+        Args:
+            max_distance: 哈希汉明距离不超过该值视为同一气泡
+            size_tolerance: 宽高差不超过该值（像素）视为同一气泡
+            segment_options: 传给 segment_bubbles 的参数
+        """
+        self.max_distance = max_distance
+        self.size_tolerance = size_tolerance
+        self.segment_options = segment_options
+        self._previous: Optional[List[Bubble]] = None
+
+    def reset(self):
+        self._previous = None
+
+    def _seen(self, bubble: Bubble) -> bool:
+        for old in self._previous:
+            if (
+                abs(old.width - bubble.width) <= self.size_tolerance
+                and abs(old.height - bubble.height) <= self.size_tolerance
+                and np.count_nonzero(old.hash != bubble.hash) <= self.max_distance
+            ):
+                return True
+        return False
+
+    def update(self, pixels: np.ndarray) -> Tuple[List[Bubble], List[Bubble]]:
+        """
+        分割新帧并与上一帧比较
+
+        Returns:
+            (全部气泡, 新气泡)；第一帧没有基准，全部气泡都算新气泡
+        """
+        bubbles = segment_bubbles(pixels, **self.segment_options)
+        for bubble in bubbles:
+            bubble.hash = bubble_hash(pixels, bubble)
+
+        if self._previous is None:
+            new = list(bubbles)
+        else:
+            # 新消息总在底部：从下往上找，遇到第一个见过的气泡就停止
+            new = []
+            for bubble in reversed(bubbles):
+                if self._seen(bubble):
+                    break
+                new.append(bubble)
+            new.reverse()
+        self._previous = bubbles
+        return bubbles, new
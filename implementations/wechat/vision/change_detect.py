@@ -0,0 +1,111 @@
+"""
+帧差分 - 在缩小的灰度帧上用NumPy向量化比较，判断界面是否变化
+
+替代两种旧做法：
+- 逐像素 getpixel() 的双重Python循环（108×168 次函数调用）
+- 整块区域的 average_hash（只有64位，小范围变化检测不到，也给不出变化位置）
+
+缩小用固定步长取样（数组视图，不插值），灰度用整数加权，
+108×168 的帧一次比较只需几十微秒。上一帧以数组形式保留，不重复解码。
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+
+
+@dataclass
+class ChangeResult:
+    """一次比较的结果"""
+    changed: bool
+    fraction: float                                   # 变化像素占比
+    bbox: Optional[Tuple[int, int, int, int]] = None  # 变化区域 (left, top, right, bottom)，原图像素坐标
+
+
+def downscale_gray(pixels: np.ndarray, size: Tuple[int, int]) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    等步长取样缩小并转灰度
+
+    Args:
+        pixels: H×W×3 RGB 或 H×W 灰度数组
+        size: 目标尺寸 (宽, 高)；步长向下取整，输出的宽高不小于目标尺寸（不足两倍），
+            原图小于目标尺寸时不缩小
+
+    Returns:
+        (int16 灰度数组, (x步长, y步长))
+    """
+    height, width = pixels.shape[:2]
+    step_x = max(1, width // size[0])
+    step_y = max(1, height // size[1])
+    small = pixels[::step_y, ::step_x]
+    if small.ndim == 3:
+        # ITU-R BT.601 权重（×256取整），右移代替除法
+        weights = np.array([77, 150, 29], dtype=np.uint16)
+        small = (small[..., :3].astype(np.uint16) @ weights) >> 8
+    return small.astype(np.int16), (step_x, step_y)
+
+
+class FrameDiffer:
+    """与上一帧比较的变化检测器"""
+
+    def __init__(
+        self,
+        pixel_delta: int = 30,
+        min_fraction: float = 0.05,
+        size: Tuple[int, int] = (108, 168),
+        update_on_change_only: bool = True,
+    ):
+        """
+        Args:
+            pixel_delta: 灰度差超过该值的像素算作变化
+            min_fraction: 变化像素占比超过该值才算界面变化
+            size: 比较用的缩小目标尺寸 (宽, 高)，实际不小于该尺寸（见 downscale_gray）
+            update_on_change_only: 只在检测到变化时更新基准帧
+                （缓慢的渐变不会被逐帧吸收掉）
+        """
+        self.pixel_delta = pixel_delta
+        self.min_fraction = min_fraction
+        self.size = size
+        self.update_on_change_only = update_on_change_only
+        self._previous: Optional[np.ndarray] = None
+        self.stats = {"frames": 0, "changes": 0}
+
+    def reset(self, pixels: Optional[np.ndarray] = None):
+        """清空基准帧；传入pixels则以其作为新的基准"""
+        self._previous = None if pixels is None else downscale_gray(pixels, self.size)[0]
+
+    def compare(self, previous: np.ndarray, current: np.ndarray, step: Tuple[int, int] = (1, 1)) -> ChangeResult:
+        """比较两个同尺寸的灰度数组"""
+        if previous.shape != current.shape:
+            return ChangeResult(True, 1.0, None)
+        mask = np.abs(current - previous) > self.pixel_delta
+        fraction = float(np.count_nonzero(mask)) / mask.size
+        if fraction <= self.min_fraction:
+            return ChangeResult(False, fraction, None)
+
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        step_x, step_y = step
+        bbox = (
+            int(cols[0]) * step_x, int(rows[0]) * step_y,
+            (int(cols[-1]) + 1) * step_x, (int(rows[-1]) + 1) * step_y,
+        )
+        return ChangeResult(True, fraction, bbox)
+
+    def update(self, pixels: np.ndarray) -> ChangeResult:
+        """
+        输入新的一帧并与基准帧比较
+
+        第一帧只作为基准，返回未变化。
+        """
+        current, step = downscale_gray(pixels, self.size)
+        self.stats["frames"] += 1
+        if self._previous is None:
+            self._previous = current
+            return ChangeResult(False, 0.0, None)
+
+        result = self.compare(self._previous, current, step)
+        if result.changed:
+            self.stats["changes"] += 1
+        if result.changed or not self.update_on_change_only:
+            self._previous = current
+        return result
@@ -0,0 +1,165 @@
+"""
+共享内存帧环形缓冲 - 截图进程写入，OCR工作进程以NumPy视图直接读取
+
+OCR放到独立进程后，通过队列传整帧（约 1080×2400×3 ≈ 7.8MB）要pickle、复制两次。
+这里在 multiprocessing.shared_memory 中预分配 N 个槽位：
+
+- 写入方（WeChatReceiver 的截图循环）把帧写入 seq % N 号槽位，只需把 (seq, 裁剪框) 这样的小消息发给工作进程
+- 读取方 attach 同一块共享内存，get(seq) 返回指向槽位的数组视图，不复制、不反序列化
+- 槽位头部是一个 seqlock 版本号：写入时为奇数，写完为 2×seq；
+  读取方处理完后用 still_valid(seq) 确认槽位在此期间没有被新帧覆盖，否则丢弃结果重取
+
+单写多读；写入方必须只有一个进程/线程。
+
+目前是独立的基础组件：WeChatReceiver/FrameGrabber 可以传入 ring 发布帧，
+但自动回复的OCR工作者还是同一进程内的线程（直接使用内存中的帧），没有进程读取这里的帧；
+OCR拆到独立进程时再接入读取方。
+"""
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+# 槽位头部字段：版本号(seqlock)、高、宽、通道数、截图时间(纳秒)
+_VERSION, _HEIGHT, _WIDTH, _CHANNELS, _CAPTURED_NS = range(5)
+_SLOT_FIELDS = 5
+# 全局头部：最新写入的 seq
+_GLOBAL_FIELDS = 1
+
+
+class SharedFrameRing:
+    """共享内存中的帧环形缓冲"""
+
+    def __init__(
+        self,
+        slots: int = 8,
+        max_shape: Tuple[int, int, int] = (2400, 1080, 3),
+        name: Optional[str] = None,
+        create: bool = True,
+    ):
+        """
+        Args:
+            slots: 槽位数（读取方处理一帧期间写入方最多可以再写 slots-1 帧）
+            max_shape: 单帧最大尺寸 (高, 宽, 通道)
+            name: 共享内存名称；attach 时必填
+            create: True 创建新的共享内存，False 连接已有的
+        """
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        header_bytes = 8 * (_GLOBAL_FIELDS + slots * _SLOT_FIELDS)
+        self._header_bytes = header_bytes
+        self._owner = create
+        size = header_bytes + slots * self.slot_bytes
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+
+        buffer = self._shm.buf
+        self._global = np.ndarray((_GLOBAL_FIELDS,), dtype=np.int64, buffer=buffer)
+        self._meta = np.ndarray((slots, _SLOT_FIELDS), dtype=np.int64, buffer=buffer, offset=8 * _GLOBAL_FIELDS)
+        self._data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=buffer, offset=header_bytes)
+        if create:
+            self._global[:] = 0
+            self._meta[:] = 0
+        self.stats = {"written": 0, "stale_reads": 0}
+
+    @classmethod
+    def attach(cls, spec: Dict[str, Any]) -> "SharedFrameRing":
+        """在工作进程中连接已有的环形缓冲（spec 来自写入方的 spec()）"""
+        return cls(slots=spec["slots"], max_shape=spec["max_shape"], name=spec["name"], create=False)
+
+    def spec(self) -> Dict[str, Any]:
+        """可pickle的连接参数，传给工作进程"""
+        return {"name": self._shm.name, "slots": self.slots, "max_shape": self.max_shape}
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def latest_seq(self) -> int:
+        """最新写完的帧序号（0表示还没有帧）"""
+        return int(self._global[0])
+
+    # ---------- 写入 ----------
+
+    def write(self, pixels: np.ndarray, captured_at: Optional[float] = None) -> int:
+        """
+        写入一帧（一次内存复制）
+
+        Returns:
+            帧序号（从1开始）
+        """
+        height, width = pixels.shape[:2]
+        channels = pixels.shape[2] if pixels.ndim == 3 else 1
+        if height * width * channels > self.slot_bytes:
+            raise ValueError(f"帧尺寸 {pixels.shape} 超过槽位容量 {self.max_shape}")
+
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        meta[_VERSION] = 2 * seq - 1  # 奇数：写入中
+        target = self._data[slot, :height * width * channels].reshape(pixels.shape)
+        np.copyto(target, pixels)
+        meta[_HEIGHT], meta[_WIDTH], meta[_CHANNELS] = height, width, channels
+        meta[_CAPTURED_NS] = int((captured_at if captured_at is not None else time.time()) * 1e9)
+        meta[_VERSION] = 2 * seq      # 偶数：写完
+        self._global[0] = seq
+        self.stats["written"] += 1
+        return seq
+
+    # ---------- 读取 ----------
+
+    def still_valid(self, seq: int) -> bool:
+        """该帧所在槽位是否仍是这一帧（处理完视图后调用）"""
+        return seq > 0 and int(self._meta[seq % self.slots, _VERSION]) == 2 * seq
+
+    def get(self, seq: int) -> Optional[np.ndarray]:
+        """
+        返回帧的只读视图（不复制）；帧已被覆盖或尚未写完返回None
+
+        视图在使用期间可能被写入方覆盖，使用完后须用 still_valid(seq) 确认。
+        """
+        if not self.still_valid(seq):
+            self.stats["stale_reads"] += 1
+            return None
+        meta = self._meta[seq % self.slots]
+        height, width, channels = int(meta[_HEIGHT]), int(meta[_WIDTH]), int(meta[_CHANNELS])
+        view = self._data[seq % self.slots, :height * width * channels]
+        view = view.reshape((height, width, channels) if channels > 1 else (height, width))
+        view.flags.writeable = False
+        return view
+
+    def captured_at(self, seq: int) -> Optional[float]:
+        if not self.still_valid(seq):
+            return None
+        return int(self._meta[seq % self.slots, _CAPTURED_NS]) / 1e9
+
+    def copy(self, seq: int) -> Optional[np.ndarray]:
+        """复制一帧（复制完成后校验，保证得到的是完整的同一帧）"""
+        view = self.get(seq)
+        if view is None:
+            return None
+        result = view.copy()
+        return result if self.still_valid(seq) else None
+
+    # ---------- 生命周期 ----------
+
+    def close(self):
+        """断开映射（写入方关闭时同时释放共享内存）"""
+        self._global = self._meta = self._data = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # 仍有调用方持有槽位视图：映射随这些视图释放，共享内存照常unlink
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
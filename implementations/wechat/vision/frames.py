@@ -0,0 +1,94 @@
+"""
+帧获取 - 截图直接以内存数组返回，不经过临时文件
+
+原来每次轮询都 screenshot("screenshots/temp_full.jpg") 再 Image.open() 裁剪：
+一次JPEG编码、一次写盘、一次解码，多个接收器还会争用同一个临时路径。
+这里直接取 uiautomator2 返回的图像对象转为 NumPy 数组（H×W×3, RGB, uint8），
+裁剪只是数组切片（视图，不复制像素）。
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image
+
+
+def to_array(image) -> np.ndarray:
+    """PIL图像（或已是数组）转为 H×W×3 的RGB uint8 数组"""
+    if isinstance(image, np.ndarray):
+        return image
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+
+@dataclass
+class Frame:
+    """一帧截图"""
+    pixels: np.ndarray
+    captured_at: float
+    seq: int
+    ring_seq: Optional[int] = None  # 在共享内存环形缓冲中的序号（发布时）
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def crop(self, left: int, top: int, right: int, bottom: int) -> np.ndarray:
+        """按像素坐标裁剪（返回视图）"""
+        return self.pixels[max(top, 0):bottom, max(left, 0):right]
+
+    def band(self, top_ratio: float, bottom_ratio: float) -> np.ndarray:
+        """按高度比例截取整行区域（返回视图），如 band(0.10, 0.88) 为聊天区域"""
+        return self.pixels[int(self.height * top_ratio):int(self.height * bottom_ratio)]
+
+    def region(self, box: Tuple[float, float, float, float]) -> np.ndarray:
+        """按比例 (left, top, right, bottom) 截取区域（返回视图）"""
+        left, top, right, bottom = box
+        return self.crop(
+            int(self.width * left), int(self.height * top),
+            int(self.width * right), int(self.height * bottom),
+        )
+
+    @staticmethod
+    def to_image(pixels: np.ndarray) -> Image.Image:
+        """数组转回PIL图像（保存或送给OCR/LLM时使用）"""
+        return Image.fromarray(np.ascontiguousarray(pixels))
+
+
+class FrameGrabber:
+    """从设备获取内存中的截图帧"""
+
+    def __init__(self, device, clock=time.monotonic, ring=None):
+        """
+        Args:
+            device: uiautomator2 设备对象（screenshot() 默认返回PIL图像）
+            ring: SharedFrameRing；设置后每帧同时发布到共享内存，供其它进程零复制读取
+                （目前没有调用方传入，见 frame_ring 模块说明）
+        """
+        self.device = device
+        self.ring = ring
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.last: Optional[Frame] = None
+        self.stats = {"frames": 0, "total_seconds": 0.0}
+
+    def grab(self) -> Frame:
+        """截取一帧"""
+        started = self._clock()
+        pixels = to_array(self.device.screenshot())
+        now = self._clock()
+        with self._lock:
+            self._seq += 1
+            ring_seq = self.ring.write(pixels) if self.ring is not None else None
+            frame = Frame(pixels, now, self._seq, ring_seq)
+            self.last = frame
+            self.stats["frames"] += 1
+            self.stats["total_seconds"] += now - started
+        return frame
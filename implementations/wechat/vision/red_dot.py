@@ -0,0 +1,167 @@
+"""
+红点检测 - 在缩小的截图上用HSV颜色掩码找出微信的未读红色徽标
+
+xpath 查 com.tencent.mm:id/h8h、selector 查 red_dot 都是较慢的RPC，
+而且资源ID随微信版本变化。未读徽标的颜色（#FA5151 附近的高饱和红色）
+在浅色/深色主题和各版本间都很稳定，一次截图即可找出全部徽标：
+
+1. 等步长缩小，向量化计算 色相/饱和度/亮度 并取红色掩码
+2. 对掩码中的少量像素做连通域标记，按面积和长宽比过滤出徽标
+3. 换算回原图坐标，按行块几何归属到聊天行
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from implementations.wechat.vision.tiles import RowTiles
+
+
+@dataclass
+class RedDot:
+    """一个未读徽标（原图像素坐标）"""
+    left: int
+    top: int
+    right: int
+    bottom: int
+    area: int                   # 缩小图中的像素数
+    row: Optional[int] = None   # 所在行块序号
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return (self.left + self.right) // 2, (self.top + self.bottom) // 2
+
+
+def red_mask(
+    pixels: np.ndarray,
+    max_hue: float = 12.0,
+    min_saturation: float = 0.45,
+    min_value: float = 0.55,
+) -> np.ndarray:
+    """
+    红色像素掩码（只算需要的HSV分量，不做完整的颜色空间转换）
+
+    Args:
+        pixels: H×W×3 RGB uint8
+        max_hue: 与纯红（0°/360°）的最大色相差（度）
+    """
+    rgb = pixels[..., :3].astype(np.int16)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    high = rgb.max(axis=2)
+    low = rgb.min(axis=2)
+    chroma = high - low
+
+    # 红色是最大分量时，色相 = 60° × (g - b) / chroma
+    red_is_max = (r == high) & (chroma > 0)
+    hue = 60.0 * np.abs(g - b) / np.maximum(chroma, 1)
+    saturation = chroma / np.maximum(high, 1)
+    return (
+        red_is_max
+        & (hue <= max_hue)
+        & (saturation >= min_saturation)
+        & (high >= min_value * 255)
+    )
+
+
+def label_blobs(mask: np.ndarray) -> List[np.ndarray]:
+    """
+    8邻域连通域标记，返回每个连通域的 (y, x) 坐标数组
+
+    徽标只占极少数像素，只在掩码为真的点上做广度优先搜索。
+    """
+    points = set(map(tuple, np.argwhere(mask).tolist()))
+    blobs = []
+    while points:
+        seed = points.pop()
+        stack, blob = [seed], [seed]
+        while stack:
+            y, x = stack.pop()
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    neighbour = (y + dy, x + dx)
+                    if neighbour in points:
+                        points.remove(neighbour)
+                        stack.append(neighbour)
+                        blob.append(neighbour)
+        blobs.append(np.array(blob))
+    return blobs
+
+
+class RedDotDetector:
+    """未读红点检测器"""
+
+    def __init__(
+        self,
+        size: Tuple[int, int] = (270, 600),
+        min_area: int = 4,
+        max_area: int = 400,
+        max_aspect: float = 3.5,
+        min_fill: float = 0.5,
+    ):
+        """
+        Args:
+            size: 检测前缩小到的尺寸上限 (宽, 高)
+            min_area / max_area: 徽标在缩小图中的像素数范围（过滤噪点和大块红色图片）
+            max_aspect: 最大宽高比（"99+" 徽标是胶囊形）
+            min_fill: 连通域像素占外接矩形的最小比例（圆形约0.78，细线和文字远低于此）
+        """
+        self.size = size
+        self.min_area = min_area
+        self.max_area = max_area
+        self.max_aspect = max_aspect
+        self.min_fill = min_fill
+
+    def detect(
+        self,
+        pixels: np.ndarray,
+        tiles: Optional[RowTiles] = None,
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> List[RedDot]:
+        """
+        检测红点
+
+        Args:
+            pixels: H×W×3 RGB 截图（或区域视图）
+            tiles: 行块几何（pixels 坐标系）；给出时填充 RedDot.row
+            region: 只在 (left, top, right, bottom) 范围内检测，返回坐标仍相对 pixels
+
+        Returns:
+            按从上到下排序的红点
+        """
+        left0, top0 = 0, 0
+        if region is not None:
+            left0, top0, right, bottom = region
+            pixels = pixels[top0:bottom, left0:right]
+        height, width = pixels.shape[:2]
+        # 两个方向用同一步长，徽标的长宽比不失真
+        step = max(1, width // self.size[0], height // self.size[1])
+        mask = red_mask(pixels[::step, ::step])
+
+        dots = []
+        for blob in label_blobs(mask):
+            area = len(blob)
+            if not self.min_area <= area <= self.max_area:
+                continue
+            (y0, x0), (y1, x1) = blob.min(axis=0), blob.max(axis=0) + 1
+            box_w, box_h = x1 - x0, y1 - y0
+            if max(box_w, box_h) > self.max_aspect * min(box_w, box_h):
+                continue
+            if area < self.min_fill * box_w * box_h:
+                continue
+            dots.append(RedDot(
+                left=left0 + int(x0) * step, top=top0 + int(y0) * step,
+                right=left0 + int(x1) * step, bottom=top0 + int(y1) * step,
+                area=area,
+            ))
+
+        dots.sort(key=lambda dot: (dot.top, dot.left))
+        if tiles is not None:
+            for dot in dots:
+                dot.row = row_of(dot.center[1], tiles.spans)
+        return dots
+
+
+def row_of(y: int, spans: Sequence[Tuple[int, int]]) -> Optional[int]:
+    """y坐标所在的行块序号"""
+    for index, (top, bottom) in enumerate(spans):
+        if top <= y < bottom:
+            return index
+    return None
@@ -0,0 +1,118 @@
+"""
+按行分块的感知哈希 - 定位聊天列表中哪一行发生了变化
+
+整块区域一个 average_hash 只能回答"有没有变化"，之后只能盲点列表第一行。
+这里把聊天列表区域按行切成块，每块缓存一个 average_hash；
+新帧到来时只需比较各块哈希的汉明距离，就能知道是哪几行（哪几个会话）更新了。
+
+块内的均值用积分图一次算出（全部行、全部格子向量化），不逐块缩放图像。
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from implementations.wechat.vision.change_detect import downscale_gray
+
+
+@dataclass(frozen=True)
+class RowTiles:
+    """行块几何：每块在区域内的纵向范围 (top, bottom)，像素坐标"""
+    spans: Tuple[Tuple[int, int], ...]
+
+    @classmethod
+    def uniform(cls, top: int, bottom: int, row_height: int) -> "RowTiles":
+        """等高行（微信聊天列表每行高度相同）"""
+        row_height = max(1, row_height)
+        starts = range(top, bottom - row_height + 1, row_height)
+        return cls(tuple((start, start + row_height) for start in starts))
+
+    @classmethod
+    def from_bounds(cls, bounds: Sequence, offset: int = 0) -> "RowTiles":
+        """由层级树中聊天行的 Bounds 构造（offset 为区域在整屏中的起始y）"""
+        return cls(tuple((b.top - offset, b.bottom - offset) for b in bounds if b is not None))
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def center(self, index: int) -> int:
+        top, bottom = self.spans[index]
+        return (top + bottom) // 2
+
+
+def tile_hashes(gray: np.ndarray, spans: Sequence[Tuple[int, int]], hash_size: int = 8) -> np.ndarray:
+    """
+    计算每个行块的 average_hash
+
+    Args:
+        gray: 灰度数组 H×W
+        spans: 行块的纵向范围（gray 的行坐标）
+        hash_size: 哈希边长（8 -> 64位）
+
+    Returns:
+        bool 数组 (块数, hash_size*hash_size)
+    """
+    height, width = gray.shape
+    spans = [(max(0, top), min(height, bottom)) for top, bottom in spans]
+    if not spans:
+        return np.zeros((0, hash_size * hash_size), dtype=bool)
+
+    # 积分图：任意矩形的和 = 四个角相加减
+    integral = np.zeros((height + 1, width + 1), dtype=np.int64)
+    integral[1:, 1:] = gray.cumsum(axis=0).cumsum(axis=1)
+
+    tops = np.array([top for top, _ in spans])
+    bottoms = np.array([max(bottom, top + 1) for top, bottom in spans])
+    fractions = np.linspace(0.0, 1.0, hash_size + 1)
+    ys = np.rint(tops[:, None] + (bottoms - tops)[:, None] * fractions).astype(int)  # (块数, hs+1)
+    xs = np.rint(width * fractions).astype(int)                                       # (hs+1,)
+    ys = np.clip(ys, 0, height)
+
+    y0, y1 = ys[:, :-1, None], ys[:, 1:, None]
+    x0, x1 = xs[None, None, :-1], xs[None, None, 1:]
+    sums = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    areas = np.maximum((y1 - y0) * (x1 - x0), 1)
+    means = (sums / areas).reshape(len(spans), -1)
+    return means > means.mean(axis=1, keepdims=True)
+
+
+class TileHasher:
+    """缓存每个行块的哈希，返回变化的行"""
+
+    def __init__(self, tiles: RowTiles, hash_size: int = 8, max_distance: int = 4, size: Tuple[int, int] = (270, 600)):
+        """
+        Args:
+            tiles: 行块几何（相对输入区域的像素坐标）
+            hash_size: 哈希边长
+            max_distance: 汉明距离不超过该值视为未变化
+            size: 计算前缩小的目标尺寸 (宽, 高)，实际不小于该尺寸（见 downscale_gray）
+        """
+        self.tiles = tiles
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.size = size
+        self._hashes: Optional[np.ndarray] = None
+
+    def set_tiles(self, tiles: RowTiles):
+        """行几何变化（如重新校准）时清空缓存的哈希"""
+        if tiles != self.tiles:
+            self.tiles = tiles
+            self._hashes = None
+
+    def hashes(self, pixels: np.ndarray) -> np.ndarray:
+        gray, (_, step_y) = downscale_gray(pixels, self.size)
+        spans = [(top // step_y, -(-bottom // step_y)) for top, bottom in self.tiles.spans]
+        return tile_hashes(gray, spans, self.hash_size)
+
+    def update(self, pixels: np.ndarray) -> List[int]:
+        """
+        输入新的一帧，返回哈希变化的行块序号（从上到下）
+
+        第一帧只作为基准；只有变化的块更新缓存的哈希。
+        """
+        current = self.hashes(pixels)
+        if self._hashes is None or self._hashes.shape != current.shape:
+            self._hashes = current
+            return []
+        distances = np.count_nonzero(current != self._hashes, axis=1)
+        changed = np.flatnonzero(distances > self.max_distance)
+        self._hashes[changed] = current[changed]
+        return changed.tolist()
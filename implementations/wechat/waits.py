@@ -0,0 +1,148 @@
+"""
+条件等待 - 用"轮询预期的界面条件"替代点击后的固定 time.sleep
+
+固定睡眠每次都要付出最坏情况的延迟；条件满足就立即返回，
+只有界面确实迟迟没有变化时才等到超时。
+每次等待的实际耗时按名称记录到 WaitStats，可根据线上数据调整超时。
+"""
+import hashlib
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+from loguru import logger
+
+
+class WaitStats:
+    """按等待名称记录的耗时统计（每个名称保留最近 window 次）"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._durations: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration: float, timed_out: bool):
+        with self._lock:
+            self._durations.setdefault(name, deque(maxlen=self.window)).append(duration)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if timed_out:
+                self._timeouts[name] = self._timeouts.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """{名称: {count, timeouts, avg, p50, p95, max}}"""
+        with self._lock:
+            result = {}
+            for name, samples in self._durations.items():
+                durations = sorted(samples)
+                result[name] = {
+                    "count": self._counts[name],
+                    "timeouts": self._timeouts.get(name, 0),
+                    "avg": round(sum(durations) / len(durations), 3),
+                    "p50": round(durations[len(durations) // 2], 3),
+                    "p95": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+                    "max": round(durations[-1], 3),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._timeouts.clear()
+
+
+# 全局等待统计实例
+wait_stats = WaitStats()
+
+
+def get_wait_stats() -> WaitStats:
+    """获取全局等待统计"""
+    return wait_stats
+
+
+def wait_until(
+    predicate: Callable[[], Any],
+    timeout: float = 5.0,
+    interval: float = 0.1,
+    name: str = "wait",
+    stats: Optional[WaitStats] = None,
+    sleep=time.sleep,
+    clock=time.monotonic,
+) -> Any:
+    """
+    轮询直到条件满足或超时
+
+    条件中的异常视为"尚未满足"（设备RPC偶发失败不应中断等待）。
+
+    Args:
+        predicate: 条件函数，返回真值表示满足
+        timeout: 超时时间（秒）
+        interval: 轮询间隔（秒）
+        name: 统计用的等待名称
+        stats: 统计对象，None则使用全局统计
+
+    Returns:
+        条件满足时predicate的返回值；超时返回最后一次的结果（假值）
+    """
+    started = clock()
+    deadline = started + timeout
+    result = None
+    while True:
+        try:
+            result = predicate()
+        except Exception as e:
+            logger.debug(f"等待条件检查失败 [{name}]: {e}")
+            result = None
+        if result:
+            (stats or wait_stats).record(name, clock() - started, timed_out=False)
+            return result
+        remaining = deadline - clock()
+        if remaining <= 0:
+            (stats or wait_stats).record(name, clock() - started, timed_out=True)
+            logger.debug(f"等待超时 [{name}]: {timeout}秒")
+            return result
+        sleep(min(interval, remaining))
+
+
+# ---- 常用界面条件（返回predicate） ----
+
+def element_exists(device, **selector) -> Callable[[], bool]:
+    """元素出现（exists可能是惰性求值的代理，在这里求值一次，返回bool）"""
+    return lambda: bool(device(**selector).exists)
+
+
+def element_gone(device, **selector) -> Callable[[], bool]:
+    """元素消失"""
+    return lambda: not bool(device(**selector).exists)
+
+
+def element_count_at_least(device, count: int, **selector) -> Callable[[], bool]:
+    """匹配的元素至少有count个"""
+    return lambda: device(**selector).count >= count
+
+
+def text_equals(device, selector: Dict[str, Any], expected: str) -> Callable[[], bool]:
+    """元素文本等于预期（空文本与None等价）"""
+    return lambda: (device(**selector).get_text() or "") == expected
+
+
+def activity_contains(device, fragment: str) -> Callable[[], bool]:
+    """前台Activity名称包含指定片段"""
+    return lambda: fragment in (device.app_current().get("activity") or "")
+
+
+def activity_changed(device) -> Callable[[], bool]:
+    """前台Activity与创建条件时不同（需在触发操作之前创建）"""
+    before = device.app_current().get("activity")
+    return lambda: device.app_current().get("activity") != before
+
+
+def hierarchy_changed(device) -> Callable[[], bool]:
+    """界面层级与创建条件时不同（需在触发操作之前创建）"""
+    def digest() -> str:
+        return hashlib.blake2b(device.dump_hierarchy().encode("utf-8"), digest_size=16).hexdigest()
+
+    before = digest()
+    return lambda: digest() != before
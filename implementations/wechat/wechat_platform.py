@@ -2,11 +2,24 @@
 微信平台实现 - 基于uiautomator2的真实UI自动化
 """
 import time
-import uiautomator2 as u2
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
 from interfaces.message_platform import IMessagePlatform
+from implementations.wechat.hierarchy import (
+    ChatCursor,
+    ChatRow,
+    parse_chat_list,
+    parse_chat_messages,
+)
+from implementations.wechat.chat_scheduler import ChatListPager, ChatTask, RoundRobinScheduler, remaining
+from implementations.wechat.contact_cache import ContactLocationCache
+from implementations.wechat.device_session import DeviceSession, get_session, with_session_lock
+from implementations.wechat.instrumentation import instrumented
+from implementations.wechat.navigation import Navigator, Screen
+from implementations.wechat.vision import RedDotDetector, to_array
+from implementations.wechat.waits import element_count_at_least, element_exists, text_equals, wait_until
 
 
 class WeChatPlatform(IMessagePlatform):
@@ -23,20 +36,54 @@ class WeChatPlatform(IMessagePlatform):
         "red_dot": {"resourceId": "com.tencent.mm:id/e64"},  # 未读红点
         "contact_name": {"resourceId": "com.tencent.mm:id/dyh"},  # 联系人名称
         "latest_message": {"resourceId": "com.tencent.mm:id/e62"},  # 最新消息
+        "chat_title": {"resourceId": "com.tencent.mm:id/ko4"},  # 聊天窗口标题
+        "msg_list": {"resourceId": "com.tencent.mm:id/b79"},  # 聊天窗口消息列表
+        "msg_row": {"resourceId": "com.tencent.mm:id/b4r"},  # 单条消息行
+        "msg_avatar": {"resourceId": "com.tencent.mm:id/au2"},  # 消息头像
+        "msg_text": {"resourceId": "com.tencent.mm:id/b4b"},  # 文本消息气泡
+        "msg_image": {"resourceId": "com.tencent.mm:id/b4e"},  # 图片消息
+        "wechat_tab": {"text": "微信"},  # 底部"微信"tab
     }
     
-    def __init__(self, device_serial: str = None):
+    # 最多保留多少个会话的已读位置（LRU淘汰）
+    MAX_CHAT_CURSORS = 500
+    
+    def __init__(
+        self,
+        device_serial: str = None,
+        session: Optional[DeviceSession] = None,
+        vision_unread: bool = False,
+        scan_pages: int = 3,
+        per_chat_budget: float = 5.0,
+        scan_budget: Optional[float] = 30.0,
+    ):
         """
         初始化微信平台
         
         Args:
             device_serial: 设备序列号（None则使用第一个设备）
+            session: 共享的设备会话（None则按序列号获取）
+            vision_unread: 读取聊天列表时额外截一张图，用颜色检测未读红点
+                （red_dot 资源ID在新版微信中失效时使用）
+            scan_pages: 扫描未读时最多读取聊天列表的屏数（首屏以下的会话通过滚动收集）
+            per_chat_budget: 处理单个未读会话的时限（秒）
+            scan_budget: 一次扫描处理未读会话的总时限（秒），超出的会话下次扫描优先处理
         """
         super().__init__()
+        self.red_dots = RedDotDetector() if vision_unread else None
+        self._cursors: "OrderedDict[str, ChatCursor]" = OrderedDict()
+        self.contact_cache = ContactLocationCache()
+        self.scan_pages = scan_pages
+        self.chat_scheduler = RoundRobinScheduler(per_chat_budget=per_chat_budget, round_budget=scan_budget)
+        self.session = session or get_session(device_serial)
         
         try:
-            self.device = u2.connect(device_serial) if device_serial else u2.connect()
+            self.device = self.session.device
             logger.info(f"连接设备成功: {self.device.info}")
+            self.navigator = Navigator(self.device, self.SELECTORS, hierarchy=self.session.hierarchy)
+            self.pager = ChatListPager(
+                self.device, self._read_chat_list, *self.session.window_size(), settle_read=self._read_chat_list_fresh
+            )
             
             # 检查微信是否安装
             if not self.device.app_info("com.tencent.mm"):
@@ -50,17 +97,13 @@ class WeChatPlatform(IMessagePlatform):
             raise
     
     def _launch_wechat(self):
-        """启动微信并返回首页"""
+        """启动微信并进入首页聊天列表（已在前台则不重启）"""
         logger.info("启动微信...")
-        self.device.app_start("com.tencent.mm", stop=True)
-        time.sleep(3)  # 等待启动
-        
-        # 确保在聊天列表页
-        self.device.press("back")
-        self.device.press("back")
-        time.sleep(1)
+        self.navigator.go_to(Screen.CHAT_LIST)
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=5))
+    @with_session_lock
+    @instrumented("send")
     def send_message(self, receiver: str, content: str) -> bool:
         """
         发送消息
@@ -75,42 +118,93 @@ class WeChatPlatform(IMessagePlatform):
         try:
             logger.info(f"发送消息: {receiver} -> {content[:50]}")
             
-            # 1. 返回聊天列表
-            self._ensure_chat_list()
-            
-            # 2. 搜索联系人
-            if not self._search_contact(receiver):
+            # 1-3. 进入聊天窗口（已在则跳过，列表中可见则直接点击，否则搜索）
+            if not self._open_chat(receiver):
                 logger.error(f"未找到联系人: {receiver}")
                 return False
             
-            # 3. 进入聊天窗口
-            time.sleep(1)
-            
-            # 4. 输入消息
-            input_box = self.device(**self.SELECTORS["message_input"])
-            if not input_box.exists:
-                logger.error("未找到消息输入框")
-                return False
-            
-            input_box.click()
-            time.sleep(0.5)
-            input_box.set_text(content)
-            time.sleep(0.5)
-            
-            # 5. 发送
-            send_btn = self.device(**self.SELECTORS["send_btn"])
-            if send_btn.exists:
-                send_btn.click()
-                logger.success(f"消息发送成功: {receiver}")
-                return True
-            else:
-                logger.error("未找到发送按钮")
-                return False
+            # 4-5. 输入并发送
+            return self._type_and_send(receiver, content)
                 
         except Exception as e:
             logger.error(f"发送消息失败: {e}", exc_info=True)
             return False
     
+    @with_session_lock
+    @instrumented("send")
+    def send_batch(self, receiver: str, contents: List[str]) -> List[bool]:
+        """
+        进入一次聊天窗口，依次发送多条消息
+        
+        Args:
+            receiver: 接收者
+            contents: 按顺序发送的消息内容
+            
+        Returns:
+            每条消息是否发送成功
+        """
+        results = [False] * len(contents)
+        try:
+            logger.info(f"批量发送消息: {receiver} x{len(contents)}")
+            if not self._open_chat(receiver):
+                logger.error(f"未找到联系人: {receiver}")
+                return results
+            for i, content in enumerate(contents):
+                results[i] = self._type_and_send(receiver, content)
+        except Exception as e:
+            logger.error(f"批量发送消息失败: {e}", exc_info=True)
+        return results
+    
+    def navigation_cost(self, receiver: str) -> int:
+        """
+        估算进入该联系人聊天窗口的代价（供发送调度排序）
+        
+        Returns:
+            0: 已在该聊天窗口; 1: 聊天列表中可见（位置缓存命中）; 2: 需要搜索
+        """
+        if self.session.current_chat == receiver:
+            return 0
+        if self.contact_cache.contains(receiver):
+            return 1
+        return 2
+    
+    def _type_and_send(self, receiver: str, content: str) -> bool:
+        """在当前聊天窗口输入并发送一条消息"""
+        # 等待聊天窗口的输入框出现
+        if not wait_until(element_exists(self.device, **self.SELECTORS["message_input"]),
+                          timeout=3, name="chat_opened"):
+            logger.error("未找到消息输入框")
+            return False
+        input_box = self.device(**self.SELECTORS["message_input"])
+        
+        input_box.click()
+        input_box.set_text(content)
+        wait_until(text_equals(self.device, self.SELECTORS["message_input"], content),
+                   timeout=2, name="message_typed")
+        
+        send_btn = self.device(**self.SELECTORS["send_btn"])
+        if send_btn.exists:
+            send_btn.click()
+            # 发送后该会话移到列表顶部，缓存的位置全部失效
+            self.contact_cache.invalidate()
+            logger.success(f"消息发送成功: {receiver}")
+            return True
+        else:
+            logger.error("未找到发送按钮")
+            return False
+    
+    @with_session_lock
+    def send_to_background(self):
+        """
+        回到桌面，让微信退到后台
+        
+        微信在前台时不发状态栏通知，通知驱动模式每次扫描后调用；下次扫描或发送时导航会重新启动微信。
+        """
+        self.device.press("home")
+        self.session.set_ui_state(Screen.NOT_RUNNING)
+    
+    @with_session_lock
+    @instrumented("scan")
     def get_unread_messages(self) -> List[Dict[str, Any]]:
         """
         获取未读消息
@@ -121,84 +215,140 @@ class WeChatPlatform(IMessagePlatform):
         try:
             logger.debug("扫描未读消息...")
             
-            # 确保在聊天列表
-            self._ensure_chat_list()
-            time.sleep(1)
+            # 确保在聊天列表（导航时的dump直接复用来解析列表）
+            state = self.navigator.go_to(Screen.CHAT_LIST)
+            self.session.set_ui_state(Screen.CHAT_LIST)
             
             unread_messages = []
             
-            # 查找有红点的聊天项
-            chat_items = self.device(**self.SELECTORS["chat_list"]).child(
-                **self.SELECTORS["message_item"]
-            )
+            # 逐屏读取聊天列表收集未读会话（已在顶部时首屏复用导航时的dump）
+            first_page = self._read_chat_list(state.root) if self.pager.page == 0 else None
+            self.chat_scheduler.offer(self.pager.collect(self.scan_pages, first_page))
             
-            for i in range(min(10, chat_items.count)):  # 只检查前10个
-                try:
-                    # 检查是否有未读标记
-                    item = chat_items[i]
-                    
-                    # 获取联系人名称
-                    contact_elem = item.child(**self.SELECTORS["contact_name"])
-                    if not contact_elem.exists:
-                        continue
-                    
-                    contact_name = contact_elem.get_text()
-                    
-                    # 获取最新消息内容
-                    message_elem = item.child(**self.SELECTORS["latest_message"])
-                    if not message_elem.exists:
-                        continue
-                    
-                    message_content = message_elem.get_text()
-                    
-                    # 检查是否有红点（未读标记）
-                    red_dot = item.child(**self.SELECTORS["red_dot"])
-                    if red_dot.exists:
-                        # 点击进入聊天
-                        item.click()
-                        time.sleep(1)
-                        
-                        # 获取聊天窗口中的消息（可选：更详细的提取）
-                        messages = self._extract_chat_messages()
-                        
-                        # 返回聊天列表
-                        self.device.press("back")
-                        time.sleep(0.5)
-                        
-                        # 添加到未读列表
-                        for msg in messages:
-                            unread_messages.append({
-                                "platform": "wechat",
-                                "sender": contact_name,
-                                "content": msg["content"],
-                                "type": msg["type"],
-                                "timestamp": time.time()
-                            })
-                
-                except Exception as e:
-                    logger.warning(f"处理聊天项失败: {e}")
-                    continue
+            # 轮流处理：上次超时未处理的会话排在前面
+            self.chat_scheduler.run_round(
+                lambda task, deadline: self._service_chat(task, deadline, unread_messages)
+            )
+            self.pager.to_top()
             
             logger.info(f"扫描到 {len(unread_messages)} 条未读消息")
             return unread_messages
             
         except Exception as e:
             logger.error(f"获取未读消息失败: {e}", exc_info=True)
+            # 中途失败时列表滚动位置不可信，下次扫描先滚回顶部
+            self.pager.page = None
             return []
     
-    def _ensure_chat_list(self):
-        """确保在聊天列表页面"""
-        # 按返回键多次确保退出聊天窗口
-        for _ in range(3):
-            self.device.press("back")
-            time.sleep(0.3)
+    def _service_chat(self, task: ChatTask, deadline: float, out: List[Dict[str, Any]]) -> bool:
+        """
+        进入一个未读会话读取新消息并返回聊天列表
+        
+        Args:
+            task: 待处理的会话
+            deadline: 截止时间（time.monotonic），限制等待界面切换的时间
+            out: 读到的消息追加到这里
+            
+        Returns:
+            是否处理完（会话已不在未读列表中也视为处理完）
+        """
+        # 进入/返回聊天后列表可能重新排序，按名称重新定位
+        row = self.pager.locate(task.name, task.page, deadline)
+        if row is None:
+            logger.debug(f"会话已不在未读列表: {task.name}")
+            return True
+        
+        # 点击进入聊天
+        self.device.click(*row.bounds.center)
+        wait_until(element_exists(self.device, **self.SELECTORS["msg_list"]),
+                   timeout=remaining(deadline, 3), name="chat_opened")
+        
+        # 解析聊天窗口，只取上次访问之后的新消息
+        messages = self._extract_chat_messages(task.name, row.unread_count)
         
-        # 点击"微信"tab（如果不在）
-        wechat_tab = self.device(text="微信")
-        if wechat_tab.exists:
-            wechat_tab.click()
-            time.sleep(0.5)
+        # 返回聊天列表（保持原来的滚动位置）
+        self.device.press("back")
+        wait_until(element_exists(self.device, **self.SELECTORS["chat_list"]),
+                   timeout=remaining(deadline, 2), name="chat_list_returned")
+        
+        for msg in messages:
+            out.append({
+                "platform": "wechat",
+                "sender": task.name,
+                "author": msg["author"],
+                "content": msg["content"],
+                "type": msg["type"],
+                "timestamp": time.time()
+            })
+        return True
+    
+    def _read_chat_list(self, root=None) -> List[ChatRow]:
+        """一次dump_hierarchy()读取并解析聊天列表（可传入已解析的层级树，默认用会话的层级缓存）"""
+        if root is None:
+            root = self.session.hierarchy()
+        rows = parse_chat_list(root, self.SELECTORS)
+        if self.red_dots is not None:
+            self._mark_unread_by_vision(rows)
+        self.contact_cache.observe(rows)
+        logger.debug(f"聊天列表: {len(rows)} 行, 未读 {sum(r.unread for r in rows)} 行")
+        return rows
     
+    def _read_chat_list_fresh(self) -> List[ChatRow]:
+        """重新dump读取聊天列表（不截图标记未读），用于判断滚动是否停止"""
+        return parse_chat_list(self.session.hierarchy(fresh=True), self.SELECTORS)
+
+    def _mark_unread_by_vision(self, rows: List[ChatRow]):
+        """截图检测红点，把红点所在的行标记为未读（未读数未知时按1条计）"""
+        dots = self.red_dots.detect(to_array(self.device.screenshot()))
+        for dot in dots:
+            x, y = dot.center
+            for row in rows:
+                b = row.bounds
+                if b is not None and b.left <= x < b.right and b.top <= y < b.bottom:
+                    if not row.unread:
+                        row.unread, row.unread_count = True, 1
+                    break
+    
+    @instrumented("open_chat")
+    def _open_chat(self, name: str) -> bool:
+        """
+        进入联系人的聊天窗口
+        
+        已在该聊天窗口则不做任何操作；联系人在聊天列表中可见（位置缓存命中）则直接点击该行，
+        并确认进入的是正确的聊天；否则退回搜索。
+        
+        Args:
+            name: 联系人名称
+            
+        Returns:
+            是否成功进入
+        """
+        state = self.navigator.detect()
+        if self.navigator.is_in_chat(name, state):
+            self.session.set_ui_state(Screen.CHAT, name)
+            return True
+        
+        state = self.navigator.go_to(Screen.CHAT_LIST, state)
+        self.session.set_ui_state(Screen.CHAT_LIST)
+        self._read_chat_list(state.root)
+        bounds = self.contact_cache.lookup(name)
+        if bounds is not None:
+            self.device.click(*bounds.center)
+            wait_until(element_exists(self.device, **self.SELECTORS["message_input"]),
+                       timeout=3, name="chat_opened")
+            if self.navigator.is_in_chat(name):
+                logger.debug(f"位置缓存命中，直接进入聊天: {name}")
+                self.session.set_ui_state(Screen.CHAT, name)
+                return True
+            logger.debug(f"位置缓存失效，改用搜索: {name}")
+            self.contact_cache.invalidate(name)
+        
+        if not self._search_contact(name):
+            return False
+        self.session.set_ui_state(Screen.CHAT, name)
+        return True
+    
+    @instrumented("search")
     def _search_contact(self, name: str) -> bool:
         """
         搜索联系人并点击
@@ -210,14 +360,8 @@ class WeChatPlatform(IMessagePlatform):
             是否找到并点击成功
         """
         try:
-            # 点击搜索按钮
-            search_btn = self.device(**self.SELECTORS["search_btn"])
-            if not search_btn.exists:
-                logger.error("未找到搜索按钮")
-                return False
-            
-            search_btn.click()
-            time.sleep(0.5)
+            # 进入搜索页（从任意页面按最短路径）
+            self.navigator.go_to(Screen.SEARCH)
             
             # 输入搜索内容
             search_input = self.device(**self.SELECTORS["search_input"])
@@ -226,7 +370,9 @@ class WeChatPlatform(IMessagePlatform):
                 return False
             
             search_input.set_text(name)
-            time.sleep(1)
+            # 等待搜索结果出现（搜索框本身也包含该文本）
+            wait_until(element_count_at_least(self.device, 2, textContains=name),
+                       timeout=3, name="search_results")
             
             # 点击第一个搜索结果
             result = self.device(textContains=name)
@@ -241,12 +387,25 @@ class WeChatPlatform(IMessagePlatform):
             logger.error(f"搜索联系人失败: {e}")
             return False
     
-    def _extract_chat_messages(self, count: int = 5) -> List[Dict[str, Any]]:
+    def _cursor(self, chat_name: str) -> ChatCursor:
+        """获取会话的已读位置（LRU）"""
+        cursor = self._cursors.pop(chat_name, None) or ChatCursor()
+        self._cursors[chat_name] = cursor
+        while len(self._cursors) > self.MAX_CHAT_CURSORS:
+            self._cursors.popitem(last=False)
+        return cursor
+    
+    @instrumented("extract")
+    def _extract_chat_messages(self, chat_name: str, count: int = 5) -> List[Dict[str, Any]]:
         """
-        从聊天窗口提取最新消息
+        从当前聊天窗口提取新消息
+        
+        一次dump解析所有可见气泡，再用会话的已读位置过滤掉已经处理过的消息；
+        自己发送的消息只推进已读位置，不返回。
         
         Args:
-            count: 提取数量
+            chat_name: 会话名称
+            count: 首次访问（没有已读位置）时最多取最后几条，通常为未读数
             
         Returns:
             消息列表
@@ -254,15 +413,22 @@ class WeChatPlatform(IMessagePlatform):
         messages = []
         
         try:
-            # 使用dump_hierarchy获取页面XML
-            xml = self.device.dump_hierarchy()
+            root = self.session.hierarchy()
+            bubbles = parse_chat_messages(root, self.SELECTORS, self.session.width)
+            new_bubbles = self._cursor(chat_name).advance(
+                bubbles, unknown_limit=max(count, 1), expected_new=count or None
+            )
             
-            # 简单提取（实际需要更复杂的XML解析）
-            # 这里仅作示例
-            messages.append({
-                "content": "消息内容提取待完善",
-                "type": "text"
-            })
+            for bubble in new_bubbles:
+                if bubble.is_self:
+                    continue
+                messages.append({
+                    # 群聊中为发言人昵称，单聊中即会话名称
+                    "author": bubble.sender or chat_name,
+                    "content": bubble.content,
+                    "type": bubble.type,
+                })
+            logger.debug(f"会话 {chat_name}: 可见 {len(bubbles)} 条, 新消息 {len(messages)} 条")
             
         except Exception as e:
             logger.error(f"提取消息失败: {e}")
@@ -307,7 +473,11 @@ class WeChatPlatform(IMessagePlatform):
         """重新连接设备"""
         try:
             logger.info("重新连接设备...")
-            self.device = u2.connect()
+            self.device = self.session.reconnect()
+            self.navigator = Navigator(self.device, self.SELECTORS, hierarchy=self.session.hierarchy)
+            self.pager = ChatListPager(
+                self.device, self._read_chat_list, *self.session.window_size(), settle_read=self._read_chat_list_fresh
+            )
             self._launch_wechat()
             logger.success("重新连接成功")
         except Exception as e:
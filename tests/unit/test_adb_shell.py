@@ -0,0 +1,91 @@
+"""
+持久化adb shell测试（用本地sh模拟 `adb shell`）
+"""
+import os
+import stat
+import threading
+
+import pytest
+
+from implementations.wechat.adb_shell import AdbShell, get_adb_shell
+
+
+@pytest.fixture
+def shell(tmp_path):
+    """忽略参数、直接启动sh的假adb"""
+    fake_adb = tmp_path / "adb"
+    fake_adb.write_text("#!/bin/sh\nexec sh\n")
+    fake_adb.chmod(fake_adb.stat().st_mode | stat.S_IEXEC)
+    adb_shell = AdbShell("emulator-5554", adb_path=str(fake_adb))
+    yield adb_shell
+    adb_shell.close()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="需要 /bin/sh")
+class TestAdbShell:
+    """持久化shell测试"""
+
+    def test_output_and_exit_code(self, shell):
+        """测试输出和退出码"""
+        result = shell.execute("echo hello; echo world")
+        assert result.output == "hello\nworld"
+        assert result.ok
+
+        failed = shell.execute("exit_code_test() { return 3; }; exit_code_test")
+        assert failed.exit_code == 3
+        assert not failed.ok
+        assert shell.stats["failures"] == 1
+
+    def test_output_without_trailing_newline(self, shell):
+        """测试输出末尾没有换行时标记与最后一行相连"""
+        assert shell.run("printf abc") == "abc"
+
+    def test_batch_is_pipelined_in_one_process(self, shell):
+        """测试批量命令在同一个进程中按顺序执行"""
+        results = shell.run_batch(["X=1", "echo $X", "false", "echo $$"])
+        pid = results[3].output
+
+        assert [r.exit_code for r in results] == [0, 0, 1, 0]
+        assert results[1].output == "1"
+        assert shell.run("echo $$") == pid
+        assert shell.stats["restarts"] == 1
+
+    def test_command_queue(self, shell):
+        """测试命令队列按提交顺序执行"""
+        futures = [shell.submit(f"echo {i}") for i in range(5)]
+        assert [f.result(timeout=5).output for f in futures] == ["0", "1", "2", "3", "4"]
+
+    def test_concurrent_submit_uses_one_worker(self, shell):
+        """测试多个线程同时提交时命令都在同一个队列线程上执行"""
+        workers = set()
+        execute = shell.execute
+        shell.execute = lambda command, timeout: workers.add(threading.current_thread()) or execute(command, timeout)
+        futures = []
+        threads = [threading.Thread(target=lambda: futures.append(shell.submit("true"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for future in futures:
+            future.result(timeout=5)
+        assert len(futures) == 8 and len(workers) == 1
+
+    def test_close_stops_queue(self, shell):
+        """测试关闭后队列线程退出，再次提交仍可执行"""
+        assert shell.submit("echo 1").result(timeout=5).output == "1"
+        old = shell._queue
+        shell.close()
+        assert old._shutdown
+        assert shell.submit("echo 2").result(timeout=5).output == "2"
+
+    def test_restart_after_exit(self, shell):
+        """测试shell进程退出后自动重启"""
+        with pytest.raises(ConnectionError):
+            shell.run("exit 0")
+        assert shell.run("echo again") == "again"
+
+
+def test_registry_shares_shell():
+    """测试同一序列号共享同一通道"""
+    assert get_adb_shell("serial-x") is get_adb_shell("serial-x")
+    assert get_adb_shell("serial-x") is not get_adb_shell("serial-y")
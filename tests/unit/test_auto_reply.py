@@ -0,0 +1,150 @@
+"""
+自动回复流水线测试（假设备：聊天列表 <-> 聊天窗口）
+"""
+from PIL import Image
+
+import wechat_auto_reply
+from implementations.wechat.chat_scheduler import RoundRobinScheduler
+from implementations.wechat.device_session import DeviceSession
+from wechat_auto_reply import ChatSendAdapter, WeChatAutoReply
+from wechat_receiver import WeChatReceiver
+
+
+ROWS = ("张三", "李四")
+ROW_TOP, ROW_HEIGHT = 300, 200
+
+
+class FakeElement:
+    """按当前界面的层级判断元素是否存在"""
+
+    def __init__(self, phone, selector):
+        self.phone = phone
+        self.selector = selector
+
+    @property
+    def exists(self):
+        return f'resource-id="{self.selector.get("resourceId")}"' in self.phone._xml()
+
+
+class FakePhone:
+    """聊天列表两行，点击进入对应聊天，back返回列表"""
+
+    def __init__(self, unread=("张三",)):
+        self.settings = {}
+        self.screen = "list"
+        self.unread = set(unread)
+        self.clicks = []
+        self.dumps = 0
+
+    def window_size(self):
+        return 1080, 2400
+
+    def dump_hierarchy(self):
+        self.dumps += 1
+        return self._xml()
+
+    def _xml(self):
+        if self.screen != "list":
+            return (
+                '<hierarchy><node resource-id="com.tencent.mm:id/ko4" '
+                f'text="{self.screen}" bounds="[200,80][880,160]" /></hierarchy>'
+            )
+        items = []
+        for i, name in enumerate(ROWS):
+            top = ROW_TOP + i * ROW_HEIGHT
+            dot = '<node resource-id="com.tencent.mm:id/h8h" text="1" bounds="[120,0][160,40]" />' if name in self.unread else ""
+            items.append(
+                f'<node resource-id="com.tencent.mm:id/al_" bounds="[0,{top}][1080,{top + ROW_HEIGHT}]">'
+                f'<node resource-id="com.tencent.mm:id/dyh" text="{name}" bounds="[200,{top}][600,{top + 60}]" />'
+                f'{dot}</node>'
+            )
+        return f'<hierarchy><node resource-id="com.tencent.mm:id/e5u">{"".join(items)}</node></hierarchy>'
+
+    def __call__(self, **selector):
+        return FakeElement(self, selector)
+
+    def screenshot(self):
+        return Image.new("RGB", (1080, 2400), "white")
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+        if self.screen == "list":
+            index = (y - ROW_TOP) // ROW_HEIGHT
+            if 0 <= index < len(ROWS):
+                self.screen = ROWS[index]
+                self.unread.discard(ROWS[index])
+
+    def press(self, key):
+        if key == "back":
+            self.screen = "list"
+
+    def swipe(self, *args, **kwargs):
+        pass
+
+
+class FakeSender:
+    """记录发送时所在的聊天窗口"""
+
+    def __init__(self, phone):
+        self.phone = phone
+        self.sent = []
+
+    def send_message(self, content, screenshot_dir=None):
+        self.sent.append((self.phone.screen, content))
+        return True
+
+
+class SearchNotAllowed:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("不应打开搜索")
+
+
+class TestCaptureReplyCycle:
+    """截取 -> 回复 一个周期"""
+
+    def setup_method(self):
+        self.phone = FakePhone()
+        session = DeviceSession(connect=lambda: self.phone, instrument=False)
+        self.app = WeChatAutoReply.__new__(WeChatAutoReply)
+        self.app.session = session
+        self.app.receiver = WeChatReceiver(session)
+        self.app.sender = FakeSender(self.phone)
+        self.app.chats = RoundRobinScheduler()
+        self.app.scan_pages = 1
+
+    def test_reply_reopens_chat_from_list_without_search(self, monkeypatch):
+        """测试回复通过聊天列表中可见的行进入会话，不打开搜索"""
+        monkeypatch.setattr(wechat_auto_reply, "WeChatContactManager", SearchNotAllowed)
+
+        jobs = self.app._capture_round()
+        assert [job["chat"] for job in jobs] == ["张三"]
+        # 截取后回到聊天列表
+        assert self.phone.screen == "list"
+
+        adapter = ChatSendAdapter(self.app)
+        assert adapter.navigation_cost("张三") == 1
+        assert adapter.send_batch("张三", ["你好"]) == [True]
+        assert self.app.sender.sent == [("张三", "你好")]
+        assert self.app.session.current_chat == "张三"
+        assert adapter.navigation_cost("张三") == 0
+
+    def test_open_visible_chat_does_not_dump_before_click(self):
+        """测试进入会话：读取列表一次dump、等待用元素查询、读取标题一次dump"""
+        receiver = self.app.receiver
+        assert receiver.open_visible_chat("李四")
+        assert self.phone.screen == "李四"
+        assert self.phone.dumps == 2
+
+    def test_capture_round_passes_deadline(self):
+        """测试轮转处理把单个会话的截止时间传给进入会话的等待"""
+        deadlines = []
+        open_chat = self.app.receiver.open_chat
+
+        def recording(name, page=0, deadline=None):
+            deadlines.append(deadline)
+            return open_chat(name, page, deadline)
+
+        self.app.receiver.open_chat = recording
+        jobs = self.app._capture_round()
+        assert [job["chat"] for job in jobs] == ["张三"]
+        assert len(deadlines) == 1 and deadlines[0] is not None
@@ -0,0 +1,83 @@
+"""
+气泡分割测试
+"""
+import numpy as np
+
+from implementations.wechat.vision import BubbleTracker, segment_bubbles
+from implementations.wechat.vision.bubbles import CENTER, LEFT, RIGHT
+
+BACKGROUND = (237, 237, 237)
+
+
+def chat(messages, height=1800, width=1080):
+    """
+    画一个假聊天窗口
+
+    messages: [(side, 行数, 宽度, 灰度)]，从上往下排列
+    """
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[:] = BACKGROUND
+    y = 40
+    for side, lines, bubble_width, shade in messages:
+        bubble_height = 40 + 50 * lines
+        if side == CENTER:
+            frame[y:y + 30, 480:600] = 180
+            y += 30 + 40
+            continue
+        if side == LEFT:
+            frame[y:y + 100, 30:130] = (90, 120, 160)
+            left = 170
+        else:
+            frame[y:y + 100, 950:1050] = (160, 120, 90)
+            left = 910 - bubble_width
+        frame[y:y + bubble_height, left:left + bubble_width] = (255, 255, 255) if side == LEFT else (149, 236, 105)
+        for line in range(lines):
+            top = y + 30 + 50 * line
+            frame[top:top + 20, left + 20:left + bubble_width - 20 - 10 * line] = shade
+        y += max(bubble_height, 100) + 40
+    return frame
+
+
+class TestSegmentBubbles:
+    """气泡分割测试"""
+
+    def test_sides_and_bounds(self):
+        """测试区分对方/自己/系统提示并给出气泡范围"""
+        frame = chat([(CENTER, 0, 0, 0), (LEFT, 1, 300, 40), (RIGHT, 3, 500, 40)])
+        bubbles = segment_bubbles(frame)
+
+        assert [b.side for b in bubbles] == [CENTER, LEFT, RIGHT]
+        left = bubbles[1]
+        assert abs(left.left - 170) <= 4 and abs(left.right - 470) <= 4
+        assert abs(bubbles[2].height - 190) <= 4
+
+    def test_long_message_not_truncated(self):
+        """测试多行长消息作为一个气泡完整返回"""
+        bubbles = segment_bubbles(chat([(LEFT, 12, 600, 40)]))
+        assert len(bubbles) == 1
+        assert bubbles[0].height >= 12 * 50
+
+
+class TestBubbleTracker:
+    """气泡跟踪测试"""
+
+    def setup_method(self):
+        self.tracker = BubbleTracker()
+
+    def test_only_new_bubbles_after_scroll(self):
+        """测试滚动后只有底部新出现的气泡是新的"""
+        history = [(LEFT, 1, 300, 40), (RIGHT, 1, 200, 60), (LEFT, 2, 400, 20)]
+        _, new = self.tracker.update(chat(history))
+        assert len(new) == 3
+
+        scrolled = chat(history[1:] + [(LEFT, 1, 250, 90)])
+        bubbles, new = self.tracker.update(scrolled)
+        assert len(bubbles) == 3
+        assert len(new) == 1 and new[0].side == LEFT
+        assert new[0].top == bubbles[-1].top
+
+    def test_unchanged_frame_has_no_new(self):
+        """测试画面不变时没有新气泡"""
+        frame = chat([(LEFT, 1, 300, 40)])
+        self.tracker.update(frame)
+        assert self.tracker.update(frame)[1] == []
@@ -0,0 +1,69 @@
+"""
+帧差分测试
+"""
+
+import numpy as np
+
+from implementations.wechat.vision import FrameDiffer, downscale_gray
+
+
+def blank(height=1680, width=1080):
+    return np.full((height, width, 3), 255, dtype=np.uint8)
+
+
+class TestFrameDiffer:
+    """帧差分测试"""
+
+    def setup_method(self):
+        self.differ = FrameDiffer(pixel_delta=30, min_fraction=0.01)
+
+    def test_first_frame_is_baseline(self):
+        """测试第一帧只作为基准"""
+        assert not self.differ.update(blank()).changed
+        assert not self.differ.update(blank()).changed
+
+    def test_detects_change_with_bbox(self):
+        """测试检测到变化并给出原图坐标的变化区域"""
+        self.differ.update(blank())
+        frame = blank()
+        frame[1200:1400, 100:600] = 0
+
+        result = self.differ.update(frame)
+
+        assert result.changed
+        assert 0.04 < result.fraction < 0.07
+        left, top, right, bottom = result.bbox
+        assert 90 <= left <= 100 and 600 <= right <= 610
+        assert 1190 <= top <= 1200 and 1400 <= bottom <= 1410
+
+    def test_small_noise_ignored(self):
+        """测试低于像素阈值或占比阈值的变化被忽略"""
+        self.differ.update(blank())
+        faint = blank()
+        faint[:, :] = 240
+        assert not self.differ.update(faint).changed
+
+        speck = blank()
+        speck[0:10, 0:10] = 0
+        assert not self.differ.update(speck).changed
+
+    def test_baseline_updates_only_on_change(self):
+        """测试基准帧只在检测到变化时更新"""
+        self.differ.update(blank())
+        changed = blank()
+        changed[0:800] = 0
+        assert self.differ.update(changed).changed
+        assert not self.differ.update(changed).changed
+        assert self.differ.stats == {"frames": 3, "changes": 1}
+
+    def test_downscale_is_gray(self):
+        """测试缩小后的灰度尺寸与取样步长"""
+        small, step = downscale_gray(blank(), (108, 168))
+        assert small.shape == (168, 108)
+        assert step == (10, 10)
+        assert int(small[0, 0]) in (254, 255)
+
+        # 步长向下取整：输出不小于目标尺寸
+        small, step = downscale_gray(blank(), (100, 160))
+        assert step == (10, 10)
+        assert small.shape == (168, 108)
@@ -0,0 +1,233 @@
+"""
+多会话轮转调度测试
+"""
+import time
+
+from implementations.wechat.chat_scheduler import ChatListPager, RoundRobinScheduler, collect_unread, remaining
+from implementations.wechat.hierarchy import Bounds, ChatRow
+
+
+def row(name, unread=False, index=0, count=1):
+    return ChatRow(
+        index=index,
+        name=name,
+        latest_message="",
+        unread=unread,
+        unread_count=count if unread else 0,
+        bounds=Bounds(0, index * 100, 1080, index * 100 + 100),
+    )
+
+
+class FakeList:
+    """按屏返回聊天行的假聊天列表（相邻两屏有重叠）"""
+
+    def __init__(self, names, unread=(), page_size=4, step=3):
+        self.names = names
+        self.unread = set(unread)
+        self.page_size = page_size
+        self.step = step
+        self.offset = 0
+        self.swipes = []
+
+    def read(self):
+        visible = self.names[self.offset:self.offset + self.page_size]
+        return [row(name, name in self.unread, i) for i, name in enumerate(visible)]
+
+    def scroll(self, direction=1):
+        limit = max(0, len(self.names) - self.page_size)
+        self.offset = min(limit, max(0, self.offset + direction * self.step))
+
+    # 作为 ChatListPager 的 device
+    def swipe(self, x1, y1, x2, y2, duration=None):
+        self.swipes.append((y1, y2))
+        self.scroll(1 if y2 < y1 else -1)
+
+
+class FlingList(FakeList):
+    """滑动返回后列表还在惯性滚动：每读取一次向目标位置移动一行"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.target = 0
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        rows = super().read()
+        if self.offset != self.target:
+            self.offset += 1 if self.target > self.offset else -1
+        return rows
+
+    def swipe(self, x1, y1, x2, y2, duration=None):
+        self.swipes.append((y1, y2))
+        limit = max(0, len(self.names) - self.page_size)
+        self.target = min(limit, max(0, self.target + (1 if y2 < y1 else -1) * self.step))
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCollectUnread:
+    """逐屏收集测试"""
+
+    def test_collects_past_first_screen_without_duplicates(self):
+        """测试收集首屏以下的未读会话，重叠的行只计一次"""
+        chats = FakeList([f"c{i}" for i in range(10)], unread={"c1", "c3", "c5", "c9"})
+        unread, scrolls = collect_unread(chats.read, chats.scroll, max_pages=5)
+
+        assert [(r.name, page) for r, page in unread] == [("c1", 0), ("c3", 0), ("c5", 1), ("c9", 2)]
+        # 第3屏已到底，再滚一次发现没有新会话就停止
+        assert scrolls == 3
+
+    def test_respects_page_limit(self):
+        """测试页数上限"""
+        chats = FakeList([f"c{i}" for i in range(10)], unread={"c1", "c9"})
+        unread, scrolls = collect_unread(chats.read, chats.scroll, max_pages=1)
+        assert [r.name for r, _ in unread] == ["c1"]
+        assert scrolls == 0
+
+
+class TestChatListPager:
+    """聊天列表分屏测试"""
+
+    def setup_method(self):
+        self.chats = FakeList([f"c{i}" for i in range(10)], unread={"c2", "c8"})
+        self.pager = ChatListPager(self.chats, self.chats.read, 1080, 2400)
+        self.pager.SETTLE_INTERVAL = 0
+
+    def test_collect_and_locate(self):
+        """测试收集后回到顶部，再按所在屏定位会话"""
+        unread = self.pager.collect(max_pages=5)
+        assert [(r.name, page) for r, page in unread] == [("c2", 0), ("c8", 2)]
+
+        self.pager.to_top()
+        assert self.pager.page == 0 and self.chats.offset == 0
+
+        found = self.pager.locate("c8", 2)
+        assert found is not None and found.name == "c8"
+        assert self.pager.page == 2
+
+    def test_locate_missing_chat(self):
+        """测试会话已读后定位不到"""
+        self.chats.unread.discard("c2")
+        assert self.pager.locate("c2", 0) is None
+
+    def test_unknown_position_scrolls_to_top(self):
+        """测试位置未知时滚动到列表不再变化"""
+        self.chats.offset = 6
+        self.pager.page = None
+        self.pager.to_top()
+        assert self.chats.offset == 0
+        assert self.pager.page == 0
+
+
+    def test_waits_for_fling_to_settle(self):
+        """测试滑动后等列表停下再读取，收集和定位不受惯性滚动影响"""
+        chats = FlingList([f"c{i}" for i in range(10)], unread={"c2", "c8"})
+        pager = ChatListPager(chats, chats.read, 1080, 2400)
+        pager.SETTLE_INTERVAL = 0
+
+        unread = pager.collect(max_pages=5)
+        assert [(r.name, page) for r, page in unread] == [("c2", 0), ("c8", 2)]
+
+        pager.to_top()
+        assert chats.offset == 0
+        found = pager.locate("c8", 2)
+        assert found is not None and found.name == "c8"
+        assert chats.offset == chats.target
+
+
+    def test_locate_stops_scrolling_after_deadline(self):
+        """测试过了截止时间只查看当前屏，不再滚动"""
+        assert self.pager.locate("c8", 2, deadline=time.monotonic() - 1) is None
+        assert self.chats.swipes == []
+
+    def test_remaining(self):
+        """测试剩余等待时间不超过上限且有下限"""
+        assert remaining(None, 2) == 2
+        assert remaining(time.monotonic() + 60, 2) == 2
+        assert remaining(time.monotonic() - 1, 2) == 0.5
+
+
+class TestRoundRobinScheduler:
+    """轮转调度测试"""
+
+    def setup_method(self):
+        self.clock = FakeClock()
+
+    def offer(self, scheduler, *names):
+        return scheduler.offer([(row(name, True), 0) for name in names])
+
+    def test_each_chat_once_per_round(self):
+        """测试每轮每个会话处理一次，未处理完的排到队尾"""
+        scheduler = RoundRobinScheduler(round_budget=None, clock=self.clock)
+        self.offer(scheduler, "a", "b", "c")
+        remaining = {"a": 2, "b": 1, "c": 1}
+
+        def service(task, deadline):
+            remaining[task.name] -= 1
+            return remaining[task.name] == 0
+
+        assert scheduler.run_round(service) == ["a", "b", "c"]
+        assert scheduler.pending() == ["a"]
+        assert scheduler.run_round(service) == ["a"]
+        assert len(scheduler) == 0
+        assert scheduler.counters["requeued"] == 1
+
+    def test_round_budget_defers_rest_to_front(self):
+        """测试超出一轮时限的会话留在队首，先于新会话处理"""
+        scheduler = RoundRobinScheduler(per_chat_budget=5, round_budget=10, clock=self.clock)
+        self.offer(scheduler, "a", "b", "c", "d")
+
+        def service(task, deadline):
+            assert deadline == self.clock.now + 5
+            self.clock.now += 6
+            return True
+
+        assert scheduler.run_round(service) == ["a", "b"]
+        self.offer(scheduler, "e", "c")
+        assert scheduler.pending() == ["c", "d", "e"]
+        assert scheduler.counters["overruns"] == 2
+        assert scheduler.counters["deferred"] == 2
+
+    def test_offer_keeps_queue_position(self):
+        """测试重复发现的会话不重复排队，只更新未读数"""
+        scheduler = RoundRobinScheduler(clock=self.clock)
+        assert self.offer(scheduler, "a", "b") == 2
+        assert scheduler.offer([(row("a", True, count=5), 3)]) == 0
+        assert scheduler.pending() == ["a", "b"]
+
+        seen = []
+        scheduler.run_round(lambda task, deadline: seen.append((task.name, task.unread_count, task.page)) or True)
+        assert seen[0] == ("a", 5, 3)
+
+    def test_service_error_drops_chat(self):
+        """测试处理失败计数且不阻塞其它会话"""
+        scheduler = RoundRobinScheduler(clock=self.clock)
+        self.offer(scheduler, "a", "b")
+
+        def service(task, deadline):
+            if task.name == "a":
+                raise RuntimeError("boom")
+            return True
+
+        assert scheduler.run_round(service) == ["a", "b"]
+        assert scheduler.counters["errors"] == 1
+        assert len(scheduler) == 0
+
+    def test_wait_stats(self):
+        """测试首次处理前的等待时间统计"""
+        scheduler = RoundRobinScheduler(round_budget=None, clock=self.clock)
+        self.offer(scheduler, "a", "b")
+        self.clock.now = 2.0
+        scheduler.run_round(lambda task, deadline: True)
+        stats = scheduler.stats()
+        assert stats["wait_max"] == 2.0
+        assert stats["pending"] == 0
@@ -0,0 +1,60 @@
+"""
+联系人位置缓存测试
+"""
+from implementations.wechat.contact_cache import ContactLocationCache
+from implementations.wechat.hierarchy import Bounds, ChatRow
+
+
+def rows(*names, top=200):
+    return [
+        ChatRow(index=i, name=name, latest_message="", unread=False, unread_count=0,
+                bounds=Bounds(0, top + i * 200, 1080, top + (i + 1) * 200))
+        for i, name in enumerate(names)
+    ]
+
+
+class TestContactLocationCache:
+    """位置缓存测试"""
+
+    def setup_method(self):
+        self.now = 0.0
+        self.cache = ContactLocationCache(ttl=10, clock=lambda: self.now)
+
+    def test_hit_after_observe(self):
+        """测试观察到的联系人直接返回位置"""
+        self.cache.observe(rows("张三", "李四"))
+
+        assert self.cache.lookup("李四") == Bounds(0, 400, 1080, 600)
+        assert self.cache.lookup("王五") is None
+        assert self.cache.stats["hits"] == 1
+        assert self.cache.stats["misses"] == 1
+
+    def test_reorder_invalidates(self):
+        """测试列表重排后旧位置失效"""
+        self.cache.observe(rows("张三", "李四", "王五"))
+        self.cache.observe(rows("王五", "张三"))
+
+        assert self.cache.lookup("王五").top == 200
+        assert self.cache.lookup("李四") is None
+
+    def test_scroll_invalidates(self):
+        """测试列表滚动（首行位置变化）后旧位置失效"""
+        self.cache.observe(rows("张三", "李四"))
+        self.cache.observe(rows("李四", top=100))
+
+        assert self.cache.lookup("张三") is None
+        assert self.cache.lookup("李四").top == 100
+
+    def test_expiry_and_explicit_invalidate(self):
+        """测试过期和显式失效"""
+        self.cache.observe(rows("张三", "李四"))
+        self.cache.invalidate("张三")
+        assert self.cache.lookup("张三") is None
+        assert self.cache.lookup("李四") is not None
+
+        self.now = 11
+        assert self.cache.lookup("李四") is None
+
+        self.cache.observe(rows("张三", "李四"))
+        self.cache.invalidate()
+        assert self.cache.lookup("李四") is None
@@ -0,0 +1,260 @@
+"""
+消息去重测试
+"""
+from core.dedup import (
+    BloomFilter,
+    MessageDeduplicator,
+    ReplyDedupStore,
+    RotatingBloomFilter,
+    message_fingerprint,
+    normalize_content,
+    reply_digest,
+)
+
+
+class FakeRedisPipeline:
+    """模拟Redis管道"""
+
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def exists(self, key):
+        self.ops.append(lambda: int(key in self.store))
+
+    def set(self, key, value, nx=False, ex=None):
+        def op():
+            if nx and key in self.store:
+                return None
+            self.store[key] = value
+            return True
+        self.ops.append(op)
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+class FakeRedis:
+    """模拟Redis（只实现去重用到的命令）"""
+
+    def __init__(self):
+        self.store = {}
+
+    def pipeline(self):
+        return FakeRedisPipeline(self.store)
+
+
+class BrokenRedis:
+    """总是失败的Redis"""
+
+    def pipeline(self):
+        raise ConnectionError("redis down")
+
+
+class TestNormalization:
+    """内容归一化测试"""
+
+    def test_normalize_whitespace_and_width(self):
+        """测试空白和全角字符归一化"""
+        assert normalize_content("  Ｈｅｌｌｏ   World \n") == "hello world"
+
+    def test_normalize_empty(self):
+        """测试空内容"""
+        assert normalize_content(None) == ""
+
+    def test_fingerprint_is_stable(self):
+        """测试指纹对等价内容稳定"""
+        a = {"platform": "wechat", "sender": "张三", "content": "你好 "}
+        b = {"platform": "wechat", "sender": "张三", "content": " 你好"}
+        assert message_fingerprint(a, 1) == message_fingerprint(b, 1)
+        assert message_fingerprint(a, 1) != message_fingerprint(a, 2)
+
+    def test_fingerprint_distinguishes_group_authors(self):
+        """测试群聊中不同成员发送相同内容的指纹不同"""
+        a = {"platform": "wechat", "sender": "项目群", "author": "张三", "content": "收到"}
+        b = {"platform": "wechat", "sender": "项目群", "author": "李四", "content": "收到"}
+        assert message_fingerprint(a, 1) != message_fingerprint(b, 1)
+        assert message_fingerprint(a, 1) == message_fingerprint(dict(a), 1)
+
+
+class TestBloomFilter:
+    """布隆过滤器测试"""
+
+    def test_membership(self):
+        """测试添加后可查到"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.001)
+        bloom.add("a")
+        assert "a" in bloom
+        assert "b" not in bloom
+
+    def test_rotation_forgets_old_entries(self):
+        """测试轮换两代后旧条目被遗忘"""
+        now = [0.0]
+        bloom = RotatingBloomFilter(1000, 0.001, rotate_seconds=10, clock=lambda: now[0])
+        bloom.add("a")
+        now[0] = 11
+        assert "a" in bloom
+        now[0] = 22
+        assert "a" not in bloom
+
+
+class TestMessageDeduplicator:
+    """消息去重器测试"""
+
+    def setup_method(self):
+        """初始化"""
+        self.redis = FakeRedis()
+        self.message = {
+            "platform": "wechat",
+            "sender": "test_user",
+            "content": "测试消息",
+            "timestamp": 1000.0,
+        }
+
+    def test_local_duplicate_skips_redis(self):
+        """测试本地重复不访问Redis"""
+        dedup = MessageDeduplicator(redis_client=self.redis)
+        assert dedup.is_duplicate(self.message) is False
+        assert dedup.is_duplicate(dict(self.message)) is True
+        assert dedup.stats["local_hits"] == 1
+        assert len(self.redis.store) == 1
+
+    def test_cross_process_duplicate(self):
+        """测试另一个进程已记录的消息被判重"""
+        first = MessageDeduplicator(redis_client=self.redis)
+        second = MessageDeduplicator(redis_client=self.redis)
+        assert first.is_duplicate(self.message) is False
+        assert second.is_duplicate(self.message) is True
+        assert second.stats["redis_hits"] == 1
+
+    def test_adjacent_bucket_is_duplicate(self):
+        """测试跨越时间桶边界仍判重"""
+        dedup = MessageDeduplicator(redis_client=self.redis, bucket_seconds=300)
+        assert dedup.is_duplicate({**self.message, "timestamp": 299.0}) is False
+        assert dedup.is_duplicate({**self.message, "timestamp": 301.0}) is True
+
+    def test_different_content_not_duplicate(self):
+        """测试不同内容不判重"""
+        dedup = MessageDeduplicator(redis_client=self.redis)
+        assert dedup.is_duplicate(self.message) is False
+        assert dedup.is_duplicate({**self.message, "content": "另一条"}) is False
+
+    def test_group_members_same_content_not_duplicate(self):
+        """测试同一群聊中两个成员发送相同内容都不被丢弃"""
+        dedup = MessageDeduplicator(redis_client=self.redis)
+        group = {**self.message, "sender": "项目群", "content": "好的"}
+        assert dedup.is_duplicate({**group, "author": "张三"}) is False
+        assert dedup.is_duplicate({**group, "author": "李四"}) is False
+        assert dedup.is_duplicate({**group, "author": "张三"}) is True
+
+    def test_redis_failure_fails_open(self):
+        """测试Redis故障时不丢消息"""
+        dedup = MessageDeduplicator(redis_client=BrokenRedis())
+        assert dedup.is_duplicate(self.message) is False
+        assert dedup.stats["redis_errors"] == 1
+        assert dedup.is_duplicate(self.message) is True
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestReplyDedupStore:
+    """回复去重记录测试"""
+
+    def setup_method(self):
+        self.clock = FakeClock()
+
+    def test_digest_is_stable_and_normalized(self):
+        """测试摘要稳定且忽略空白/全角差异"""
+        assert reply_digest("张三", "你好  世界") == reply_digest("张三", " 你好 世界")
+        assert reply_digest("张三", "ｈｉ") == reply_digest("张三", "hi")
+        assert reply_digest("张三", "你好") != reply_digest("李四", "你好")
+        assert len(reply_digest(None, "你好")) == 32
+
+    def test_replied_and_outgoing_are_separate(self):
+        """测试已回复和自己发出的消息分别记录"""
+        store = ReplyDedupStore(clock=self.clock)
+        store.mark_replied("张三", "在吗")
+        store.record_outgoing("张三", "收到，我是自动回复")
+
+        assert store.was_replied("张三", "在吗")
+        assert not store.was_replied("李四", "在吗")
+        assert store.is_own("张三", "收到，我是自动回复")
+        assert not store.is_own("张三", "在吗")
+        assert store.stats["replied_hits"] == 1
+        assert store.stats["outgoing_hits"] == 1
+
+    def test_entries_expire_after_window(self):
+        """测试条目过期"""
+        store = ReplyDedupStore(window_seconds=60, clock=self.clock)
+        store.mark_replied("张三", "在吗")
+        self.clock.now += 61
+        assert not store.was_replied("张三", "在吗")
+        assert len(store) == 0
+
+    def test_default_window_answers_later_repeat(self):
+        """测试默认窗口下，联系人过一段时间再发相同内容会再次回复"""
+        store = ReplyDedupStore(clock=self.clock)
+        store.mark_replied("张三", "在吗")
+        self.clock.now += 60
+        assert store.was_replied("张三", "在吗")
+        self.clock.now += 3600
+        assert not store.was_replied("张三", "在吗")
+
+    def test_size_is_bounded(self):
+        """测试条目数不超过上限"""
+        store = ReplyDedupStore(max_entries=3, clock=self.clock)
+        for i in range(10):
+            store.mark_replied("张三", f"消息{i}")
+        assert len(store) == 3
+        assert store.was_replied("张三", "消息9")
+        assert not store.was_replied("张三", "消息0")
+        assert store.stats["evicted"] == 7
+
+    def test_unmark_allows_retry(self):
+        """测试发送失败后撤销记录"""
+        store = ReplyDedupStore(clock=self.clock)
+        store.mark_replied("张三", "在吗")
+        store.unmark_replied("张三", "在吗")
+        assert not store.was_replied("张三", "在吗")
+
+    def test_persistence_round_trip(self, tmp_path):
+        """测试持久化后重新加载，过期条目不再加载"""
+        path = str(tmp_path / "dedup" / "reply.json")
+        store = ReplyDedupStore(window_seconds=100, path=path, clock=self.clock)
+        store.mark_replied("张三", "旧消息")
+        self.clock.now += 50
+        store.mark_replied("张三", "新消息")
+        store.record_outgoing("张三", "自动回复")
+        store.save()
+
+        self.clock.now += 60
+        reloaded = ReplyDedupStore(window_seconds=100, path=path, clock=self.clock)
+        assert reloaded.was_replied("张三", "新消息")
+        assert not reloaded.was_replied("张三", "旧消息")
+        assert reloaded.is_own("张三", "自动回复")
+
+    def test_maybe_save_is_throttled(self, tmp_path):
+        """测试 maybe_save 按间隔写文件"""
+        path = tmp_path / "reply.json"
+        store = ReplyDedupStore(path=str(path), save_interval=30, clock=self.clock)
+        store.mark_replied("张三", "在吗")
+        store.maybe_save()
+        assert not path.exists()
+        self.clock.now += 31
+        store.maybe_save()
+        assert path.exists()
+
+    def test_corrupt_file_starts_empty(self, tmp_path):
+        """测试持久化文件损坏时从空记录开始"""
+        path = tmp_path / "reply.json"
+        path.write_text("{not json", encoding="utf-8")
+        store = ReplyDedupStore(path=str(path), clock=self.clock)
+        assert len(store) == 0
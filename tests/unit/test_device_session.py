@@ -0,0 +1,218 @@
+"""
+设备会话测试
+"""
+import threading
+
+from implementations.wechat.device_session import DeviceSession, clear_sessions, get_session, with_session_lock
+from implementations.wechat.hierarchy import find_parent, node_bounds
+
+
+CHAT_LIST_XML = """<hierarchy>
+  <node resource-id="com.tencent.mm:id/cj1" bounds="[0,200][1080,400]">
+    <node resource-id="com.tencent.mm:id/kbq" text="张三" bounds="[200,220][600,280]" />
+    <node resource-id="com.tencent.mm:id/h8h" text="2" bounds="[120,210][160,250]" />
+  </node>
+</hierarchy>"""
+
+
+class FakeSelector:
+    def __init__(self, device):
+        self.device = device
+
+    @property
+    def exists(self):
+        self.device.rpc_calls += 1
+        return False
+
+
+class FakeDevice:
+    def __init__(self):
+        self.settings = {}
+        self.window_size_calls = 0
+        self.dumps = 0
+        self.rpc_calls = 0
+
+    def window_size(self):
+        self.window_size_calls += 1
+        return 1080, 2400
+
+    def dump_hierarchy(self):
+        self.dumps += 1
+        return CHAT_LIST_XML
+
+    def __call__(self, **selector):
+        return FakeSelector(self)
+
+    def click(self, x, y):
+        pass
+
+
+class FakeConnect:
+    """记录连接次数的假连接函数"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, serial=None):
+        self.calls.append(serial)
+        return FakeDevice()
+
+
+class Component:
+    """使用会话锁的组件"""
+
+    def __init__(self, session):
+        self.session = session
+        self.log = []
+
+    @with_session_lock
+    def operation(self, name, inner=None):
+        self.log.append(name)
+        if inner:
+            inner()
+
+
+class TestDeviceSession:
+    """设备会话测试"""
+
+    def setup_method(self):
+        self.connect = FakeConnect()
+        self.session = DeviceSession("emulator-5554", connect=self.connect)
+
+    def teardown_method(self):
+        clear_sessions()
+
+    def test_lazy_single_connection(self):
+        """测试首次使用时才连接且只连接一次"""
+        assert self.connect.calls == []
+
+        device = self.session.device
+        assert self.session.device is device
+        assert self.connect.calls == ["emulator-5554"]
+
+    def test_geometry_cached(self):
+        """测试屏幕尺寸只查询一次"""
+        assert self.session.window_size() == (1080, 2400)
+        assert (self.session.width, self.session.height) == (1080, 2400)
+        assert self.session.device.window_size_calls == 1
+
+        self.session.invalidate_geometry()
+        self.session.window_size()
+        assert self.session.device.window_size_calls == 2
+
+    def test_reconnect_resets_state(self):
+        """测试重新连接清空缓存和界面状态"""
+        old = self.session.device
+        self.session.set_ui_state("chat", "张三")
+
+        assert self.session.reconnect() is not old
+        assert self.session.current_chat is None
+        assert len(self.connect.calls) == 2
+
+    def test_registry_shares_sessions(self):
+        """测试同一序列号共享同一会话"""
+        assert get_session("a") is get_session("a")
+        assert get_session("a") is not get_session("b")
+
+    def test_lock_is_reentrant_and_exclusive(self):
+        """测试会话锁可重入，且跨线程互斥"""
+        first, second = Component(self.session), Component(self.session)
+        first.operation("outer", inner=lambda: second.operation("nested"))
+        assert first.log == ["outer"] and second.log == ["nested"]
+
+        entered, release = threading.Event(), threading.Event()
+        holder = threading.Thread(
+            target=first.operation, args=("hold",),
+            kwargs={"inner": lambda: (entered.set(), release.wait(5))},
+        )
+        holder.start()
+        entered.wait(5)
+        acquired = self.session.lock.acquire(blocking=False)
+        if acquired:
+            self.session.lock.release()
+        release.set()
+        holder.join(5)
+
+        assert not acquired
+
+
+class TestHierarchyCache:
+    """层级缓存测试"""
+
+    def setup_method(self):
+        self.now = 0.0
+        self.session = DeviceSession(connect=FakeConnect(), clock=lambda: self.now)
+        self.device = self.session.device
+
+    def test_reuses_recent_dump(self):
+        """测试有效期内复用dump结果，过期或fresh时重新dump"""
+        root = self.session.hierarchy()
+        assert self.session.hierarchy() is root
+        assert self.device.dumps == 1
+
+        self.session.hierarchy(fresh=True)
+        assert self.device.dumps == 2
+
+        self.now += 1.0
+        self.session.hierarchy()
+        assert self.device.dumps == 3
+
+    def test_selector_queries_answered_from_cache(self):
+        """测试缓存有效时 exists/count 不发RPC，缓存失效后退回RPC"""
+        self.session.hierarchy()
+
+        assert self.device(resourceId="com.tencent.mm:id/h8h").exists
+        assert not self.device(text="李四").exists
+        assert self.device(resourceId="com.tencent.mm:id/kbq").count == 1
+        assert self.device.rpc_calls == 0
+
+        self.device.click(10, 10)
+        assert not self.device(text="李四").exists
+        assert self.device.rpc_calls == 1
+
+    def test_gesture_invalidates(self):
+        """测试手势使缓存失效"""
+        self.session.hierarchy()
+        self.device.click(540, 300)
+        self.session.hierarchy()
+        assert self.device.dumps == 2
+        assert self.session.hierarchy_stats["invalidations"] == 1
+
+    def test_shell_input_invalidates_and_is_timed(self, monkeypatch):
+        """测试通过持久化shell发送的输入命令使缓存失效并计入RPC统计"""
+        from implementations.wechat import device_session
+        from implementations.wechat.adb_shell import ShellResult
+        from implementations.wechat.instrumentation import get_rpc_stats, operation
+
+        class FakeShell:
+            def __init__(self):
+                self.batches = []
+
+            def run_batch(self, commands, timeout=10.0):
+                self.batches.append(commands)
+                return [ShellResult(c, "", 0, 0.0) for c in commands]
+
+        shell = FakeShell()
+        monkeypatch.setattr(device_session, "get_adb_shell", lambda serial=None: shell)
+        get_rpc_stats().reset()
+
+        self.session.hierarchy()
+        with operation("unlock"):
+            results = self.session.shell_input(["input keyevent 26", "input swipe 540 2000 540 500"])
+        assert [r.ok for r in results] == [True, True]
+        assert shell.batches == [["input keyevent 26", "input swipe 540 2000 540 500"]]
+
+        self.session.hierarchy()
+        assert self.device.dumps == 2
+        assert get_rpc_stats().snapshot()["unlock"]["rpcs"]["shell.input"]["count"] == 1
+
+    def test_unsupported_selector_falls_back(self):
+        """测试本地无法匹配的selector走RPC"""
+        self.session.hierarchy()
+        assert not self.device(focused=True).exists
+        assert self.device.rpc_calls == 1
+
+    def test_red_dot_row_lookup(self):
+        """测试从缓存的树上定位红点所在的聊天项"""
+        row = find_parent(self.session.hierarchy(), resourceId="com.tencent.mm:id/h8h")
+        assert node_bounds(row).center == (540, 300)
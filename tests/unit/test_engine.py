@@ -0,0 +1,117 @@
+"""
+进程内异步引擎测试
+"""
+import asyncio
+import pytest
+from core.engine import AsyncEngine, FileJournal
+from core.polling import AdaptivePollScheduler
+from core.processor import MessageProcessor
+from skills.echo_skill import EchoSkill
+
+
+class FakePlatform:
+    """模拟平台：记录发送的消息"""
+
+    def __init__(self, batches=None):
+        self.batches = list(batches or [])
+        self.sent = []
+
+    def get_unread_messages(self):
+        return self.batches.pop(0) if self.batches else []
+
+    def send_message(self, receiver, content):
+        self.sent.append((receiver, content))
+        return True
+
+
+def make_processor():
+    processor = MessageProcessor()
+    processor.register_skill(EchoSkill())
+    return processor
+
+
+def echo_message(i):
+    return {"platform": "wechat", "sender": f"user{i}", "content": f"echo {i}", "type": "text"}
+
+
+async def run_until_drained(engine, messages):
+    task = asyncio.create_task(engine.run(listen=False))
+    await asyncio.sleep(0)
+    for message in messages:
+        await engine.submit(message)
+    engine.stop()
+    await asyncio.wait_for(task, timeout=5)
+
+
+class TestAsyncEngine:
+    """异步引擎测试"""
+
+    @pytest.mark.asyncio
+    async def test_messages_flow_to_sender(self):
+        """测试消息经过技能处理后由发送阶段发出"""
+        platform = FakePlatform()
+        engine = AsyncEngine(platform, make_processor(), queue_size=2, workers=2)
+
+        await run_until_drained(engine, [echo_message(i) for i in range(5)])
+
+        assert sorted(r for r, _ in platform.sent) == [f"user{i}" for i in range(5)]
+        assert engine.stats["processed"] == 5
+        assert engine.stats["sent"] == 5
+
+    @pytest.mark.asyncio
+    async def test_listener_polls_platform(self):
+        """测试监听阶段从平台拉取消息"""
+        platform = FakePlatform(batches=[[echo_message(1), echo_message(2)]])
+        scheduler = AdaptivePollScheduler(min_interval=0.01, max_interval=0.01)
+        engine = AsyncEngine(platform, make_processor(), scheduler=scheduler)
+
+        task = asyncio.create_task(engine.run())
+        for _ in range(100):
+            if len(platform.sent) == 2:
+                break
+            await asyncio.sleep(0.01)
+        engine.stop()
+        await asyncio.wait_for(task, timeout=5)
+
+        assert len(platform.sent) == 2
+
+    @pytest.mark.asyncio
+    async def test_file_journal_spills_and_acks(self, tmp_path):
+        """测试队列满时溢出到日志，处理完后全部确认"""
+        path = str(tmp_path / "journal.jsonl")
+        platform = FakePlatform()
+        engine = AsyncEngine(platform, make_processor(), journal=FileJournal(path), queue_size=1, workers=1)
+
+        await run_until_drained(engine, [echo_message(i) for i in range(4)])
+
+        assert engine.stats["spilled"] > 0
+        assert len(platform.sent) == 4
+        assert len(FileJournal(path)) == 0
+
+
+class TestFileJournal:
+    """持久化日志测试"""
+
+    def test_replay_unacked(self, tmp_path):
+        """测试重启后只重放未确认的消息"""
+        path = str(tmp_path / "journal.jsonl")
+        journal = FileJournal(path)
+        journal.append("a", {"content": "1"})
+        journal.append("b", {"content": "2"})
+        journal.ack("a")
+        journal.close()
+
+        reopened = FileJournal(path)
+        assert reopened.pending(10, set()) == [("b", {"content": "2"})]
+
+    def test_compaction_keeps_pending(self, tmp_path):
+        """测试压缩后未确认消息仍可读取"""
+        path = str(tmp_path / "journal.jsonl")
+        journal = FileJournal(path, compact_threshold=2)
+        for key in "abc":
+            journal.append(key, {"content": key})
+        journal.ack("a")
+        journal.ack("b")
+
+        assert journal.pending(10, set()) == [("c", {"content": "c"})]
+        assert len(FileJournal(path)) == 1
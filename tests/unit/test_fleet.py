@@ -0,0 +1,117 @@
+"""
+设备集群监管测试
+"""
+from core.fleet import FleetSupervisor
+
+
+class FakeProcess:
+    """模拟worker进程"""
+
+    def __init__(self):
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+    def crash(self, code=1):
+        self.alive = False
+        self.exitcode = code
+
+    def terminate(self):
+        self.crash(-15)
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeSupervisor(FleetSupervisor):
+    """用模拟进程替代真实进程"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spawned = []
+
+    def _spawn(self, worker):
+        process = FakeProcess()
+        self.spawned.append((worker.serial, process))
+        return process
+
+
+class TestFleetSupervisor:
+    """集群监管器测试"""
+
+    def setup_method(self):
+        """初始化"""
+        self.supervisor = FakeSupervisor(
+            ["dev1", "dev2"], base_backoff=5, max_backoff=40, stable_after=100
+        )
+
+    def test_starts_one_worker_per_device(self):
+        """测试每台设备启动一个worker"""
+        self.supervisor.check_workers(now=0)
+
+        assert sorted(serial for serial, _ in self.supervisor.spawned) == ["dev1", "dev2"]
+        assert all(w.state == "running" for w in self.supervisor.workers.values())
+
+    def test_backoff_delay_caps(self):
+        """测试退避时间指数增长并封顶"""
+        delays = [self.supervisor.backoff_delay(n) for n in range(1, 6)]
+        assert delays == [5, 10, 20, 40, 40]
+
+    def test_crashed_worker_restarts_after_backoff(self):
+        """测试崩溃的worker在退避后重启"""
+        self.supervisor.check_workers(now=0)
+        worker = self.supervisor.workers["dev1"]
+        worker.process.crash()
+
+        self.supervisor.check_workers(now=10)
+        assert worker.state == "backoff"
+        assert worker.next_start_at == 15
+
+        self.supervisor.check_workers(now=12)
+        assert worker.state == "backoff"
+
+        self.supervisor.check_workers(now=15)
+        assert worker.state == "running"
+        assert worker.restarts == 1
+        assert len(self.supervisor.spawned) == 3
+
+    def test_stable_worker_resets_backoff(self):
+        """测试稳定运行后崩溃不累积退避"""
+        self.supervisor.check_workers(now=0)
+        worker = self.supervisor.workers["dev1"]
+
+        worker.process.crash()
+        self.supervisor.check_workers(now=1)
+        self.supervisor.check_workers(now=6)
+        worker.process.crash()
+        self.supervisor.check_workers(now=7)
+        assert worker.consecutive_failures == 2
+
+        self.supervisor.check_workers(now=17)
+        worker.process.crash()
+        self.supervisor.check_workers(now=500)
+        assert worker.consecutive_failures == 1
+
+    def test_status_aggregates_reports(self):
+        """测试汇总各设备上报的统计"""
+        self.supervisor.check_workers(now=0)
+        for serial, messages in (("dev1", 3), ("dev2", 5)):
+            worker = self.supervisor.workers[serial]
+            worker.last_report = {"scans": 10, "messages": messages, "dispatched": messages, "errors": 0}
+            worker.last_report_at = 50
+
+        status = self.supervisor.status(now=60)
+
+        assert status["totals"]["messages"] == 8
+        assert status["totals"]["healthy"] == 2
+        assert status["devices"]["dev1"]["messages_per_min"] == 3.0
+
+    def test_silent_worker_is_unhealthy(self):
+        """测试长时间未上报的worker标记为不健康"""
+        self.supervisor.check_workers(now=0)
+
+        status = self.supervisor.status(now=10)
+
+        assert status["totals"]["healthy"] == 0
@@ -0,0 +1,71 @@
+"""
+共享内存帧环形缓冲测试
+"""
+import numpy as np
+import pytest
+
+from implementations.wechat.vision import FrameGrabber, SharedFrameRing
+
+
+def frame(value, shape=(40, 30, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+class TestSharedFrameRing:
+    """环形缓冲测试"""
+
+    def setup_method(self):
+        self.ring = SharedFrameRing(slots=3, max_shape=(40, 30, 3))
+        self.reader = SharedFrameRing.attach(self.ring.spec())
+
+    def teardown_method(self):
+        self.reader.close()
+        self.ring.close()
+
+    def test_reader_sees_frames_without_copy(self):
+        """测试读取方得到指向共享内存的只读视图"""
+        seq = self.ring.write(frame(7))
+        view = self.reader.get(seq)
+
+        assert seq == 1 and self.reader.latest_seq == 1
+        assert view.shape == (40, 30, 3) and int(view[0, 0, 0]) == 7
+        assert not view.flags.writeable
+        assert view.base is not None
+
+    def test_smaller_frames_and_grayscale(self):
+        """测试小于槽位的帧和单通道帧"""
+        seq = self.ring.write(np.full((10, 5), 3, dtype=np.uint8))
+        assert self.reader.get(seq).shape == (10, 5)
+
+    def test_overwritten_slot_detected(self):
+        """测试槽位被新帧覆盖后读取方能发现"""
+        first = self.ring.write(frame(1))
+        view = self.reader.get(first)
+        for value in (2, 3, 4):
+            self.ring.write(frame(value))
+
+        assert not self.reader.still_valid(first)
+        assert int(view[0, 0, 0]) == 4  # 视图已被覆盖，结果必须丢弃
+        assert self.reader.get(first) is None
+        assert self.reader.copy(4)[0, 0, 0] == 4
+
+    def test_oversized_frame_rejected(self):
+        """测试超过槽位容量的帧被拒绝"""
+        with pytest.raises(ValueError):
+            self.ring.write(frame(1, shape=(80, 30, 3)))
+
+
+class TestGrabberPublishing:
+    """截图发布到环形缓冲测试"""
+
+    def test_grab_publishes_to_ring(self):
+        """测试设置ring后每帧同时写入共享内存"""
+
+        class FakeDevice:
+            def screenshot(self):
+                return frame(9)
+
+        with SharedFrameRing(slots=2, max_shape=(40, 30, 3)) as ring:
+            grabbed = FrameGrabber(FakeDevice(), ring=ring).grab()
+            assert grabbed.ring_seq == 1
+            assert np.array_equal(ring.get(grabbed.ring_seq), grabbed.pixels)
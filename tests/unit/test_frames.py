@@ -0,0 +1,58 @@
+"""
+内存帧获取测试
+"""
+import numpy as np
+from PIL import Image
+
+from implementations.wechat.vision import Frame, FrameGrabber, to_array
+
+
+class FakeDevice:
+    def __init__(self):
+        self.calls = 0
+
+    def screenshot(self):
+        self.calls += 1
+        image = Image.new("RGB", (100, 200), (255, 255, 255))
+        image.putpixel((10, 150), (255, 0, 0))
+        return image
+
+
+class TestFrameGrabber:
+    """帧获取测试"""
+
+    def setup_method(self):
+        self.device = FakeDevice()
+        self.grabber = FrameGrabber(self.device, clock=lambda: 1.0)
+
+    def test_grab_returns_rgb_array(self):
+        """测试截图转为内存中的RGB数组且帧序号递增"""
+        first = self.grabber.grab()
+        second = self.grabber.grab()
+
+        assert first.pixels.shape == (200, 100, 3)
+        assert first.pixels.dtype == np.uint8
+        assert (first.seq, second.seq) == (1, 2)
+        assert self.grabber.last is second
+        assert self.grabber.stats["frames"] == 2
+
+    def test_crops_are_views(self):
+        """测试裁剪不复制像素"""
+        frame = self.grabber.grab()
+        band = frame.band(0.5, 1.0)
+
+        assert band.shape == (100, 100, 3)
+        assert np.shares_memory(band, frame.pixels)
+        assert tuple(band[50, 10]) == (255, 0, 0)
+        assert np.shares_memory(frame.region((0.0, 0.5, 0.5, 1.0)), frame.pixels)
+
+    def test_to_image_roundtrip(self):
+        """测试视图可转回PIL图像"""
+        frame = self.grabber.grab()
+        image = Frame.to_image(frame.crop(0, 140, 50, 160))
+        assert image.size == (50, 20)
+        assert image.getpixel((10, 10)) == (255, 0, 0)
+
+    def test_to_array_converts_mode(self):
+        """测试非RGB图像先转换"""
+        assert to_array(Image.new("L", (4, 3))).shape == (3, 4, 3)
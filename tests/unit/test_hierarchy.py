@@ -0,0 +1,167 @@
+"""
+UI层级解析测试
+"""
+from implementations.wechat.hierarchy import (
+    Bounds,
+    ChatCursor,
+    find_all,
+    find_first,
+    parse_bounds,
+    parse_chat_list,
+    parse_chat_messages,
+    parse_hierarchy,
+)
+from implementations.wechat.wechat_platform import WeChatPlatform
+
+
+def chat_row(name, message, bounds, unread=None):
+    red_dot = (
+        f'<node resource-id="com.tencent.mm:id/e64" text="{unread}" bounds="[150,{bounds[1]}][190,{bounds[1] + 40}]" />'
+        if unread is not None else ""
+    )
+    return (
+        f'<node resource-id="com.tencent.mm:id/al_" class="android.widget.LinearLayout" '
+        f'bounds="[0,{bounds[0]}][1080,{bounds[1]}]">'
+        f'<node resource-id="com.tencent.mm:id/dyh" text="{name}" bounds="[200,{bounds[0]}][800,{bounds[0] + 60}]" />'
+        f'<node resource-id="com.tencent.mm:id/e62" text="{message}" bounds="[200,{bounds[0] + 60}][900,{bounds[1]}]" />'
+        f"{red_dot}</node>"
+    )
+
+
+CHAT_LIST_XML = (
+    "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"
+    '<hierarchy rotation="0">'
+    '<node resource-id="com.tencent.mm:id/e5u" class="android.widget.ListView" bounds="[0,200][1080,2200]">'
+    + chat_row("张三", "在吗", (200, 400), unread="2")
+    + chat_row("文件传输助手", "[图片]", (400, 600))
+    + chat_row("李四", "好的", (600, 800), unread="")
+    + "</node>"
+    '<node resource-id="" text="微信" class="android.widget.TextView" bounds="[0,2200][270,2300]" />'
+    "</hierarchy>"
+)
+
+
+class TestParseHelpers:
+    """基础解析测试"""
+
+    def test_parse_bounds(self):
+        """测试bounds解析"""
+        bounds = parse_bounds("[0,200][1080,400]")
+        assert bounds == Bounds(0, 200, 1080, 400)
+        assert bounds.center == (540, 300)
+        assert parse_bounds("") is None
+
+    def test_selector_lookup(self):
+        """测试selector查找"""
+        root = parse_hierarchy(CHAT_LIST_XML)
+
+        assert len(find_all(root, resourceId="com.tencent.mm:id/dyh")) == 3
+        assert find_first(root, text="微信") is not None
+        assert find_first(root, textContains="传输").get("text") == "文件传输助手"
+        assert find_first(root, text="不存在") is None
+
+
+class TestParseChatList:
+    """聊天列表解析测试"""
+
+    def test_rows_and_unread_markers(self):
+        """测试解析聊天行和未读标记"""
+        rows = parse_chat_list(parse_hierarchy(CHAT_LIST_XML), WeChatPlatform.SELECTORS)
+
+        assert [r.name for r in rows] == ["张三", "文件传输助手", "李四"]
+        assert [r.unread for r in rows] == [True, False, True]
+        assert [r.unread_count for r in rows] == [2, 0, 1]
+        assert rows[0].latest_message == "在吗"
+        assert rows[0].bounds.center == (540, 300)
+
+    def test_missing_chat_list(self):
+        """测试不在聊天列表页面时返回空"""
+        xml = '<hierarchy><node resource-id="com.tencent.mm:id/aks" text="" /></hierarchy>'
+        assert parse_chat_list(parse_hierarchy(xml), WeChatPlatform.SELECTORS) == []
+
+
+def bubble_row(top, content, avatar="张三头像", is_self=False, image=False):
+    avatar_x = (960, 1060) if is_self else (20, 120)
+    body = (
+        f'<node resource-id="com.tencent.mm:id/b4e" bounds="[150,{top}][500,{top + 300}]" />'
+        if image else
+        f'<node resource-id="com.tencent.mm:id/b4b" text="{content}" bounds="[150,{top}][900,{top + 100}]" />'
+    )
+    return (
+        f'<node resource-id="com.tencent.mm:id/b4r" bounds="[0,{top}][1080,{top + 120}]">'
+        f'<node resource-id="com.tencent.mm:id/au2" content-desc="{avatar}" '
+        f'bounds="[{avatar_x[0]},{top}][{avatar_x[1]},{top + 100}]" />'
+        f"{body}</node>"
+    )
+
+
+def chat_window(*rows):
+    return (
+        '<hierarchy rotation="0">'
+        '<node resource-id="com.tencent.mm:id/ko4" text="张三" bounds="[200,80][880,160]" />'
+        '<node resource-id="com.tencent.mm:id/b79" bounds="[0,200][1080,2000]">'
+        '<node resource-id="com.tencent.mm:id/b4r" bounds="[0,200][1080,260]">'
+        '<node text="昨天 21:30" bounds="[400,200][680,260]" /></node>'
+        + "".join(bubble_row(300 + i * 150, *row) for i, row in enumerate(rows))
+        + "</node></hierarchy>"
+    )
+
+
+def parse_window(*rows):
+    return parse_chat_messages(parse_hierarchy(chat_window(*rows)), WeChatPlatform.SELECTORS, 1080)
+
+
+class TestParseChatMessages:
+    """聊天窗口气泡解析测试"""
+
+    def test_bubbles(self):
+        """测试解析发送者、内容、类型和方向"""
+        bubbles = parse_window(
+            ("你好",),
+            ("在的", "我头像", True),
+            ("", "张三头像", False, True),
+            ("12&quot;",),
+        )
+
+        assert [b.content for b in bubbles] == ["你好", "在的", "[图片]", '12"']
+        assert [b.type for b in bubbles] == ["text", "text", "image", "voice"]
+        assert [b.is_self for b in bubbles] == [False, True, False, False]
+        assert bubbles[0].sender == "张三"
+        assert bubbles[1].sender == "self"
+
+    def test_not_in_chat_window(self):
+        """测试不在聊天窗口时返回空"""
+        assert parse_chat_messages(parse_hierarchy(CHAT_LIST_XML), WeChatPlatform.SELECTORS) == []
+
+
+class TestChatCursor:
+    """会话已读位置测试"""
+
+    def test_first_visit_takes_unread_tail(self):
+        """测试首次访问只取最后几条"""
+        cursor = ChatCursor()
+        new = cursor.advance(parse_window(("a",), ("b",), ("c",)), unknown_limit=2)
+        assert [b.content for b in new] == ["b", "c"]
+
+    def test_only_new_messages_after_cursor(self):
+        """测试再次访问只返回新消息，滚动后依然正确"""
+        cursor = ChatCursor()
+        cursor.advance(parse_window(("a",), ("b",), ("c",)))
+
+        # 新消息把旧消息顶出屏幕
+        new = cursor.advance(parse_window(("c",), ("d",), ("e",)))
+        assert [b.content for b in new] == ["d", "e"]
+
+        assert cursor.advance(parse_window(("c",), ("d",), ("e",))) == []
+
+    def test_repeated_content(self):
+        """测试内容重复导致位置有歧义时用未读数选择"""
+        cursor = ChatCursor()
+        cursor.advance(parse_window(("好的",), ("收到",)))
+        window = parse_window(("好的",), ("收到",), ("好的",), ("收到",))
+
+        new = cursor.advance(window, expected_new=2)
+        assert [b.content for b in new] == ["好的", "收到"]
+
+        # 没有未读数提示时取最靠下的位置（不重复处理）
+        assert cursor.advance(window) == []
@@ -0,0 +1,130 @@
+"""
+设备RPC埋点测试
+"""
+from implementations.wechat.instrumentation import (
+    Histogram,
+    InstrumentedDevice,
+    RpcStats,
+    operation,
+)
+
+
+class FakeExists:
+    def __init__(self, value):
+        self.value = value
+
+    def __bool__(self):
+        return self.value
+
+    def __call__(self, timeout=0):
+        return self.value
+
+
+class FakeSelector:
+    def __init__(self, selector):
+        self.selector = selector
+        self.count = 2
+
+    @property
+    def exists(self):
+        return FakeExists(self.selector.get("text") == "发送")
+
+    def click(self):
+        return "clicked"
+
+    def child(self, **selector):
+        return FakeSelector(selector)
+
+    def sibling(self, **selector):
+        return FakeSelector(selector)
+
+
+class FakeObserver:
+    """记录手势通知的观察者"""
+
+    def __init__(self):
+        self.gestures = 0
+
+    def on_gesture(self):
+        self.gestures += 1
+
+    def cached_find(self, selector):
+        return None
+
+
+class FakeDevice:
+    def __init__(self):
+        self.settings = {}
+
+    def __call__(self, **selector):
+        return FakeSelector(selector)
+
+    def click(self, x, y):
+        return (x, y)
+
+    def dump_hierarchy(self):
+        return "<hierarchy/>"
+
+
+class TestInstrumentedDevice:
+    """RPC计时与操作归属测试"""
+
+    def setup_method(self):
+        self.stats = RpcStats()
+        self.device = InstrumentedDevice(FakeDevice(), self.stats)
+
+    def test_transparent_results(self):
+        """测试包装后行为不变"""
+        assert self.device.click(1, 2) == (1, 2)
+        assert self.device(text="发送").click() == "clicked"
+        assert bool(self.device(text="发送").exists) is True
+        assert self.device(text="取消").exists(timeout=1) is False
+        assert self.device(text="发送").count == 2
+        self.device.settings["operation_delay"] = (0, 0)
+        assert self.device.raw.settings == {"operation_delay": (0, 0)}
+
+    def test_attribution_to_innermost_operation(self):
+        """测试RPC归属到最内层操作"""
+        with operation("send", self.stats):
+            self.device.dump_hierarchy()
+            with operation("search", self.stats):
+                self.device.click(1, 1)
+                bool(self.device(text="发送").exists)
+        self.device.click(0, 0)
+
+        snapshot = self.stats.snapshot()
+        assert set(snapshot["send"]["rpcs"]) == {"dump_hierarchy"}
+        assert set(snapshot["search"]["rpcs"]) == {"click", "selector.exists"}
+        assert snapshot["other"]["rpcs"]["click"]["count"] == 1
+        assert snapshot["send"]["duration"]["count"] == 1
+        assert self.stats.top(1)[0][2] == 1
+
+    def test_child_and_sibling_are_wrapped(self):
+        """测试 child/sibling 返回的元素上的点击同样计时并通知观察者"""
+        observer = FakeObserver()
+        device = InstrumentedDevice(FakeDevice(), self.stats, observer=observer)
+        with operation("open_chat"):
+            assert device(text="列表").child(text="张三").click() == "clicked"
+            assert device(text="张三").sibling(text="发送").exists
+
+        rpcs = self.stats.snapshot()["open_chat"]["rpcs"]
+        assert rpcs["selector.child"]["count"] == 1
+        assert rpcs["selector.click"]["count"] == 1
+        assert rpcs["selector.exists"]["count"] == 1
+        assert observer.gestures == 2
+
+
+class TestHistogram:
+    """直方图测试"""
+
+    def test_buckets_and_quantiles(self):
+        """测试分桶与分位数"""
+        histogram = Histogram()
+        for seconds in [0.003, 0.004, 0.02, 0.3, 12]:
+            histogram.observe(seconds)
+
+        data = histogram.to_dict()
+        assert data["count"] == 5
+        assert data["buckets"] == {"<=5ms": 2, "<=25ms": 1, "<=500ms": 1, ">10000ms": 1}
+        assert data["p50"] == 0.025
+        assert data["max"] == 12
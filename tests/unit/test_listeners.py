@@ -0,0 +1,78 @@
+"""
+消息监听循环测试（通知驱动模式）
+"""
+from core import listeners
+from implementations.wechat.notification_source import NotificationWatcher, NotificationFeed
+
+
+NOTIFICATION = "\n".join([
+    "  Notification List:",
+    "    NotificationRecord(0x0abc: pkg=com.tencent.mm user=UserHandle{0} id=1 tag=null importance=4 "
+    "key=0|com.tencent.mm|1|null|10234: Notification(channel=message))",
+    "      mUpdateTimeMs={when}",
+    "      extras={",
+    "        android.title=String (张三)",
+    "        android.text=String (你好)",
+    "      }",
+])
+
+
+class FakePlatform:
+    """记录扫描和退到后台；只有微信在后台时才会收到通知"""
+
+    def __init__(self, scans=2):
+        self.events = []
+        self.foreground = True
+        self.scans = scans
+
+    def get_unread_messages(self):
+        if len(self.events) >= self.scans * 2:
+            raise KeyboardInterrupt
+        self.foreground = True
+        self.events.append("scan")
+        return []
+
+    def send_to_background(self):
+        self.foreground = False
+        self.events.append("background")
+
+    def disconnect(self):
+        self.events.append("disconnect")
+
+
+class ForegroundAwareFeed(NotificationFeed):
+    """微信在前台时通知栏为空，退到后台后出现新消息的通知"""
+
+    def __init__(self, platform):
+        self.platform = platform
+
+    def read_dump(self):
+        if self.platform.foreground:
+            return ""
+        # 每次退到后台后都有一条新消息（通知更新时间变化）
+        return NOTIFICATION.replace("{when}", str(self.platform.events.count("background")))
+
+
+class TestNotificationListener:
+    """通知驱动的监听循环测试"""
+
+    def test_scan_background_notification_cycle(self, monkeypatch):
+        """测试每次扫描后微信退到后台，之后的通知触发下一次扫描"""
+        platform = FakePlatform()
+        watchers = []
+
+        def create_watcher(device_serial, poll_interval):
+            watcher = NotificationWatcher(ForegroundAwareFeed(platform), poll_interval=0, sleep=lambda s: None)
+            watchers.append(watcher)
+            return watcher
+
+        monkeypatch.setattr(listeners, "initialize_platform", lambda serial: platform)
+        monkeypatch.setattr(listeners, "create_notification_watcher", create_watcher)
+        monkeypatch.setattr(listeners.settings, "message_source", "notification")
+        monkeypatch.setattr(listeners.settings, "dedup_enabled", False)
+
+        listeners.run_wechat_listener("emulator-5554")
+
+        assert platform.events == ["scan", "background", "scan", "background", "disconnect"]
+        # 启动时读取的快照作为基准，每次退到后台后读到通知即返回，没有等到兜底超时
+        assert watchers[0].stats["events"] == 2
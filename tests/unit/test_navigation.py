@@ -0,0 +1,118 @@
+"""
+界面导航测试
+"""
+import pytest
+
+from implementations.wechat.navigation import Navigator, Screen, plan_path
+from implementations.wechat.wechat_platform import WeChatPlatform
+
+
+SCREENS = {
+    Screen.CHAT_LIST: ("com.tencent.mm", ".ui.LauncherUI",
+                       '<node resource-id="com.tencent.mm:id/e5u" bounds="[0,200][1080,2000]" />'
+                       '<node resource-id="com.tencent.mm:id/cn1" bounds="[900,80][1000,160]" />'),
+    Screen.OTHER_TAB: ("com.tencent.mm", ".ui.LauncherUI",
+                       '<node text="微信" bounds="[0,2200][270,2300]" />'),
+    Screen.CHAT: ("com.tencent.mm", ".ui.chatting.ChattingUI",
+                  '<node resource-id="com.tencent.mm:id/ko4" text="张三" />'
+                  '<node resource-id="com.tencent.mm:id/aks" />'),
+    Screen.SEARCH: ("com.tencent.mm", ".plugin.fts.ui.FTSMainUI",
+                    '<node resource-id="com.tencent.mm:id/bhn" />'),
+    Screen.UNKNOWN: ("com.tencent.mm", ".plugin.sns.ui.SnsTimeLineUI", "<node />"),
+    Screen.NOT_RUNNING: ("com.android.launcher", ".Launcher", "<node />"),
+}
+
+
+class FakeDevice:
+    """按动作切换页面的假设备"""
+
+    def __init__(self, screen, back_stack=None):
+        self.screen = screen
+        self.back_stack = list(back_stack or [])
+        self.actions = []
+
+    def app_current(self):
+        package, activity, _ = SCREENS[self.screen]
+        return {"package": package, "activity": activity}
+
+    def dump_hierarchy(self):
+        return f"<hierarchy>{SCREENS[self.screen][2]}</hierarchy>"
+
+    def press(self, key):
+        self.actions.append(key)
+        self.screen = self.back_stack.pop() if self.back_stack else Screen.CHAT_LIST
+
+    def click(self, x, y):
+        self.actions.append("click")
+        self.screen = Screen.SEARCH if self.screen == Screen.CHAT_LIST else Screen.CHAT_LIST
+
+    def app_start(self, package):
+        self.actions.append("launch")
+        self.screen = Screen.CHAT_LIST
+
+
+def make_navigator(device, **kwargs):
+    now = [0.0]
+    return Navigator(
+        device,
+        WeChatPlatform.SELECTORS,
+        sleep=lambda s: now.__setitem__(0, now[0] + s),
+        clock=lambda: now[0],
+        **kwargs,
+    )
+
+
+class TestPlanPath:
+    """路径规划测试"""
+
+    def test_shortest_paths(self):
+        """测试最短动作序列"""
+        assert plan_path(Screen.CHAT_LIST, Screen.CHAT_LIST) == []
+        assert plan_path(Screen.CHAT, Screen.CHAT_LIST) == ["back"]
+        assert plan_path(Screen.CHAT, Screen.SEARCH) == ["back", "search"]
+        assert plan_path(Screen.NOT_RUNNING, Screen.SEARCH) == ["launch", "search"]
+        assert plan_path(Screen.CHAT_LIST, Screen.CHAT) is None
+
+
+class TestNavigator:
+    """导航执行测试"""
+
+    def test_detect_screens(self):
+        """测试页面识别"""
+        for screen in SCREENS:
+            assert make_navigator(FakeDevice(screen)).detect().screen == screen
+
+        state = make_navigator(FakeDevice(Screen.CHAT)).detect()
+        assert state.chat_title == "张三"
+
+    def test_already_there_does_nothing(self):
+        """测试已在目标页面时不做任何操作"""
+        device = FakeDevice(Screen.CHAT_LIST)
+        navigator = make_navigator(device)
+
+        assert navigator.go_to(Screen.CHAT_LIST).screen == Screen.CHAT_LIST
+        assert device.actions == []
+        assert navigator.stats["skipped"] == 1
+
+    def test_closed_loop_through_unexpected_pages(self):
+        """测试返回后落在意外页面时继续收敛"""
+        device = FakeDevice(Screen.UNKNOWN, back_stack=[Screen.OTHER_TAB, Screen.UNKNOWN])
+        navigator = make_navigator(device)
+
+        assert navigator.go_to(Screen.SEARCH).screen == Screen.SEARCH
+        assert device.actions == ["back", "back", "click", "click"]
+
+    def test_launch_when_not_running(self):
+        """测试微信不在前台时启动"""
+        device = FakeDevice(Screen.NOT_RUNNING)
+        make_navigator(device).go_to(Screen.CHAT_LIST)
+        assert device.actions == ["launch"]
+
+    def test_gives_up_after_max_steps(self):
+        """测试无法到达时报错"""
+        device = FakeDevice(Screen.UNKNOWN, back_stack=[Screen.UNKNOWN] * 20)
+        navigator = make_navigator(device, max_steps=3)
+
+        with pytest.raises(RuntimeError):
+            navigator.go_to(Screen.CHAT_LIST)
+        assert navigator.stats["failures"] == 1
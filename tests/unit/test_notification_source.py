@@ -0,0 +1,116 @@
+"""
+通知驱动消息检测测试
+"""
+from implementations.wechat.notification_source import (
+    AdbNotificationFeed,
+    FakeNotificationFeed,
+    NotificationWatcher,
+    parse_notifications,
+)
+
+
+def make_dump(*records):
+    """构造 dumpsys notification 输出"""
+    lines = ["Current Notification Manager state:", "  Notification List:"]
+    for pkg, key, title, text, when in records:
+        lines += [
+            f"    NotificationRecord(0x0abc: pkg={pkg} user=UserHandle{{0}} id=1 tag=null importance=4 key={key}: Notification(channel=message))",
+            "      uid=10234 userId=0",
+            f"      mUpdateTimeMs={when}",
+            "      extras={",
+            f"        android.title=String ({title})",
+            f"        android.text=String ({text})",
+            "      }",
+        ]
+    return "\n".join(lines)
+
+
+WECHAT_A = ("com.tencent.mm", "0|com.tencent.mm|1|null|10234", "张三", "你好", 1000)
+WECHAT_A_UPDATED = ("com.tencent.mm", "0|com.tencent.mm|1|null|10234", "张三", "[2条]张三: 在吗", 2000)
+OTHER_APP = ("com.android.systemui", "0|com.android.systemui|5|null|1000", "USB", "充电中", 1000)
+
+
+class TestParseNotifications:
+    """通知解析测试"""
+
+    def test_only_wechat_records(self):
+        """测试只保留微信通知"""
+        notifications = parse_notifications(make_dump(WECHAT_A, OTHER_APP))
+
+        assert list(notifications) == ["0|com.tencent.mm|1|null|10234"]
+        event = notifications["0|com.tencent.mm|1|null|10234"]
+        assert event.title == "张三"
+        assert event.text == "你好"
+        assert event.when == 1000
+
+    def test_empty_dump(self):
+        """测试没有通知"""
+        assert parse_notifications("") == {}
+
+
+class TestNotificationWatcher:
+    """通知监视器测试"""
+
+    def test_reports_only_deltas(self):
+        """测试只报告新增或更新的通知"""
+        feed = FakeNotificationFeed([
+            make_dump(),
+            make_dump(WECHAT_A),
+            make_dump(WECHAT_A),
+            make_dump(WECHAT_A_UPDATED),
+            make_dump(),
+        ])
+        watcher = NotificationWatcher(feed)
+
+        assert watcher.check() == []
+        assert [e.text for e in watcher.check()] == ["你好"]
+        assert watcher.check() == []
+        assert [e.text for e in watcher.check()] == ["[2条]张三: 在吗"]
+        assert watcher.check() == []
+
+    def test_first_snapshot_is_baseline(self):
+        """测试启动时已有的通知只作为基准，不报告"""
+        watcher = NotificationWatcher(FakeNotificationFeed([make_dump(WECHAT_A), make_dump(WECHAT_A_UPDATED)]))
+
+        assert watcher.check() == []
+        assert [e.text for e in watcher.check()] == ["[2条]张三: 在吗"]
+        assert watcher.stats["events"] == 1
+
+    def test_close_keeps_shared_shell(self):
+        """测试关闭监视器不关闭共享的shell通道"""
+        class Shell:
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        shell = Shell()
+        NotificationWatcher(AdbNotificationFeed(shell=shell)).close()
+        assert not shell.closed
+
+    def test_wait_times_out_without_activity(self):
+        """测试无通知时超时返回空列表"""
+        now = [0.0]
+        watcher = NotificationWatcher(
+            FakeNotificationFeed([make_dump(OTHER_APP)]),
+            poll_interval=1.0,
+            sleep=lambda s: now.__setitem__(0, now[0] + s),
+            clock=lambda: now[0],
+        )
+
+        assert watcher.wait_for_activity(timeout=5) == []
+        assert watcher.stats["reads"] == 6
+
+    def test_wait_returns_on_notification(self):
+        """测试收到通知后立即返回"""
+        now = [0.0]
+        watcher = NotificationWatcher(
+            FakeNotificationFeed([make_dump(), make_dump(), make_dump(WECHAT_A)]),
+            sleep=lambda s: now.__setitem__(0, now[0] + s),
+            clock=lambda: now[0],
+        )
+
+        events = watcher.wait_for_activity(timeout=60)
+
+        assert [e.title for e in events] == ["张三"]
+        assert now[0] == 2.0
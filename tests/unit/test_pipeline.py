@@ -0,0 +1,96 @@
+"""
+按key分流的流水线阶段测试
+"""
+import queue
+import threading
+import time
+
+import pytest
+
+from implementations.wechat.pipeline import KeyedStage
+
+
+class TestKeyedStage:
+    """KeyedStage 测试"""
+
+    def setup_method(self):
+        self.done = []
+        self.lock = threading.Lock()
+
+    def record(self, key, item):
+        with self.lock:
+            self.done.append((key, item))
+
+    def test_same_key_keeps_order(self):
+        """同一key的任务按提交顺序处理"""
+        def handler(key, item):
+            # 前面的任务更慢，并行处理时会被后面的超过
+            time.sleep(0.01 * (5 - item))
+            self.record(key, item)
+
+        stage = KeyedStage(handler, workers=4)
+        stage.start()
+        for item in range(5):
+            stage.put("张三", item)
+        stage.stop(timeout=5)
+
+        assert [item for _, item in self.done] == [0, 1, 2, 3, 4]
+
+    def test_different_keys_run_in_parallel(self):
+        """不同worker上的key并行处理"""
+        stage = KeyedStage(lambda key, item: None, workers=2)
+        keys = [f"chat{i}" for i in range(20)]
+        first = keys[0]
+        other = next(key for key in keys if stage._index(key) != stage._index(first))
+
+        release = threading.Event()
+        stage.handler = lambda key, item: (release.wait(5) if key == first else None, self.record(key, item))
+        stage.start()
+        stage.put(first, 1)
+        stage.put(other, 2)
+
+        deadline = time.monotonic() + 5
+        while not self.done and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # 第一个key阻塞期间另一个key已经处理完
+        assert self.done == [(other, 2)]
+        release.set()
+        stage.stop(timeout=5)
+        assert len(self.done) == 2
+
+    def test_put_blocks_when_queue_full(self):
+        """队列满时 put() 阻塞（背压）"""
+        release = threading.Event()
+        stage = KeyedStage(lambda key, item: release.wait(5), workers=1, queue_size=1)
+        stage.start()
+        stage.put("a", 1)
+        # 等worker取走第一个任务
+        deadline = time.monotonic() + 5
+        while stage.depth() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stage.put("a", 2)
+
+        with pytest.raises(queue.Full):
+            stage.put("a", 3, timeout=0.05)
+        release.set()
+        stage.stop(timeout=5)
+        assert stage.stats["processed"] == 2
+
+    def test_handler_errors_are_counted(self):
+        """处理失败不影响后续任务"""
+        def handler(key, item):
+            if item == "bad":
+                raise ValueError(item)
+            self.record(key, item)
+
+        stage = KeyedStage(handler, workers=1)
+        stage.start()
+        stage.put("a", "bad")
+        stage.put("a", "good")
+        stage.join()
+
+        snapshot = stage.snapshot()
+        assert snapshot["errors"] == 1
+        assert snapshot["processed"] == 1
+        assert self.done == [("a", "good")]
+        stage.stop(timeout=5)
@@ -0,0 +1,68 @@
+"""
+自适应轮询调度测试
+"""
+from datetime import datetime
+from core.polling import AdaptivePollScheduler
+
+
+def fixed_now(hour, minute=0):
+    return lambda: datetime(2024, 1, 1, hour, minute)
+
+
+class TestAdaptivePollScheduler:
+    """轮询调度器测试"""
+
+    def test_backoff_while_idle(self):
+        """测试空闲时指数退避并封顶"""
+        scheduler = AdaptivePollScheduler(min_interval=1, max_interval=5, backoff_factor=2, now=fixed_now(12))
+
+        intervals = []
+        for _ in range(5):
+            scheduler.record_scan(0.0, found=0)
+            intervals.append(scheduler.interval)
+
+        assert intervals == [2, 4, 5, 5, 5]
+
+    def test_activity_resets_interval(self):
+        """测试发现消息后回到最短间隔"""
+        scheduler = AdaptivePollScheduler(min_interval=1, max_interval=30, backoff_factor=2, now=fixed_now(12))
+        for _ in range(4):
+            scheduler.record_scan(0.0, found=0)
+
+        scheduler.record_scan(0.0, found=3)
+
+        assert scheduler.interval == 1
+        assert scheduler.active_scans == 1
+
+    def test_delay_subtracts_scan_time(self):
+        """测试等待时间扣除扫描耗时"""
+        scheduler = AdaptivePollScheduler(min_interval=2, max_interval=2, now=fixed_now(12))
+        scheduler.record_scan(0.5, found=1)
+        assert scheduler.next_delay() == 1.5
+
+        scheduler.record_scan(3.0, found=1)
+        assert scheduler.next_delay() == 0.0
+
+    def test_time_of_day_profile(self):
+        """测试夜间时段使用独立的间隔范围（跨越午夜）"""
+        profiles = [{"time_range": "23:00-07:00", "min_interval": 10, "max_interval": 300}]
+        night = AdaptivePollScheduler(min_interval=1, max_interval=30, profiles=profiles, now=fixed_now(2))
+        day = AdaptivePollScheduler(min_interval=1, max_interval=30, profiles=profiles, now=fixed_now(12))
+
+        night.record_scan(0.0, found=1)
+        day.record_scan(0.0, found=1)
+
+        assert night.interval == 10
+        assert day.interval == 1
+
+    def test_stats(self):
+        """测试扫描耗时统计"""
+        scheduler = AdaptivePollScheduler(now=fixed_now(12))
+        for duration in (0.1, 0.2, 0.3):
+            scheduler.record_scan(duration, found=0)
+
+        stats = scheduler.stats()
+
+        assert stats["scans"] == 3
+        assert stats["scan_p50"] == 0.2
+        assert stats["scan_max"] == 0.3
@@ -0,0 +1,67 @@
+"""
+红点检测测试
+"""
+import numpy as np
+
+from implementations.wechat.vision import RedDotDetector, RowTiles, red_mask
+
+
+def draw_disc(frame, cx, cy, radius, color):
+    yy, xx = np.ogrid[:frame.shape[0], :frame.shape[1]]
+    frame[(yy - cy) ** 2 + (xx - cx) ** 2 <= radius ** 2] = color
+
+
+def chat_list(background=(255, 255, 255)):
+    frame = np.zeros((1440, 1080, 3), dtype=np.uint8)
+    frame[:] = background
+    return frame
+
+
+class TestRedDotDetector:
+    """红点检测测试"""
+
+    def setup_method(self):
+        self.detector = RedDotDetector()
+        self.tiles = RowTiles.uniform(0, 1440, 180)
+
+    def test_finds_badges_and_rows(self):
+        """测试找到徽标并归属到所在行"""
+        frame = chat_list()
+        draw_disc(frame, 140, 2 * 180 + 40, 24, (250, 81, 81))
+        draw_disc(frame, 140, 5 * 180 + 40, 12, (250, 81, 81))
+
+        dots = self.detector.detect(frame, tiles=self.tiles)
+
+        assert [dot.row for dot in dots] == [2, 5]
+        x, y = dots[0].center
+        assert abs(x - 140) <= 8 and abs(y - (2 * 180 + 40)) <= 8
+
+    def test_dark_theme(self):
+        """测试深色主题下同样有效"""
+        frame = chat_list(background=(25, 25, 25))
+        draw_disc(frame, 140, 400, 24, (230, 70, 70))
+        assert len(self.detector.detect(frame)) == 1
+
+    def test_ignores_non_badges(self):
+        """测试忽略非红色、过大的红色区域和细线"""
+        frame = chat_list()
+        draw_disc(frame, 140, 100, 24, (81, 81, 250))        # 蓝色
+        frame[400:700, 100:500] = (250, 81, 81)              # 大块红色图片
+        frame[900:903, 100:900] = (250, 81, 81)              # 红色细线
+        draw_disc(frame, 140, 1200, 24, (250, 200, 200))     # 低饱和粉色
+        assert self.detector.detect(frame) == []
+
+    def test_region(self):
+        """测试只在指定区域内检测，坐标仍相对原图"""
+        frame = chat_list()
+        draw_disc(frame, 140, 100, 24, (250, 81, 81))
+        draw_disc(frame, 140, 1000, 24, (250, 81, 81))
+
+        dots = self.detector.detect(frame, region=(0, 720, 1080, 1440))
+        assert len(dots) == 1
+        assert abs(dots[0].center[1] - 1000) <= 8
+
+    def test_mask_hue_wraparound(self):
+        """测试偏品红的红色（色相接近360°）也被识别"""
+        pixels = np.array([[[250, 60, 80], [250, 80, 60], [60, 250, 80]]], dtype=np.uint8)
+        assert red_mask(pixels).tolist() == [[True, True, False]]
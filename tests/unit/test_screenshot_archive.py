@@ -0,0 +1,136 @@
+"""
+截图归档测试
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from implementations.wechat import screenshot_archive
+from implementations.wechat.screenshot_archive import CaptureLevel, ScreenshotArchive
+
+
+def frame(value):
+    return np.full((40, 30, 3), value, dtype=np.uint8)
+
+
+class TestScreenshotArchive:
+    """截图归档测试"""
+
+    def setup_method(self):
+        self.now = 1_000_000.0
+
+    def make(self, tmp_path, **options):
+        return ScreenshotArchive(root=str(tmp_path), clock=lambda: self.now, **options)
+
+    def test_async_write_sharded_and_deduped(self, tmp_path):
+        """测试后台写入、按哈希分目录、相同画面只存一份"""
+        archive = self.make(tmp_path)
+        first = archive.submit(frame(10), "message/1")
+        second = archive.submit(frame(10), "message/2")
+        assert archive.flush(timeout=5)
+
+        assert first == second
+        digest = os.path.basename(first)[:-4]
+        assert first == os.path.join(str(tmp_path), digest[:2], digest[2:4], f"{digest}.jpg")
+        assert os.path.exists(first)
+        assert archive.stats["written"] == 1 and archive.stats["deduped"] == 1
+
+        with open(tmp_path / "index.jsonl", encoding="utf-8") as f:
+            kinds = [json.loads(line)["kind"] for line in f]
+        assert kinds == ["message/1", "message/2"]
+        archive.close()
+
+    def test_capture_levels(self, tmp_path):
+        """测试低于归档级别的截图被跳过"""
+        archive = self.make(tmp_path, level="messages")
+        assert archive.enabled(CaptureLevel.ERRORS)
+        assert not archive.enabled(CaptureLevel.DEBUG)
+        assert archive.submit(frame(1), "send/typed", CaptureLevel.DEBUG) is None
+        assert archive.stats["skipped"] == 1
+
+        off = self.make(tmp_path, level=CaptureLevel.OFF)
+        assert not off.enabled(CaptureLevel.ERRORS)
+        assert off.write_now(frame(2), "ocr", force=True) is not None
+
+    def test_write_now_is_synchronous(self, tmp_path):
+        """测试同步写入立即可读"""
+        archive = self.make(tmp_path)
+        path = archive.write_now(frame(50), "message/ocr")
+        assert os.path.exists(path)
+
+    def test_retention_by_age_and_size(self, tmp_path):
+        """测试先删过期文件，再从最旧的开始删到大小上限以内"""
+        archive = self.make(tmp_path, max_age=3600)
+        paths = [archive.write_now(frame(v), f"m{v}") for v in (1, 2, 3, 4)]
+        ages = [7200, 300, 200, 100]
+        for path, age in zip(paths, ages):
+            os.utime(path, (self.now - age, self.now - age))
+
+        size = os.path.getsize(paths[1])
+        archive.max_bytes = size * 2
+        assert archive.enforce_retention() == 2
+        assert [os.path.exists(p) for p in paths] == [False, False, True, True]
+
+        # 被清理的画面可以重新写入
+        assert os.path.exists(archive.write_now(frame(1), "m1"))
+
+    def test_dedup_hit_refreshes_mtime(self, tmp_path):
+        """测试重复画面再次提交时刷新修改时间，不会按旧时间被清理"""
+        archive = self.make(tmp_path, max_age=3600)
+        path = archive.write_now(frame(7), "m7")
+        os.utime(path, (self.now - 7200, self.now - 7200))
+
+        assert archive.submit(frame(7), "m7/again") == path
+        assert archive.flush(timeout=5)
+        self.now = os.path.getmtime(path)
+        assert archive.enforce_retention() == 0
+        assert os.path.exists(path)
+        archive.close()
+
+    def test_retention_compacts_index(self, tmp_path):
+        """测试清理时索引只保留未过期且文件仍存在的记录"""
+        archive = self.make(tmp_path, max_age=3600)
+        old = archive.write_now(frame(1), "old")
+        os.utime(old, (self.now - 7200, self.now - 7200))
+        self.now += 10
+        kept = archive.write_now(frame(2), "kept")
+        archive.write_now(frame(2), "kept/again")
+
+        assert archive.enforce_retention() == 1
+        with open(archive.index_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert [(r["kind"], r["path"]) for r in records] == [("kept", kept), ("kept/again", kept)]
+
+    def test_index_triggers_retention_without_new_files(self, tmp_path):
+        """测试只有重复画面时也按提交次数清理（在后台线程），索引不会无限增长"""
+        archive = self.make(tmp_path)
+        archive.RETENTION_EVERY = 5
+        archive.MAX_INDEX_RECORDS = 3
+        threads = []
+        enforce = archive.enforce_retention
+        archive.enforce_retention = lambda: threads.append(threading.current_thread().name) or enforce()
+        for i in range(12):
+            archive.write_now(frame(3), f"m{i}")
+        assert archive.flush(timeout=5)
+        assert threads and set(threads) == {"screenshot-archive"}
+        with open(archive.index_path, encoding="utf-8") as f:
+            assert len(f.readlines()) <= archive.RETENTION_EVERY + archive.MAX_INDEX_RECORDS
+        archive.close()
+
+    def test_failed_write_is_not_deduped(self, tmp_path, monkeypatch):
+        """测试写入失败的画面不计入去重，之后相同的画面会重新写入"""
+        archive = self.make(tmp_path)
+        real = screenshot_archive.Image.fromarray
+
+        def broken(*args, **kwargs):
+            raise OSError("磁盘已满")
+
+        monkeypatch.setattr(screenshot_archive.Image, "fromarray", broken)
+        assert archive.write_now(frame(9), "m9") is None
+        monkeypatch.setattr(screenshot_archive.Image, "fromarray", real)
+
+        path = archive.write_now(frame(9), "m9/again")
+        assert path is not None and os.path.exists(path)
+        assert archive.stats["errors"] == 1 and archive.stats["deduped"] == 0
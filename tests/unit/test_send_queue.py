@@ -0,0 +1,109 @@
+"""
+发送调度测试
+"""
+from implementations.wechat.send_queue import SendScheduler
+
+
+class FakePlatform:
+    """记录每次访问的假平台"""
+
+    def __init__(self, current_chat=None, visible=()):
+        self.current_chat = current_chat
+        self.visible = set(visible)
+        self.visits = []
+        self.fail = set()
+
+    def navigation_cost(self, receiver):
+        if receiver == self.current_chat:
+            return 0
+        return 1 if receiver in self.visible else 2
+
+    def send_batch(self, receiver, contents):
+        self.visits.append((receiver, list(contents)))
+        self.current_chat = receiver
+        return [content not in self.fail for content in contents]
+
+
+class SimplePlatform:
+    """只有 send_message 的平台"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, receiver, content):
+        self.sent.append((receiver, content))
+        return True
+
+
+class TestSendScheduler:
+    """发送调度测试"""
+
+    def setup_method(self):
+        self.now = 0.0
+        self.platform = FakePlatform()
+        self.scheduler = SendScheduler(self.platform, clock=self.tick)
+
+    def tick(self):
+        self.now += 1
+        return self.now
+
+    def test_groups_by_recipient(self):
+        """测试A、B、A只访问两次且保持同一联系人内的顺序"""
+        for receiver, content in [("A", "a1"), ("B", "b1"), ("A", "a2")]:
+            self.scheduler.submit(receiver, content)
+
+        assert self.scheduler.depth() == 3
+        assert self.scheduler.run_pending() == 2
+        assert self.platform.visits == [("A", ["a1", "a2"]), ("B", ["b1"])]
+        assert self.scheduler.depth() == 0
+
+    def test_orders_by_navigation_cost(self):
+        """测试优先发送当前聊天窗口，其次列表中可见的联系人"""
+        self.platform.current_chat = "C"
+        self.platform.visible = {"B"}
+        for receiver in ["A", "B", "C"]:
+            self.scheduler.submit(receiver, f"to {receiver}")
+
+        self.scheduler.run_pending()
+
+        assert [visit[0] for visit in self.platform.visits] == ["C", "B", "A"]
+
+    def test_results_callbacks_and_stats(self):
+        """测试发送结果、回调和统计"""
+        self.platform.fail = {"bad"}
+        done = []
+        good = self.scheduler.submit("A", "good", callback=done.append)
+        bad = self.scheduler.submit("A", "bad", callback=done.append)
+
+        self.scheduler.run_pending()
+
+        assert good.wait(0) is True
+        assert bad.wait(0) is False
+        assert done == [good, bad]
+        stats = self.scheduler.stats()
+        assert stats["sent"] == 1
+        assert stats["failed"] == 1
+        assert stats["visits"] == 1
+        assert stats["messages_per_visit"] == 2
+        assert stats["latency_max"] > 0
+
+    def test_max_batch(self):
+        """测试单次访问的条数上限"""
+        scheduler = SendScheduler(self.platform, max_batch=2)
+        for i in range(3):
+            scheduler.submit("A", str(i))
+
+        scheduler.run_pending()
+
+        assert self.platform.visits == [("A", ["0", "1"]), ("A", ["2"])]
+
+    def test_background_thread_and_fallback(self):
+        """测试后台线程和逐条发送的退化路径"""
+        platform = SimplePlatform()
+        scheduler = SendScheduler(platform)
+        scheduler.start()
+        message = scheduler.submit("A", "hi")
+
+        assert message.wait(5) is True
+        scheduler.stop(timeout=5)
+        assert platform.sent == [("A", "hi")]
@@ -0,0 +1,65 @@
+"""
+行块哈希测试
+"""
+import numpy as np
+
+from implementations.wechat.hierarchy import Bounds
+from implementations.wechat.vision import RowTiles, TileHasher, tile_hashes
+
+
+def chat_list(rows=8, row_height=180, width=1080):
+    """每行左侧有"头像"、中间有"文字"的假聊天列表"""
+    frame = np.full((rows * row_height, width, 3), 255, dtype=np.uint8)
+    for index in range(rows):
+        top = index * row_height
+        frame[top + 30:top + 150, 30:150] = 80
+        frame[top + 40:top + 80, 200:200 + 60 * (index + 1)] = 0
+    return frame
+
+
+class TestRowTiles:
+    """行块几何测试"""
+
+    def test_uniform(self):
+        """测试等高行切分"""
+        tiles = RowTiles.uniform(0, 1000, 180)
+        assert len(tiles) == 5
+        assert tiles.spans[1] == (180, 360)
+        assert tiles.center(0) == 90
+
+    def test_from_bounds(self):
+        """测试由聊天行位置构造"""
+        tiles = RowTiles.from_bounds([Bounds(0, 300, 1080, 480), None], offset=240)
+        assert tiles.spans == ((60, 240),)
+
+
+class TestTileHasher:
+    """行块哈希测试"""
+
+    def setup_method(self):
+        self.hasher = TileHasher(RowTiles.uniform(0, 8 * 180, 180))
+
+    def test_hash_shape(self):
+        """测试每个行块64位哈希"""
+        gray = chat_list()[..., 0].astype(np.int16)
+        hashes = tile_hashes(gray, RowTiles.uniform(0, 8 * 180, 180).spans)
+        assert hashes.shape == (8, 64)
+        assert hashes.dtype == bool
+
+    def test_localizes_changed_row(self):
+        """测试只报告内容变化的行"""
+        frame = chat_list()
+        assert self.hasher.update(frame) == []
+        assert self.hasher.update(frame) == []
+
+        updated = frame.copy()
+        updated[3 * 180 + 40:3 * 180 + 80, 200:1000] = 0
+        updated[3 * 180 + 100:3 * 180 + 140, 200:700] = 0
+        assert self.hasher.update(updated) == [3]
+        assert self.hasher.update(updated) == []
+
+    def test_retiling_resets_baseline(self):
+        """测试行几何变化后重新建立基准"""
+        self.hasher.update(chat_list())
+        self.hasher.set_tiles(RowTiles.uniform(90, 8 * 180, 180))
+        assert self.hasher.update(chat_list()) == []
@@ -0,0 +1,120 @@
+"""
+条件等待测试
+"""
+from implementations.wechat.waits import WaitStats, element_exists, element_gone, text_equals, wait_until
+
+
+class FakeClock:
+    """sleep推进时间的假时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSelector:
+    def __init__(self, device, selector):
+        self.device = device
+        self.selector = selector
+
+    @property
+    def exists(self):
+        self.device.polls += 1
+        return self.device.polls >= self.device.appear_after
+
+    def get_text(self):
+        return self.device.text
+
+
+class LazyExists:
+    """惰性求值的exists（如计时代理）：每次bool()都查询一次"""
+
+    def __init__(self, device):
+        self.device = device
+
+    def __bool__(self):
+        self.device.polls += 1
+        return self.device.polls >= self.device.appear_after
+
+
+class LazySelector(FakeSelector):
+    @property
+    def exists(self):
+        return LazyExists(self.device)
+
+
+class FakeDevice:
+    def __init__(self, appear_after=1, text=None):
+        self.appear_after = appear_after
+        self.text = text
+        self.polls = 0
+
+    def __call__(self, **selector):
+        return FakeSelector(self, selector)
+
+
+class LazyDevice(FakeDevice):
+    def __call__(self, **selector):
+        return LazySelector(self, selector)
+
+
+class TestWaitUntil:
+    """wait_until 测试"""
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.stats = WaitStats()
+
+    def wait(self, predicate, **kwargs):
+        return wait_until(predicate, stats=self.stats, sleep=self.clock.sleep, clock=self.clock, **kwargs)
+
+    def test_returns_as_soon_as_condition_holds(self):
+        """测试条件满足即返回，只付出实际等待时间"""
+        device = FakeDevice(appear_after=3)
+
+        assert self.wait(element_exists(device, text="发送"), timeout=5, interval=0.1, name="appear")
+        assert device.polls == 3
+        assert round(self.clock.now, 3) == 0.2
+
+        summary = self.stats.summary()["appear"]
+        assert summary["count"] == 1
+        assert summary["timeouts"] == 0
+
+    def test_timeout(self):
+        """测试超时返回假值并记录超时"""
+        device = FakeDevice(appear_after=1000)
+
+        assert not self.wait(element_exists(device, text="发送"), timeout=1, interval=0.25, name="never")
+        assert self.clock.now == 1.0
+        assert self.stats.summary()["never"]["timeouts"] == 1
+
+    def test_predicate_errors_are_retried(self):
+        """测试条件抛异常时继续等待"""
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError("rpc失败")
+            return "ok"
+
+        assert self.wait(flaky, timeout=5) == "ok"
+
+    def test_text_equals_treats_none_as_empty(self):
+        """测试空文本与None等价"""
+        assert text_equals(FakeDevice(text=None), {"focused": True}, "")()
+        assert not text_equals(FakeDevice(text="你好"), {"focused": True}, "")()
+
+    def test_lazy_exists_evaluated_once(self):
+        """测试惰性exists只求值一次，条件返回bool"""
+        device = LazyDevice(appear_after=2)
+
+        result = self.wait(element_exists(device, text="发送"), timeout=5, interval=0.1)
+        assert result is True
+        assert device.polls == 2
+        assert element_gone(LazyDevice(appear_after=1000), text="发送")() is True
@@ -9,25 +9,44 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
+from core.dedup import get_reply_dedup_store
+from implementations.wechat.chat_scheduler import RoundRobinScheduler, remaining
+from implementations.wechat.device_session import get_session
+from implementations.wechat.navigation import Screen
+from implementations.wechat.pipeline import KeyedStage
+from implementations.wechat.screenshot_archive import get_screenshot_archive
+from implementations.wechat.send_queue import SendScheduler
+from wechat_contact_manager import WeChatContactManager
 from wechat_sender import WeChatSender
 from wechat_receiver import WeChatReceiver
 from message_ocr import MessageOCR
 from reply_rule_engine import ReplyRuleEngine
+import threading
 import time
 
 class WeChatAutoReply:
-    def __init__(self, use_ocr=False, ocr_engine="paddle", use_rules=True):
-        self.sender = WeChatSender()
-        self.receiver = WeChatReceiver()
+    def __init__(self, use_ocr=False, ocr_engine="paddle", use_rules=True, device_serial=None):
+        # 发送和接收共用同一个设备会话（一个连接、一把操作锁）
+        self.session = get_session(device_serial)
+        self.sender = WeChatSender(self.session)
+        self.receiver = WeChatReceiver(self.session)
+        # 截图归档：后台写盘、按内容去重、限制总大小和保留时间
+        self.archive = get_screenshot_archive()
         self.running = False
         
         # 保持屏幕常亮
         self._keep_screen_on()
         
-        # 已回复消息记录（用于去重）
-        self.replied_messages = set()  # 存储已回复消息的hash
+        # 去重记录：已回复的消息、自己发出的消息（按会话+内容的稳定摘要，限时限量，可持久化）
+        self.dedup = get_reply_dedup_store()
         self.last_message_content = ""  # 上一条消息内容
         
+        # 流水线：发送调度器在 start_monitoring 中创建；回复发出后通知截图阶段更新基准
+        self.send_scheduler = None
+        self._sent_since_check = threading.Event()
+        self.chats = None
+        self.scan_pages = 3
+        
         # OCR 支持
         self.use_ocr = use_ocr
         self.ocr = None
@@ -54,31 +73,24 @@ class WeChatAutoReply:
     def _keep_screen_on(self):
         """保持屏幕常亮并解锁"""
         try:
-            import subprocess
-            # 唤醒屏幕
-            subprocess.run(['adb', 'shell', 'input', 'keyevent', '26'], 
-                         capture_output=True, timeout=3, check=False)
-            time.sleep(0.3)
-            
-            # 解锁屏幕 (按菜单键)
-            subprocess.run(['adb', 'shell', 'input', 'keyevent', '82'], 
-                         capture_output=True, timeout=3, check=False)
-            time.sleep(0.3)
-            
-            # 上滑解锁
-            subprocess.run(['adb', 'shell', 'input', 'swipe', '540', '2000', '540', '500'], 
-                         capture_output=True, timeout=3, check=False)
-            time.sleep(0.5)
-            
-            # 保持屏幕常亮
-            subprocess.run(['adb', 'shell', 'svc', 'power', 'stayon', 'true'], 
-                         capture_output=True, timeout=3, check=False)
+            # 所有命令一次写入持久化adb shell（流水线执行，不再逐条启动adb进程）
+            # 包含按键和滑动：走会话的 shell_input（计时并使层级缓存失效）
+            results = self.session.shell_input([
+                "input keyevent 26",  # 唤醒屏幕
+                "sleep 0.3",
+                "input keyevent 82",  # 解锁屏幕 (按菜单键)
+                "sleep 0.3",
+                "input swipe 540 2000 540 500",  # 上滑解锁
+                "sleep 0.5",
+                "svc power stayon true",  # 保持屏幕常亮
+                "settings put system screen_off_timeout 2147483647",  # 禁用自动锁屏
+            ], timeout=5)
             
-            # 禁用自动锁屏
-            subprocess.run(['adb', 'shell', 'settings', 'put', 'system', 'screen_off_timeout', '2147483647'], 
-                         capture_output=True, timeout=3, check=False)
-            
-            print("✓ 屏幕已解锁并保持常亮")
+            failed = [r.command for r in results if not r.ok]
+            if failed:
+                print(f"⚠️  部分命令执行失败: {failed}")
+            else:
+                print("✓ 屏幕已解锁并保持常亮")
         except Exception as e:
             print(f"⚠️  无法解锁屏幕: {e}")
         
@@ -98,13 +110,34 @@ class WeChatAutoReply:
         
         return "收到，我是自动回复"
     
-    def start_monitoring(self, reply_rule=None, check_interval=3):
+    def start_monitoring(
+        self,
+        reply_rule=None,
+        check_interval=3,
+        ocr_workers=2,
+        queue_size=8,
+        scan_pages=3,
+        per_chat_budget=5.0,
+        round_budget=30.0,
+    ):
         """
         开始监控并自动回复
         
+        检测到聊天列表变化时收集所有未读会话（含首屏以下），每轮每个会话截取一次，
+        超出一轮时限的会话留到下一轮优先处理。
+        流水线执行：主线程只做设备上的检测、进入聊天和截图；
+        OCR与回复决策在 KeyedStage 的worker中进行（同一会话串行、不同会话并行）；
+        回复交给 SendScheduler 的发送线程，按会话合并发送。
+        设备阶段与CPU阶段互相重叠，同一会话内的消息仍按收到的顺序回复。
+        
         Args:
             reply_rule: 自定义回复规则函数
             check_interval: 检查间隔（秒）
+            ocr_workers: OCR/决策worker数
+            queue_size: 每个OCR worker的队列容量（积压时截图阶段阻塞等待）
+            scan_pages: 收集未读会话时最多读取聊天列表的屏数
+            per_chat_budget: 截取单个会话的时限（秒）
+            round_budget: 一轮截取的总时限（秒），期间发送线程无法使用设备
         """
         if reply_rule is None:
             reply_rule = self.simple_reply_rule
@@ -116,10 +149,26 @@ class WeChatAutoReply:
         print("="*60)
         print(f"\n📱 设备: {self.sender.width}x{self.sender.height}")
         print(f"⏱️  检查间隔: {check_interval}秒")
+        print(f"🧵 OCR worker: {ocr_workers}, 队列容量: {queue_size}")
         print("\n按 Ctrl+C 停止\n")
         
-        # 初始化
-        self.receiver._has_new_message()
+        # 发送阶段：独立线程，与截图共用设备会话锁
+        self.send_scheduler = SendScheduler(ChatSendAdapter(self))
+        self.send_scheduler.start()
+        # OCR+决策阶段：按会话名分配worker
+        decide = KeyedStage(
+            lambda chat, job: self._decide(job, reply_rule),
+            workers=ocr_workers, queue_size=queue_size, name="ocr",
+        )
+        decide.start()
+        # 未读会话轮转：上一轮没轮到的会话下一轮先处理
+        self.chats = RoundRobinScheduler(per_chat_budget=per_chat_budget, round_budget=round_budget)
+        self.scan_pages = scan_pages
+        
+        # 初始化：在聊天列表上取基准
+        with self.session.lock:
+            self.receiver.back_to_chat_list()
+            self.receiver._has_new_message()
         
         message_count = 0
         
@@ -127,96 +176,231 @@ class WeChatAutoReply:
             while self.running:
                 time.sleep(check_interval)
                 
-                # 检测新消息
-                if not self.receiver._has_new_message():
-                    continue
+                # 检测持有设备锁：发送线程不会在截图/差分期间切换界面
+                with self.session.lock:
+                    # 回复发出后（发送线程可能停留在聊天窗口）回到聊天列表重新获取基准，
+                    # 避免把自己的回复或界面切换当作新消息
+                    if self._sent_since_check.is_set() or self.session.screen == Screen.CHAT:
+                        self._sent_since_check.clear()
+                        self.receiver.back_to_chat_list()
+                        self.receiver._has_new_message()
+                    changed = self.receiver._has_new_message()
                 
-                message_count += 1
-                print(f"\n[消息 #{message_count}] ✉️  收到新消息！")
+                # 检测新消息（上一轮还有没轮到的会话时直接继续处理）
+                if not changed and not len(self.chats):
+                    continue
                 
-                # 先点击进入聊天窗口
+                # 释放设备锁后再交给OCR阶段：OCR积压时在这里阻塞（背压），发送线程仍可使用设备
+                for job in self._capture_round():
+                    message_count += 1
+                    job["count"] = message_count
+                    print(f"\n[消息 #{message_count}] ✉️  {job['chat'] or '(未知会话)'} 有新消息")
+                    decide.put(job["chat"], job)
+        
+        except KeyboardInterrupt:
+            print("\n\n⏹️  已停止监控")
+            print(f"📊 共处理 {message_count} 条消息")
+        finally:
+            self.running = False
+            decide.stop(timeout=60)
+            self.send_scheduler.stop(timeout=60)
+            self.archive.close()
+            self.dedup.save()
+            print(f"🧵 OCR阶段: {decide.snapshot()}")
+            print(f"📤 发送阶段: {self.send_scheduler.stats()}")
+            print(f"🔁 会话轮转: {self.chats.stats()}")
+            print(f"🗂️  截图归档: {self.archive.stats}")
+            print(f"📌 回复去重: {len(self.dedup)} 条, {self.dedup.stats}")
+    
+    def _capture_round(self):
+        """
+        设备阶段：收集未读会话并轮流进入截取消息（持有设备锁，发送线程不会插入手势）
+        
+        Returns:
+            list: 交给OCR阶段的任务（按截取顺序）
+        """
+        jobs = []
+        with self.session.lock:
+            try:
+                unread = self.receiver.collect_unread_chats(self.scan_pages)
+                self.chats.offer(unread)
+            except Exception as e:
+                print(f"  ⚠️  收集未读会话失败: {e}")
+            
+            if len(self.chats):
+                self.chats.run_round(lambda task, deadline: self._capture_chat(task, deadline, jobs))
+            else:
+                # 聊天列表解析不出未读会话（资源ID失效等）时，退回点击最新的红点会话
                 try:
                     self.receiver.click_latest_chat_with_red_dot()
                 except Exception as e:
                     print(f"  ⚠️  进入聊天窗口失败: {e}")
+                job = self._grab_chat()
+                if job is not None:
+                    jobs.append(job)
+            
+            # 回到聊天列表，在列表上重新获取基准
+            self.receiver.back_to_chat_list()
+            self.receiver.pager.to_top()
+            self.receiver._has_new_message()
+        return jobs
+    
+    def _capture_chat(self, task, deadline, jobs):
+        """
+        进入一个未读会话截取消息并返回聊天列表（轮转调度的处理函数）
+        
+        Args:
+            deadline: 截止时间（time.monotonic），限制滚动定位和等待界面切换的时间
+        """
+        if not self.receiver.open_chat(task.name, task.page, deadline):
+            # 已不在未读列表（可能已在手机上读过），或在时限内没有定位到
+            return True
+        job = self._grab_chat()
+        self.receiver.back_to_chat_list(timeout=remaining(deadline, 2))
+        if job is not None:
+            job["chat"] = job["chat"] or task.name
+            jobs.append(job)
+        return True
+    
+    def _grab_chat(self):
+        """读取当前聊天窗口的标题并截取新消息"""
+        try:
+            chat = self.receiver.read_chat_title()
+        except Exception as e:
+            print(f"  ⚠️  读取聊天标题失败: {e}")
+            chat = None
+        
+        # 截图（内存中裁剪，写盘交给后续阶段）
+        try:
+            image = self.receiver.get_latest_message_image()
+        except Exception as e:
+            print(f"  ❌ 截图失败: {e}")
+            return None
+        return {"chat": chat, "image": image}
+    
+    def _decide(self, job, reply_rule):
+        """OCR+决策阶段（worker线程）：识别消息、生成回复并提交发送"""
+        count = job["count"]
+        tag = f"[#{count}]"
+        
+        # OCR需要文件时同步写入归档，否则交给归档的后台线程
+        if self.use_ocr and self.ocr:
+            msg_path = self.archive.write_now(job["image"], f"message/{count}", force=True)
+        else:
+            msg_path = self.archive.submit(job["image"], f"message/{count}")
+        print(f"  {tag} 📸 截图: {msg_path or '(未归档)'}")
+        
+        # 使用 OCR 识别消息内容
+        if not (self.use_ocr and self.ocr):
+            return
+        
+        chat = job["chat"]
+        message_info = None
+        try:
+            print(f"  {tag} 🔍 OCR识别中...")
+            message_info = self.ocr.extract_latest_message(msg_path)
+            
+            if message_info and message_info.get('content'):
+                msg_content = message_info['content']
+                print(f"  {tag} 📝 内容: {msg_content}")
                 
-                # 截图
-                try:
-                    msg_path = self.receiver.get_latest_message_screenshot(
-                        f"screenshots/auto_reply/msg_{message_count}.jpg"
-                    )
-                    print(f"  📸 截图: {msg_path}")
-                except Exception as e:
-                    print(f"  ❌ 截图失败: {e}")
-                    continue
-                
-                # 使用 OCR 识别消息内容
-                message_info = None
+                # 最新消息是自己发出的回复
+                if self.dedup.is_own(chat, msg_content):
+                    print(f"  {tag} ⏭️  跳过自己的回复")
+                    return
+                # 这条消息已经回复过（界面变化但没有新消息时会再次识别到它）
+                if self.dedup.was_replied(chat, msg_content):
+                    print(f"  {tag} ⏭️  已回复过该消息")
+                    return
+            else:
+                print(f"  {tag} ⚠️  OCR未识别到内容")
                 
-                if self.use_ocr and self.ocr:
-                    try:
-                        print(f"  🔍 OCR识别中...")
-                        message_info = self.ocr.extract_latest_message(msg_path)
-                        
-                        if message_info and message_info.get('content'):
-                            msg_content = message_info['content']
-                            print(f"  📝 内容: {msg_content}")
-                            
-                            # 简单去重：检查是否包含自己的回复特征
-                            if "收到" in msg_content and "消息" in msg_content:
-                                print(f"  ⏭️  跳过自己的回复")
-                                continue
-                        else:
-                            print(f"  ⚠️  OCR未识别到内容")
-                            
-                    except Exception as e:
-                        print(f"  ⚠️  OCR失败: {e}")
-                    
-                    # 生成回复
-                    print(f"  🤔 准备生成回复...")
-                    if message_info:
-                        # 使用规则引擎
-                        if self.use_rules and self.rule_engine:
-                            reply = self.rule_engine.match_rule(message_info)
-                        else:
-                            reply = reply_rule(message_info)
-                    else:
-                        reply = reply_rule(msg_path)  # 降级到使用截图路径
-                    
-                    if reply:
-                        print(f"  💬 回复: {reply}")
-                        
-                        # 发送回复
-                        time.sleep(1)  # 稍等一下，更自然
-                        success = self.sender.send_message(
-                            reply,
-                            screenshot_dir=f"screenshots/auto_reply/reply_{message_count}"
-                        )
-                        
-                        if success:
-                            print(f"  ✅ 已自动回复")
-                            
-                            # 记录已回复的消息
-                            if message_info:
-                                msg_content = message_info.get('content', '')
-                                msg_hash = hash(msg_content)
-                                self.replied_messages.add(msg_hash)
-                                self.last_message_content = msg_content
-                                print(f"  📌 已记录消息: {msg_hash}")
-                            
-                            # 发送成功后，更新基准截图，避免把自己的回复当作新消息
-                            time.sleep(0.5)  # 等待消息显示
-                            self.receiver._has_new_message()  # 重新获取基准，这会更新 last_screenshot
-                        else:
-                            print(f"  ❌ 回复失败")
-                    else:
-                        print(f"  ⏭️  跳过回复")
-                    
-                    print()
+        except Exception as e:
+            print(f"  {tag} ⚠️  OCR失败: {e}")
         
-        except KeyboardInterrupt:
-            print("\n\n⏹️  已停止监控")
-            print(f"📊 共处理 {message_count} 条消息")
+        # 生成回复
+        if message_info:
+            # 使用规则引擎
+            if self.use_rules and self.rule_engine:
+                reply = self.rule_engine.match_rule(message_info)
+            else:
+                reply = reply_rule(message_info)
+        else:
+            reply = reply_rule(msg_path)  # 降级到使用截图路径
+        
+        if not reply:
+            print(f"  {tag} ⏭️  跳过回复")
+            return
+        
+        print(f"  {tag} 💬 回复: {reply}")
+        # 提交时就记录：发送完成前再次截到同一条消息不会重复回复，截到自己的回复也能识别
+        if message_info:
+            self.dedup.mark_replied(chat, message_info.get('content'))
+        self.dedup.record_outgoing(chat, reply)
+        self.send_scheduler.submit(
+            chat, reply,
+            callback=lambda message: self._on_sent(message, job, message_info),
+        )
+    
+    def _on_sent(self, message, job, message_info):
+        """发送阶段回调（发送线程）"""
+        tag = f"[#{job['count']}]"
+        if not message.ok:
+            print(f"  {tag} ❌ 回复失败")
+            # 允许下一次检测重试
+            if message_info:
+                self.dedup.unmark_replied(job["chat"], message_info.get('content'))
+            return
+        
+        print(f"  {tag} ✅ 已自动回复")
+        if message_info:
+            self.last_message_content = message_info.get('content', '')
+        self.dedup.maybe_save()
+        
+        # 通知截图阶段更新基准截图
+        self._sent_since_check.set()
+
+
+class ChatSendAdapter:
+    """
+    让 SendScheduler 驱动 WeChatSender：按会话名发送
+    
+    WeChatSender 只会向当前打开的聊天窗口发送；不在目标会话时先点击聊天列表中可见的该会话行
+    （刚截取过的会话通常就在列表上），不可见时才通过搜索打开。
+    会话名未知（读取标题失败）时发送到当前窗口，与原来的行为一致。
+    """
+    
+    def __init__(self, auto_reply):
+        self.app = auto_reply
+        self.session = auto_reply.session
+        self.receiver = auto_reply.receiver
+        self._contacts = None
+    
+    def navigation_cost(self, chat):
+        """0: 已在该会话窗口; 1: 聊天列表中可见; 2: 需要搜索"""
+        if chat is None or chat == self.session.current_chat:
+            return 0
+        return 1 if self.receiver.contact_cache.contains(chat) else 2
+    
+    def _open(self, chat):
+        """进入会话：先点击列表中可见的行，失败再搜索"""
+        if self.receiver.open_visible_chat(chat):
+            return True
+        if self._contacts is None:
+            self._contacts = WeChatContactManager(self.session)
+        if not self._contacts.open_chat_window(chat):
+            return False
+        self.session.set_ui_state(Screen.CHAT, chat)
+        return True
+    
+    def send_batch(self, chat, contents):
+        if chat is not None and chat != self.session.current_chat:
+            if not self._open(chat):
+                return [False] * len(contents)
+        return [
+            self.app.sender.send_message(content, screenshot_dir=f"reply/{chat or 'current'}")
+            for content in contents
+        ]
 
 def intelligent_reply_rule(message_info):
     """智能回复规则 - 基于 OCR 识别的内容"""
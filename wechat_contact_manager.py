@@ -4,26 +4,41 @@
 微信联系人管理模块
 """
 
-import uiautomator2 as u2
-import time
 import os
+from implementations.wechat.device_session import get_session, with_session_lock
+from implementations.wechat.instrumentation import instrumented
+from implementations.wechat.navigation import Screen
+from implementations.wechat.waits import (
+    element_count_at_least,
+    element_exists,
+    text_equals,
+    wait_until,
+)
+
+# 获得焦点的输入框（搜索框）
+FOCUSED_INPUT = {"className": "android.widget.EditText", "focused": True}
+# 聊天列表容器、聊天窗口标题（与 WeChatPlatform.SELECTORS 相同）
+CHAT_LIST = {"resourceId": "com.tencent.mm:id/e5u"}
+CHAT_TITLE = {"resourceId": "com.tencent.mm:id/ko4"}
 
 class WeChatContactManager:
-    def __init__(self):
-        self.d = u2.connect()
+    def __init__(self, session=None):
+        # 与同一设备上的其它组件共享连接、屏幕尺寸和操作锁
+        self.session = session or get_session()
+        self.d = self.session.device
         # 禁用自动切换输入法
-        self.d.settings['operation_delay'] = (0, 0)
-        self.d.settings['operation_delay_methods'] = []
-        self.width, self.height = self.d.window_size()
+        self.session.enable_fast_input()
+        self.width, self.height = self.session.window_size()
         
         # 确保使用正确的输入法
         self._ensure_correct_ime()
     
     def _ensure_correct_ime(self):
         """确保使用正确的输入法（百度输入法）"""
-        current_ime = os.popen('adb shell settings get secure default_input_method').read().strip()
+        shell = self.session.shell
+        current_ime = shell.run('settings get secure default_input_method').strip()
         if 'AdbKeyboard' in current_ime:
-            os.system('adb shell ime set com.baidu.input_mi/.ImeService')
+            shell.run('ime set com.baidu.input_mi/.ImeService')
     
     def go_to_chat_list(self):
         """返回到聊天列表首页"""
@@ -33,7 +48,8 @@ class WeChatContactManager:
         
         print("📱 返回聊天列表...")
         self.d.click(chat_tab_x, chat_tab_y)
-        time.sleep(0.5)
+        # 等待聊天列表出现（已在聊天列表时立即满足），最多等0.5秒
+        wait_until(element_exists(self.d, **CHAT_LIST), timeout=0.5, interval=0.2, name="chat_list_tab")
         
         return True
     
@@ -45,7 +61,7 @@ class WeChatContactManager:
         
         print("🔍 打开搜索...")
         self.d.click(search_x, search_y)
-        time.sleep(1.0)
+        wait_until(element_exists(self.d, **FOCUSED_INPUT), timeout=2, name="search_opened")
         
         return True
     
@@ -67,16 +83,17 @@ class WeChatContactManager:
         
         # 点击搜索框
         self.d.click(search_input_x, search_input_y)
-        time.sleep(0.5)
+        wait_until(element_exists(self.d, **FOCUSED_INPUT), timeout=1, name="search_focused")
         
         # 清空
         for _ in range(20):
             self.d.press("del")
-        time.sleep(0.3)
+        wait_until(text_equals(self.d, FOCUSED_INPUT, ""), timeout=1, name="search_cleared")
         
-        # 输入联系人名称
+        # 输入联系人名称，等待搜索结果（搜索框本身也包含该文本）
         self.d.send_keys(contact_name)
-        time.sleep(1.5)  # 等待搜索结果
+        wait_until(element_count_at_least(self.d, 2, textContains=contact_name),
+                   timeout=3, name="search_results")
         
         return True
     
@@ -88,10 +105,12 @@ class WeChatContactManager:
         
         print("✅ 选择第一个结果...")
         self.d.click(result_x, result_y)
-        time.sleep(1.0)
+        wait_until(element_exists(self.d, **CHAT_TITLE), timeout=2, interval=0.2, name="chat_opened")
         
         return True
     
+    @with_session_lock
+    @instrumented("open_chat")
     def open_chat_window(self, contact_name):
         """
         打开指定联系人的聊天窗口
@@ -107,21 +126,19 @@ class WeChatContactManager:
             print(f"打开联系人聊天窗口: {contact_name}")
             print('='*60)
             
+            # 每一步内部都会等待界面就绪，步骤之间无需额外等待
             # 1. 返回聊天列表
             self.go_to_chat_list()
-            time.sleep(0.5)
             
             # 2. 打开搜索
             self.open_search()
-            time.sleep(0.5)
             
             # 3. 搜索联系人
             self.search_contact(contact_name)
-            time.sleep(1.0)
             
             # 4. 选择第一个结果
             self.select_first_result()
-            time.sleep(1.0)
+            self.session.set_ui_state(Screen.CHAT, contact_name)
             
             print("✅ 聊天窗口已打开")
             return True
@@ -4,59 +4,117 @@
 微信消息接收模块 - 基于OCR识别
 """
 
-import uiautomator2 as u2
 import time
 import os
-from PIL import Image
-import imagehash
+from implementations.wechat.chat_scheduler import ChatListPager, remaining
+from implementations.wechat.contact_cache import ContactLocationCache
+from implementations.wechat.device_session import get_session, with_session_lock
+from implementations.wechat.hierarchy import find_first, find_parent, node_bounds, node_text, parse_chat_list
+from implementations.wechat.instrumentation import instrumented
+from implementations.wechat.navigation import Screen
+from implementations.wechat.vision import (
+    BubbleTracker, Frame, FrameDiffer, FrameGrabber, RedDotDetector, RowTiles, TileHasher,
+)
+from implementations.wechat.vision.bubbles import LEFT, RIGHT
+from implementations.wechat.waits import element_exists, wait_until
+
+# 聊天区域（顶部10% - 底部88%，排除标题栏和底部输入框/tab）
+CHAT_AREA = (0.10, 0.88)
+# 聊天窗口标题（与 WeChatPlatform.SELECTORS["chat_title"] 相同）
+CHAT_TITLE = {"resourceId": "com.tencent.mm:id/ko4"}
+# 未校准时的聊天列表行高（占屏幕高度的比例）
+DEFAULT_ROW_HEIGHT = 0.075
+# 聊天列表解析用的selector（与 WeChatPlatform.SELECTORS 相同，红点沿用本模块的资源ID）
+CHAT_LIST_SELECTORS = {
+    "chat_list": {"resourceId": "com.tencent.mm:id/e5u"},
+    "message_item": {"resourceId": "com.tencent.mm:id/al_"},
+    "contact_name": {"resourceId": "com.tencent.mm:id/dyh"},
+    "latest_message": {"resourceId": "com.tencent.mm:id/e62"},
+    "red_dot": {"resourceId": "com.tencent.mm:id/h8h"},
+}
 
 class WeChatReceiver:
-    def __init__(self):
-        self.d = u2.connect()
-        self.width, self.height = self.d.window_size()
-        self.last_screenshot_hash = None
+    def __init__(self, session=None, frame_ring=None):
+        """
+        Args:
+            session: 共享的设备会话
+            frame_ring: SharedFrameRing；设置后截图同时写入共享内存，
+                其它进程用 frame_ring.spec() 连接后按帧序号读取（目前自动回复未使用，OCR在线程中运行）
+        """
+        # 与同一设备上的其它组件共享连接、屏幕尺寸和操作锁
+        self.session = session or get_session()
+        self.d = self.session.device
+        self.width, self.height = self.session.window_size()
         self.current_chat_title = None  # 当前聊天窗口标题
+        self.frames = FrameGrabber(self.d, ring=frame_ring)
+        # 一条新气泡只占聊天区域的几个百分点，阈值要比整屏切换低
+        self.differ = FrameDiffer(pixel_delta=30, min_fraction=0.01)
+        self.last_change = None  # 最近一次检测到的变化（含变化区域）
+        # 按行分块哈希：定位哪几行（会话）发生了变化；通过红点找到聊天项后按其实际行高校准
+        self.area_top = int(self.height * CHAT_AREA[0])
+        self.area_height = int(self.height * CHAT_AREA[1]) - self.area_top
+        self.row_hasher = TileHasher(RowTiles.uniform(0, self.area_height, int(self.height * DEFAULT_ROW_HEIGHT)))
+        self.changed_rows = []  # 最近一次变化涉及的行块序号（从上到下）
+        self.red_dots = RedDotDetector()
+        # 聊天窗口气泡跟踪：只裁剪新出现的消息；进入另一个聊天时重置
+        self.bubbles = BubbleTracker()
+        self.latest_bubbles = []  # 最近一次截取的对方消息气泡（坐标相对聊天区域）
+        self.latest_frame = None
+        self.latest_crop = None
+        # 聊天列表分屏：收集首屏以下的未读会话
+        self.pager = ChatListPager(
+            self.d, self.read_chat_rows, self.width, self.height,
+            settle_read=lambda: parse_chat_list(self.session.hierarchy(fresh=True), CHAT_LIST_SELECTORS),
+        )
+        # 聊天列表中可见会话的位置：回复时直接点击该行进入，不必搜索
+        self.contact_cache = ContactLocationCache()
         
+    @instrumented("detect_change")
     def _get_chat_area_screenshot(self):
-        """截取聊天区域（排除底部输入框）"""
-        # 聊天区域大约是顶部到88%高度
-        self.d.screenshot("screenshots/temp_full.jpg")
-        
-        img = Image.open("screenshots/temp_full.jpg")
-        # 裁剪聊天区域（顶部10% - 底部88%）
-        chat_area = img.crop((0, int(self.height * 0.10), self.width, int(self.height * 0.88)))
-        
-        return chat_area
+        """截取聊天区域（排除底部输入框），返回数组视图"""
+        # 聊天区域大约是顶部10%到88%高度；截图留在内存中，裁剪不复制像素
+        return self.frames.grab().band(*CHAT_AREA)
     
+    @with_session_lock
+    @instrumented("open_chat")
     def click_latest_chat_with_red_dot(self):
         """点击最新的有红点标记的聊天（新消息）"""
         try:
-            # 方法1: 查找红点标记（未读消息数字）
+            # 方法1: 在截图上找红色未读徽标（一次截图，不依赖随版本变化的资源ID）
+            dots = self.find_red_dots()
+            if dots:
+                dot = dots[0]
+                self._click_and_wait(int(self.width * 0.50), self.area_top + dot.center[1])
+                print(f"  👆 点击进入聊天窗口（截图红点，第{dot.row + 1 if dot.row is not None else '?'}行）")
+                return True
+            
+            # 方法2: 查找红点标记（未读消息数字）
             # 微信的未读消息通常显示为红色圆圈数字
-            red_dots = self.d.xpath('//*[@resource-id="com.tencent.mm:id/h8h"]').all()
+            # 在（会话缓存的）层级树上查找红点所在的聊天项，省去xpath查询与parent()/info往返
+            row = find_parent(self.session.hierarchy(), resourceId="com.tencent.mm:id/h8h")
+            bounds = node_bounds(row) if row is not None else None
+            if bounds is not None:
+                self._calibrate_rows(bounds)
+                # 点击最上面的红点（最新消息）所在的聊天项
+                self._click_and_wait(*bounds.center)
+                print("  👆 点击进入聊天窗口（通过红点定位）")
+                return True
             
-            if red_dots:
-                # 找到最上面的红点（最新消息）
-                first_dot = red_dots[0]
-                # 点击红点所在的聊天项
-                parent = first_dot.parent()
-                if parent:
-                    bounds = parent.info.get('bounds', {})
-                    center_x = (bounds.get('left', 0) + bounds.get('right', self.width)) / 2
-                    center_y = (bounds.get('top', 0) + bounds.get('bottom', self.height)) / 2
-                    self.d.click(center_x, center_y)
-                    print("  👆 点击进入聊天窗口（通过红点定位）")
-                    time.sleep(1)  # 等待进入
-                    return True
+            # 方法3: 点击截图中发生变化的那一行
+            if self.changed_rows:
+                row = self.changed_rows.pop(0)
+                click_y = self.area_top + self.row_hasher.tiles.center(row)
+                self._click_and_wait(int(self.width * 0.50), click_y)
+                print(f"  👆 点击进入聊天窗口（变化的第{row + 1}行）")
+                return True
             
-            # 方法2: 点击聊天列表第一项（最新对话）
+            # 方法4: 点击聊天列表第一项（最新对话）
             # 微信聊天列表通常在顶部显示最新消息
             # 点击屏幕上方中间位置（第一个聊天项）
             click_y = int(self.height * 0.20)  # 顶部20%位置
             click_x = int(self.width * 0.50)   # 中间
-            self.d.click(click_x, click_y)
+            self._click_and_wait(click_x, click_y)
             print("  👆 点击进入聊天窗口（点击列表第一项）")
-            time.sleep(1)
             return True
             
         except Exception as e:
@@ -64,28 +122,145 @@ class WeChatReceiver:
             # 降级方案：点击屏幕上方
             click_y = int(self.height * 0.20)
             click_x = int(self.width * 0.50)
+            self.bubbles.reset()
             self.d.click(click_x, click_y)
             time.sleep(1)
             return True
     
-    def _has_new_message(self):
-        """检测是否有新消息（通过截图对比）"""
-        current_img = self._get_chat_area_screenshot()
-        current_hash = imagehash.average_hash(current_img)
+    def read_chat_title(self):
+        """
+        读取当前聊天窗口的标题（会话名），并记录到设备会话的界面状态
         
-        if self.last_screenshot_hash is None:
-            self.last_screenshot_hash = current_hash
-            return False
+        Returns:
+            str: 会话名；不在聊天窗口时为None
+        """
+        title = node_text(find_first(self.session.hierarchy(), **CHAT_TITLE)) or None
+        self.current_chat_title = title
+        if title:
+            self.session.set_ui_state(Screen.CHAT, title)
+        return title
+    
+    def read_chat_rows(self, vision=True):
+        """
+        读取当前一屏的聊天列表（层级树解析），并用截图红点补充未读标记
         
-        # 计算差异
-        diff = current_hash - self.last_screenshot_hash
+        Args:
+            vision: 是否截图检测红点（只需要会话位置时可省掉截图）
         
-        if diff > 5:  # 差异阈值
-            self.last_screenshot_hash = current_hash
-            return True
+        Returns:
+            List[ChatRow]: 按屏幕顺序排列的聊天行
+        """
+        rows = parse_chat_list(self.session.hierarchy(), CHAT_LIST_SELECTORS)
+        self.contact_cache.observe(rows)
+        if not vision:
+            return rows
+        for dot in self.find_red_dots():
+            x, y = dot.center[0], self.area_top + dot.center[1]
+            for row in rows:
+                b = row.bounds
+                if b is not None and b.left <= x < b.right and b.top <= y < b.bottom:
+                    if not row.unread:
+                        row.unread, row.unread_count = True, 1
+                    break
+        return rows
+    
+    @with_session_lock
+    @instrumented("scan")
+    def collect_unread_chats(self, max_pages=3):
+        """
+        回到聊天列表，从顶部逐屏收集未读会话
+        
+        Returns:
+            List[Tuple[ChatRow, int]]: (未读行, 所在屏序号)，按列表顺序
+        """
+        self.back_to_chat_list()
+        return self.pager.collect(max_pages)
+    
+    @with_session_lock
+    @instrumented("open_chat")
+    def open_chat(self, name, page=0, deadline=None):
+        """
+        点击聊天列表中该会话的未读行进入聊天（不在当前屏时向收集时所在的屏滚动）
+        
+        Args:
+            deadline: 截止时间（time.monotonic），限制滚动定位和等待进入的时间
         
+        Returns:
+            bool: 是否进入
+        """
+        row = self.pager.locate(name, page, deadline)
+        if row is None:
+            return False
+        self._calibrate_rows(row.bounds)
+        self._click_and_wait(*row.bounds.center, timeout=remaining(deadline, 2))
+        return True
+    
+    @with_session_lock
+    @instrumented("open_chat")
+    def open_visible_chat(self, name):
+        """
+        点击聊天列表中可见的该会话行进入聊天（位置缓存），并确认进入的是该会话
+        
+        Returns:
+            bool: 是否进入；会话不在当前屏或进入的不是该会话时返回False（调用方退回搜索）
+        """
+        self.back_to_chat_list()
+        self.read_chat_rows(vision=False)
+        bounds = self.contact_cache.lookup(name)
+        if bounds is None:
+            return False
+        self._click_and_wait(*bounds.center)
+        if self.read_chat_title() == name:
+            return True
+        self.contact_cache.invalidate(name)
+        self.back_to_chat_list()
         return False
     
+    @with_session_lock
+    def back_to_chat_list(self, timeout=2):
+        """在聊天窗口中时返回聊天列表（保持列表原来的滚动位置）"""
+        if find_first(self.session.hierarchy(), **CHAT_TITLE) is not None:
+            self.d.press("back")
+            wait_until(element_exists(self.d, **CHAT_LIST_SELECTORS["chat_list"]),
+                       timeout=timeout, interval=0.2, name="chat_list_returned")
+            self.current_chat_title = None
+        self.session.set_ui_state(Screen.CHAT_LIST)
+    
+    def find_red_dots(self):
+        """
+        在聊天区域截图中检测未读红点
+        
+        Returns:
+            List[RedDot]: 从上到下排列，坐标相对聊天区域，row 为所在行块序号
+        """
+        area = self._get_chat_area_screenshot()
+        return self.red_dots.detect(area, tiles=self.row_hasher.tiles)
+    
+    def _calibrate_rows(self, bounds):
+        """按聊天项的实际位置和高度重建行块（行高不变时保留已缓存的哈希）"""
+        row_height = bounds.height
+        if row_height <= 0:
+            return
+        first_top = (bounds.top - self.area_top) % row_height
+        self.row_hasher.set_tiles(RowTiles.uniform(first_top, self.area_height, row_height))
+    
+    def _click_and_wait(self, x, y, timeout=2):
+        """点击并等待进入聊天窗口（出现聊天标题）"""
+        self.bubbles.reset()
+        self.d.click(x, y)
+        wait_until(element_exists(self.d, **CHAT_TITLE), timeout=timeout, interval=0.2, name="chat_opened")
+    
+    def _has_new_message(self):
+        """检测是否有新消息（与上一帧的灰度差分）"""
+        area = self._get_chat_area_screenshot()
+        result = self.differ.update(area)
+        # 行块哈希每帧都更新，变化时记下是哪几行
+        rows = self.row_hasher.update(area)
+        if result.changed:
+            self.last_change = result
+            self.changed_rows = rows
+        return result.changed
+    
     def wait_for_new_message(self, timeout=60):
         """
         等待新消息到来
@@ -117,9 +292,52 @@ class WeChatReceiver:
         print(f"\n⏱️  超时，未收到新消息")
         return False
     
+    @staticmethod
+    def _latest_incoming(bubbles, new):
+        """
+        选出需要识别的对方消息气泡
+        
+        有基准帧时取新气泡中对方的消息；刚进入聊天（没有基准，全部都是"新"的）时，
+        取自己最后一条回复之后对方发来的消息。
+        """
+        if len(new) == len(bubbles):
+            last_own = max((i for i, b in enumerate(bubbles) if b.side == RIGHT), default=-1)
+            new = bubbles[last_own + 1:]
+        return [b for b in new if b.side == LEFT]
+    
+    @with_session_lock
+    @instrumented("capture")
+    def get_latest_message_image(self):
+        """
+        获取最新消息的截图（内存中的PIL图像，不写盘）
+        
+        Returns:
+            PIL.Image: 新出现的对方消息气泡；分割不出时为输入框上方的固定区域
+        """
+        # 分割聊天区域中的气泡，只裁剪上一帧之后新出现的对方消息
+        frame = self.frames.grab()
+        area = frame.band(*CHAT_AREA)
+        bubbles, new = self.bubbles.update(area)
+        incoming = self._latest_incoming(bubbles, new)
+        self.latest_bubbles = incoming
+        
+        if incoming:
+            top = self.area_top + max(min(b.top for b in incoming) - 8, 0)
+            bottom = self.area_top + max(b.bottom for b in incoming) + 8
+            left = max(min(b.left for b in incoming) - 8, 0)
+            right = max(b.right for b in incoming) + 8
+        else:
+            # 分割不出新气泡时退回固定区域：75%高度到88%高度（输入框上方）
+            left, top, right, bottom = 0, int(frame.height * 0.75), frame.width, int(frame.height * 0.88)
+        
+        # 帧与裁剪框（整屏坐标）：使用共享内存环形缓冲时，OCR工作进程凭 ring_seq 和裁剪框读取像素
+        self.latest_frame = frame
+        self.latest_crop = (left, top, right, bottom)
+        return Frame.to_image(frame.crop(left, top, right, bottom))
+    
     def get_latest_message_screenshot(self, save_path="screenshots/latest_message.jpg"):
         """
-        获取最新消息的截图
+        获取最新消息的截图并保存
         
         Args:
             save_path: 保存路径
@@ -127,18 +345,7 @@ class WeChatReceiver:
         Returns:
             str: 截图路径
         """
-        # 截取聊天区域下半部分（最新消息通常在底部）
-        self.d.screenshot("screenshots/temp_full.jpg")
-        
-        img = Image.open("screenshots/temp_full.jpg")
-        # 裁剪最底部的一条消息区域（更精确，减少干扰）
-        # 微信消息通常在底部，输入框上方
-        latest_area = img.crop((
-            0, 
-            int(self.height * 0.75),  # 从75%高度开始（只截取最底部）
-            self.width, 
-            int(self.height * 0.88)   # 到88%高度（输入框上方）
-        ))
+        latest_area = self.get_latest_message_image()
         
         # 确保保存路径的目录存在
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
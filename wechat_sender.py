@@ -5,58 +5,67 @@
 前提：微信设置中开启"回车键发送消息"
 """
 
-import uiautomator2 as u2
-import time
-import os
+import shlex
+from implementations.wechat.device_session import get_session, with_session_lock
+from implementations.wechat.instrumentation import instrumented
+from implementations.wechat.screenshot_archive import CaptureLevel, get_screenshot_archive
+from implementations.wechat.waits import element_exists, text_equals, wait_until
+
+# 聊天窗口中获得焦点的输入框
+FOCUSED_INPUT = {"className": "android.widget.EditText", "focused": True}
 
 class WeChatSender:
-    def __init__(self):
-        self.d = u2.connect()
+    def __init__(self, session=None, archive=None):
+        # 与同一设备上的其它组件共享连接、屏幕尺寸和操作锁
+        self.session = session or get_session()
+        # 发送过程截图提交到归档（DEBUG级别，后台写盘）
+        self.archive = archive or get_screenshot_archive()
+        self.d = self.session.device
         # 禁用自动切换输入法
-        self.d.settings['operation_delay'] = (0, 0)
-        self.d.settings['operation_delay_methods'] = []
-        self.width, self.height = self.d.window_size()
+        self.session.enable_fast_input()
+        self.width, self.height = self.session.window_size()
         
         # 确保使用正确的输入法
         self._ensure_correct_ime()
     
     def _ensure_correct_ime(self):
         """确保使用正确的输入法（百度输入法）"""
-        current_ime = os.popen('adb shell settings get secure default_input_method').read().strip()
+        shell = self.session.shell
+        current_ime = shell.run('settings get secure default_input_method').strip()
         if 'AdbKeyboard' in current_ime:
             print("⚠️  检测到 AdbKeyboard，正在恢复...")
-            os.system('adb shell ime set com.baidu.input_mi/.ImeService')
+            shell.run('ime set com.baidu.input_mi/.ImeService')
             print("✓ 已恢复百度输入法")
     
+    @with_session_lock
+    @instrumented("send")
     def send_message(self, message, screenshot_dir=None):
         """
         发送消息到当前打开的聊天窗口
         
         Args:
             message: 要发送的消息内容
-            screenshot_dir: 截图保存目录（可选）
+            screenshot_dir: 记录发送过程截图（可选）；截图提交到截图归档（DEBUG级别，
+                后台写盘），该值作为索引中的类型前缀
         
         Returns:
             bool: 是否发送成功
         """
-        if screenshot_dir:
-            os.makedirs(screenshot_dir, exist_ok=True)
-        
         text_input_x = int(self.width * 0.45)
         y = int(self.height * 0.92)
         
         try:
-            # 1. 点击输入框
+            # 1. 点击输入框（等待获得焦点）
             self.d.click(text_input_x, y)
-            time.sleep(0.5)
+            wait_until(element_exists(self.d, **FOCUSED_INPUT), timeout=1.5, name="input_focused")
             
             # 2. 清空输入框
             for _ in range(25):
                 self.d.press("del")
-            time.sleep(0.3)
+            wait_until(text_equals(self.d, FOCUSED_INPUT, ""), timeout=1, name="input_cleared")
             
             if screenshot_dir:
-                self.d.screenshot(f"{screenshot_dir}/01_cleared.jpg")
+                self._capture(f"{screenshot_dir}/01_cleared")
             
             # 3. 输入消息 - 使用更可靠的方法
             try:
@@ -69,30 +78,41 @@ class WeChatSender:
                     # 使用坐标点击后再用 shell input
                     self.d.shell(f"input text '{message}'")
                 except:
-                    # 方法3: 最后的备用方案
+                    # 方法3: 最后的备用方案（持久化adb shell通道）
                     print(f"  ⚠️  尝试使用ADB输入")
-                    import subprocess
-                    escaped_msg = message.replace("'", "\\'")
-                    subprocess.run(['adb', 'shell', 'input', 'text', escaped_msg], check=False)
+                    result = self.session.shell_input(f"input text {shlex.quote(message)}")[0]
+                    if not result.ok:
+                        print(f"  ⚠️  ADB输入失败: {result.output}")
             
-            time.sleep(0.8)
+            # 等待输入框内容与消息一致
+            wait_until(text_equals(self.d, FOCUSED_INPUT, message), timeout=2, name="message_typed")
             
             if screenshot_dir:
-                self.d.screenshot(f"{screenshot_dir}/02_typed.jpg")
+                self._capture(f"{screenshot_dir}/02_typed")
             
             # 4. 按回车发送
             self.d.press("enter")
-            time.sleep(1.0)
+            # 发送后输入框被清空
+            wait_until(text_equals(self.d, FOCUSED_INPUT, ""), timeout=3, name="message_sent")
             
             if screenshot_dir:
-                self.d.screenshot(f"{screenshot_dir}/03_sent.jpg")
+                self._capture(f"{screenshot_dir}/03_sent")
             
             return True
             
         except Exception as e:
             print(f"❌ 发送失败: {e}")
+            self._capture("send/failed", CaptureLevel.ERRORS)
             return False
     
+    def _capture(self, kind, level=CaptureLevel.DEBUG):
+        """按需截图并异步归档（归档级别不够时连截图RPC也省掉）"""
+        if self.archive.enabled(level):
+            try:
+                self.archive.submit(self.d.screenshot(), kind, level)
+            except Exception as e:
+                print(f"  ⚠️  截图归档失败: {e}")
+    
     def send_to_contact(self, contact_name, message):
         """
         发送消息到指定联系人（需要先打开聊天列表）
@@ -121,15 +141,15 @@ if __name__ == "__main__":
     print(f"📝 发送消息: {msg}")
     print()
     
-    success = sender.send_message(msg, screenshot_dir="screenshots/send_message")
+    success = sender.send_message(msg, screenshot_dir="send_message")
+    sender.archive.flush(timeout=5)
     
     if success:
         print()
         print("="*60)
         print("✅ 发送成功！")
         print("="*60)
-        print("\n查看截图:")
-        print("  open screenshots/send_message/02_typed.jpg")
-        print("  open screenshots/send_message/03_sent.jpg")
+        print("\n查看截图（需截图采集级别为 debug）:")
+        print(f"  grep send_message {sender.archive.root}/index.jsonl")
     else:
         print("❌ 发送失败")